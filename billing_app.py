@@ -1,5 +1,11 @@
 
+import os
 import sys
+import time
+
+# Startup milestones are measured from here, so they include loading Qt and the database driver
+_LAUNCHED = time.perf_counter()
+
 from PySide6.QtWidgets import (
     QApplication,
     QMainWindow,
@@ -9,8 +15,10 @@ from PySide6.QtWidgets import (
     QLabel,
     QLineEdit,
     QPushButton,
+    QTableView,
     QTableWidget,
     QTableWidgetItem,
+    QAbstractItemView,
     QMessageBox,
     QHeaderView,
     QFrame,
@@ -18,40 +26,720 @@ from PySide6.QtWidgets import (
     QSpacerItem,
     QSizePolicy,
     QComboBox,
+    QFileDialog,
+    QDateEdit,
+    QCompleter,
+    QDialog,
+    QGridLayout,
 )
 from PySide6.QtGui import QFont, QLinearGradient
-from PySide6.QtCore import Qt, QSize
+from PySide6.QtCore import (
+    Qt,
+    QDate,
+    QTimer,
+    QStringListModel,
+    QSize,
+    QAbstractTableModel,
+    QModelIndex,
+    QObject,
+    QRunnable,
+    QThreadPool,
+    Signal,
+)
 import mysql.connector
+import billing_reports
+import billing_schema
+import billing_repository
+from billing_journal import DEFAULT_PATH as JOURNAL_PATH, Journal
+from billing_catalog import ItemCatalog, fetch_items
+from billing_columns import MONEY_COLUMNS, BillColumns
+from billing_connection import DB_CONFIG, ConnectionManager, is_connection_lost, is_rejected
+from billing_metrics import METRICS, log_slow_queries_to
+from billing_theme import COLORS
+from billing_validation import PAYMENT_METHODS, ValidationError, validate_customer, validate_line_item
+from array import array
+from collections import OrderedDict
 from datetime import datetime
 
+
+class _StartupReport:
+    """Milestones from launch to the first page of bills, in milliseconds since ``_LAUNCHED``."""
+
+    def __init__(self):
+        """Initialize an empty report."""
+        self.milestones = []
+        self.finished = False
+
+    def mark(self, name):
+        """Record that startup reached ``name``, unless the report is already finished."""
+        if self.finished:
+            return
+        ms = (time.perf_counter() - _LAUNCHED) * 1000
+        self.milestones.append((name, ms))
+        METRICS.observe(f"startup.{name.replace(' ', '_')}", ms)
+
+    def finish(self, name):
+        """Record the last milestone and print the report."""
+        self.mark(name)
+        if not self.finished:
+            self.finished = True
+            print("Startup: " + ", ".join(f"{name} {ms:,.0f} ms" for name, ms in self.milestones))
+
+
+class _TaskSignals(QObject):
+    """Signals a database task uses to report back to the GUI thread."""
+
+    finished = Signal(int, object)
+    # Task id, error message, whether the server was unreachable and whether it refused the data
+    failed = Signal(int, str, bool, bool)
+
+
+class _DatabaseTask(QRunnable):
+    """Run one callable against a connection checked out of the pool."""
+
+    def __init__(self, manager, task_id, fn, retry):
+        super().__init__()
+        self.setAutoDelete(False)
+        self.manager = manager
+        self.task_id = task_id
+        self.fn = fn
+        self.retry = retry
+        self.signals = _TaskSignals()
+
+    def run(self):
+        """Execute the callable and emit its result or error."""
+        try:
+            result = self.manager.run(self.fn, retry=self.retry)
+        except mysql.connector.Error as e:
+            self.signals.failed.emit(self.task_id, str(e), is_connection_lost(e), is_rejected(e))
+        except Exception as e:  # Never let a worker die silently
+            self.signals.failed.emit(self.task_id, f"{type(e).__name__}: {e}", False, False)
+        else:
+            self.signals.finished.emit(self.task_id, result)
+
+
+class DatabaseExecutor(QObject):
+    """Run database work off the GUI thread and deliver results via signals.
+
+    Each task checks a connection out of a ``ConnectionManager`` pool, so the
+    GUI thread never touches a cursor. Callables receive that connection and
+    return a plain Python result, which is handed to ``on_result`` back on the
+    GUI thread. Tasks submitted with a ``tag`` supersede earlier tasks with the
+    same tag: queued ones are dropped and results of running ones are ignored.
+    ``online`` tracks whether the last task reached the server. A task may
+    pass ``on_rejected`` to handle the server refusing its data apart from
+    errors that could pass on a retry.
+
+    Every task is timed as ``task.<name>``, from submission until its result
+    arrives back on the GUI thread; ``name`` defaults to the task's tag.
+    """
+
+    # Emitted with True when work starts and False once the queue drains
+    busy_changed = Signal(bool)
+
+    # Emitted with False when the server stops answering and True once it is back
+    online_changed = Signal(bool)
+
+    # Emitted with a finished task's name and latency in milliseconds
+    task_timed = Signal(str, float)
+
+    def __init__(self, manager, max_threads=2, parent=None):
+        """Initialize the executor running tasks against ``manager``'s pool."""
+        super().__init__(parent)
+        self.manager = manager
+        self._pool = QThreadPool(self)
+        self._pool.setMaxThreadCount(max_threads)
+        self._tasks = {}
+        self._tags = {}
+        self._next_id = 0
+        self.online = True
+
+    def submit(self, fn, on_result=None, on_error=None, tag=None, retry=False, name=None, on_rejected=None):
+        """Queue ``fn(connection)`` on a worker thread and return its task id.
+
+        Pass ``retry=True`` for read-only work that may be repeated on a fresh
+        connection if the first one turns out to be lost. ``on_rejected``, if
+        given, is called instead of ``on_error`` when the server refuses the
+        data with an integrity or data error.
+        """
+        name = name or tag or fn.__name__
+        if tag is not None:
+            self.cancel(tag)
+
+        self._next_id += 1
+        task = _DatabaseTask(self.manager, self._next_id, fn, retry)
+        task.signals.finished.connect(self._on_finished)
+        task.signals.failed.connect(self._on_failed)
+        self._tasks[task.task_id] = (task, on_result, on_error, tag, name, time.perf_counter(), on_rejected)
+        if tag is not None:
+            self._tags[tag] = task.task_id
+        if len(self._tasks) == 1:
+            self.busy_changed.emit(True)
+        self._pool.start(task)
+        return task.task_id
+
+    def cancel(self, tag):
+        """Cancel the pending task submitted under ``tag``, if any."""
+        task_id = self._tags.pop(tag, None)
+        if task_id is None or task_id not in self._tasks:
+            return
+        task = self._tasks[task_id][0]
+        if self._pool.tryTake(task):
+            self._forget(task_id)
+        else:
+            # Already running: let it finish but drop its result
+            self._tasks[task_id] = (task, None, None, None, None, 0, None)
+
+    def shutdown(self):
+        """Drop queued work, wait for running tasks and close all connections."""
+        self._pool.clear()
+        self._pool.waitForDone()
+        self.manager.close()
+
+    def _set_online(self, online):
+        """Record whether the server is reachable, announcing changes."""
+        if online != self.online:
+            self.online = online
+            self.online_changed.emit(online)
+
+    def _on_finished(self, task_id, result):
+        """Deliver a task result on the GUI thread."""
+        self._set_online(True)
+        entry = self._forget(task_id)
+        if entry is None or entry[4] is None:
+            return
+        self._record(entry[4], entry[5])
+        if entry[1]:
+            entry[1](result)
+
+    def _on_failed(self, task_id, message, connection_lost, rejected):
+        """Deliver a task error on the GUI thread."""
+        if connection_lost:
+            self._set_online(False)
+        entry = self._forget(task_id)
+        if entry is None or entry[4] is None:
+            return
+        METRICS.increment(f"task.{entry[4]}.failed")
+        self._record(entry[4], entry[5])
+        on_error = entry[6] if rejected and entry[6] else entry[2]
+        if on_error:
+            on_error(message)
+
+    def _record(self, name, submitted):
+        """Record a finished task's latency."""
+        ms = (time.perf_counter() - submitted) * 1000
+        METRICS.observe(f"task.{name}", ms)
+        self.task_timed.emit(name, ms)
+
+    def _forget(self, task_id):
+        """Remove a task from the bookkeeping and update the busy state."""
+        entry = self._tasks.pop(task_id, None)
+        if entry is None:
+            return None
+        tag = entry[3]
+        if tag is not None and self._tags.get(tag) == task_id:
+            del self._tags[tag]
+        if not self._tasks:
+            self.busy_changed.emit(False)
+        return entry
+
+
+class BillsTableModel(QAbstractTableModel):
+    """Table model that pages the bills history in lazily, newest first.
+
+    Rows are fetched with keyset pagination on ``bill_id DESC`` so each page
+    costs the same no matter how deep the user scrolls, and only the rows
+    that have actually been scrolled into view are held in memory, in a
+    ``BillColumns`` store kept in that paging order. Sorting by a column
+    only computes a permutation of the stored rows, which maps view rows to
+    stored ones.
+    """
+
+    HEADERS = ["ID", "Customer", "Phone", "Item", "Qty", "Price", "Payment", "Total"]
+    PAGE_SIZE = 200
+    DELTA_LIMIT = 1000
+
+    ALIGNMENTS = {
+        0: Qt.AlignCenter,
+        4: Qt.AlignCenter,
+        5: Qt.AlignRight | Qt.AlignVCenter,
+        6: Qt.AlignCenter,
+        7: Qt.AlignRight | Qt.AlignVCenter,
+    }
+
+    # Emitted with a message when a page cannot be loaded
+    load_failed = Signal(str)
+    # Emitted with the bill count and revenue of the current filter once they are known
+    summary_loaded = Signal(int, object)
+    # Emitted when a filter's totals are being aggregated after its first page
+    summary_pending = Signal()
+    # Emitted with the newest bill_id, bill count and revenue of all bills read with a first page
+    snapshot_loaded = Signal(int, int, object)
+    # Emitted with the row count and revenue of bills prepended by a delta refresh
+    bills_added = Signal(int, object)
+    # Emitted when a delta refresh is too large to merge and a full reload is needed
+    refresh_required = Signal()
+    # Emitted once a page has been added to the model
+    page_loaded = Signal()
+
+    def __init__(self, executor, parent=None):
+        """Initialize an empty model that loads pages through ``executor``."""
+        super().__init__(parent)
+        self.executor = executor
+        self._bills = BillColumns()
+        # View row -> stored row, or None while shown in stored (bill_id DESC) order
+        self._order = None
+        # Idle until the first reload, so the view cannot query before the schema is ready
+        self._exhausted = True
+        self._loading = False
+        self._watermark = None
+        # Newest bill covered by a filter's totals still being aggregated, else None
+        self._summary_bill_id = None
+        self._conditions = []
+        self._params = []
+        self._sort_column = 0
+        self._sort_order = Qt.DescendingOrder
+        self._total_font = QFont("Segoe UI", 9, QFont.Bold)
+
+    def rowCount(self, parent=QModelIndex()):
+        """Return the number of rows loaded so far."""
+        return 0 if parent.isValid() else len(self._bills)
+
+    def columnCount(self, parent=QModelIndex()):
+        """Return the number of columns."""
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        """Return the column titles for the horizontal header."""
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.HEADERS[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        """Return display text, alignment and font for a cell."""
+        if not index.isValid():
+            return None
+        column = index.column()
+        if role == Qt.DisplayRole:
+            value = self._bills.value(self._stored_row(index.row()), column)
+            if column in MONEY_COLUMNS:
+                return f"₹{value:.2f}"
+            return "" if value is None else str(value)
+        if role == Qt.TextAlignmentRole:
+            return self.ALIGNMENTS.get(column, Qt.AlignLeft | Qt.AlignVCenter)
+        if role == Qt.FontRole and column == 7:
+            return self._total_font
+        return None
+
+    def canFetchMore(self, parent=QModelIndex()):
+        """Return True while older bills remain and no page is in flight."""
+        return not parent.isValid() and not self._exhausted and not self._loading
+
+    def fetchMore(self, parent=QModelIndex()):
+        """Request the next page of older bills below the oldest loaded one."""
+        if not self.canFetchMore(parent):
+            return
+        self._loading = True
+        before_id = self._oldest_bill_id()
+        if before_id is None:
+            where, params = self.filter_clause()
+            self.executor.submit(
+                lambda connection: billing_repository.fetch_first_page(connection, where, params, self.PAGE_SIZE),
+                self._on_first_page_loaded,
+                self._on_page_failed,
+                tag="bills_page",
+                retry=True,
+            )
+            return
+        where, params = self.filter_clause("b.bill_id < %s", [before_id])
+        self.executor.submit(
+            lambda connection: billing_repository.fetch_bills(connection, where, params, self.PAGE_SIZE),
+            self._on_page_loaded,
+            self._on_page_failed,
+            tag="bills_page",
+            retry=True,
+        )
+
+    def reload(self):
+        """Drop every loaded row and request the first page again."""
+        self.executor.cancel("bills_delta")
+        self.executor.cancel("bills_summary")
+        self._summary_bill_id = None
+        self.beginResetModel()
+        self._bills = BillColumns()
+        self._order = None
+        self._exhausted = False
+        self._loading = False
+        self._watermark = None
+        self.endResetModel()
+        self.fetchMore()
+
+    def fetch_newer(self):
+        """Request only the bills added since the newest one loaded.
+
+        Returns False when there is no watermark to measure the delta against
+        yet (the first page is still loading) and a full reload is needed.
+        """
+        if self._watermark is None:
+            return False
+        where, params = self.filter_clause("b.bill_id > %s", [self._watermark])
+        self.executor.submit(
+            lambda connection: billing_repository.fetch_bills(connection, where, params, self.DELTA_LIMIT),
+            self._on_newer_loaded,
+            self.load_failed.emit,
+            tag="bills_delta",
+            retry=True,
+        )
+        return True
+
+    def _on_first_page_loaded(self, result):
+        """Show the first page and the totals it was read with.
+
+        Delta refreshes start after the newest bill the totals cover, so
+        none is counted twice. A filter's totals are aggregated only once
+        its page is showing.
+        """
+        bill_count, revenue, self._watermark, rows = result
+        self.snapshot_loaded.emit(self._watermark, bill_count, revenue)
+        if not self._conditions:
+            self.summary_loaded.emit(bill_count, revenue)
+        self._on_page_loaded(rows)
+        if self._conditions:
+            self._request_summary()
+
+    def _request_summary(self):
+        """Aggregate the current filter's totals up to the watermark in a task of their own."""
+        where, params = self.filter_clause()
+        last_bill_id = self._summary_bill_id = self._watermark
+        self.summary_pending.emit()
+        self.executor.submit(
+            lambda connection: billing_repository.fetch_summary(connection, where, params, last_bill_id),
+            self._on_summary_loaded,
+            self.load_failed.emit,
+            tag="bills_summary",
+            retry=True,
+        )
+
+    def _on_summary_loaded(self, totals):
+        """Emit the filter's totals, plus those of any bills merged in above them meanwhile."""
+        bill_count, revenue = totals
+        merged = 0
+        while merged < len(self._bills) and self._bills.bill_ids[merged] > self._summary_bill_id:
+            merged += 1
+        self._summary_bill_id = None
+        self.summary_loaded.emit(bill_count + merged, revenue + self._bills.total(range(merged)))
+
+    def _on_page_loaded(self, rows):
+        """Append a page delivered by the executor."""
+        self._loading = False
+        self._exhausted = len(rows) < self.PAGE_SIZE
+        if rows:
+            with METRICS.timer("ui.bills_page"):
+                loaded = len(self._bills)
+                self.beginInsertRows(QModelIndex(), loaded, loaded + len(rows) - 1)
+                self._bills.extend(rows)
+                if self._order is not None:
+                    self._order.extend(range(loaded, loaded + len(rows)))
+                self.endInsertRows()
+                if not self._is_natural_order():
+                    self.sort(self._sort_column, self._sort_order)
+        self.page_loaded.emit()
+
+    def _on_newer_loaded(self, rows):
+        """Prepend bills delivered by a delta refresh, newest first."""
+        if len(rows) >= self.DELTA_LIMIT:
+            # Too far behind to patch in place; the caller must reload
+            self.refresh_required.emit()
+            return
+        rows = [row for row in rows if row[0] > self._watermark]
+        if not rows:
+            return
+        self._watermark = rows[0][0]
+        with METRICS.timer("ui.bills_delta"):
+            self.beginInsertRows(QModelIndex(), 0, len(rows) - 1)
+            self._bills.prepend(rows)
+            if self._order is not None:
+                # Every stored row moved down by len(rows)
+                self._order = array("i", range(len(rows))) + array("i", [row + len(rows) for row in self._order])
+            self.endInsertRows()
+            if not self._is_natural_order():
+                self.sort(self._sort_column, self._sort_order)
+        if self._summary_bill_id is None:
+            # Otherwise they are added to the filter's totals once those arrive
+            self.bills_added.emit(len(rows), self._bills.total(range(len(rows))))
+
+    def _on_page_failed(self, message):
+        """Stop paging after a failed load and report the error."""
+        self._loading = False
+        self._exhausted = True
+        self.load_failed.emit(message)
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        """Sort the loaded rows by the raw value of ``column``.
+
+        Persistent indexes, such as the view's selection and current cell,
+        are moved to wherever their rows end up.
+        """
+        self._sort_column = column
+        self._sort_order = order
+        with METRICS.timer("ui.bills_sort"):
+            self.layoutAboutToBeChanged.emit()
+            persistent = self.persistentIndexList()
+            stored = [self._stored_row(index.row()) for index in persistent]
+            if self._is_natural_order():
+                self._order = None
+            else:
+                self._order = self._bills.sort_order(column, descending=order == Qt.DescendingOrder)
+            if persistent:
+                view_rows = self._view_rows()
+                self.changePersistentIndexList(
+                    persistent, [self.index(view_rows[row], index.column()) for row, index in zip(stored, persistent)]
+                )
+            self.layoutChanged.emit()
+
+    def subtotal(self, rows):
+        """Return the ``(bill_count, revenue)`` of the view rows ``rows``."""
+        return len(rows), self._bills.total(map(self._stored_row, rows))
+
+    def set_filter(self, conditions, params):
+        """Show only bills matching every SQL condition in ``conditions`` and reload.
+
+        Conditions may only reference the bills table as ``b``; ``params``
+        holds their placeholder values in order.
+        """
+        self._conditions = list(conditions)
+        self._params = list(params)
+        self.reload()
+
+    def filter_clause(self, extra=None, extra_params=()):
+        """Return the ``(where, params)`` of the current filter, plus an optional ``extra`` condition."""
+        conditions = self._conditions + ([extra] if extra else [])
+        where = "WHERE " + " AND ".join(conditions) if conditions else ""
+        return where, self._params + list(extra_params)
+
+    @property
+    def watermark(self):
+        """Return the newest bill_id merged into the table, or None before the first page."""
+        return self._watermark
+
+    def is_filtered(self):
+        """Return True when only bills matching a filter are shown."""
+        return bool(self._conditions)
+
+    def _oldest_bill_id(self):
+        """Return the smallest bill_id loaded so far, or None when empty."""
+        return self._bills.bill_ids[-1] if len(self._bills) else None
+
+    def _stored_row(self, row):
+        """Return the stored row shown at view row ``row``."""
+        return row if self._order is None else self._order[row]
+
+    def _view_rows(self):
+        """Return the view row showing each stored row."""
+        if self._order is None:
+            return range(len(self._bills))
+        view_rows = array("i", bytes(4 * len(self._order)))
+        for view_row, stored_row in enumerate(self._order):
+            view_rows[stored_row] = view_row
+        return view_rows
+
+    def _is_natural_order(self):
+        """Return True when rows are in the bill_id DESC order they are paged in."""
+        return self._sort_column == 0 and self._sort_order == Qt.DescendingOrder
+
+
+class CustomerCache:
+    """Bounded LRU cache mapping a phone number to ``(customer_id, name)``."""
+
+    def __init__(self, maxsize=1024):
+        """Initialize an empty cache holding at most ``maxsize`` customers."""
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+
+    def get(self, phone):
+        """Return the cached customer for ``phone`` or None, marking it recently used."""
+        customer = self._entries.get(phone)
+        if customer is not None:
+            self._entries.move_to_end(phone)
+        return customer
+
+    def put(self, phone, customer):
+        """Cache ``customer`` for ``phone``, evicting the least recently used entry."""
+        self._entries[phone] = customer
+        self._entries.move_to_end(phone)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+
+class ReportsDialog(QDialog):
+    """Sales dashboard read from the reporting rollups on a worker thread."""
+
+    PERIOD_LABELS = {
+        "day": "Daily (last 30 days)",
+        "week": "Weekly (last 12 weeks)",
+        "month": "Monthly (last 12 months)",
+    }
+
+    def __init__(self, executor, parent=None):
+        """Build the dashboard and load the daily reports."""
+        super().__init__(parent)
+        self.executor = executor
+        self.setWindowTitle("Sales Reports")
+        self.resize(900, 600)
+
+        layout = QVBoxLayout(self)
+        controls = QHBoxLayout()
+        controls.addWidget(QLabel("Period:"))
+        self.period_combo = QComboBox()
+        for period, label in self.PERIOD_LABELS.items():
+            self.period_combo.addItem(label, period)
+        self.period_combo.currentIndexChanged.connect(self.load)
+        controls.addWidget(self.period_combo)
+        controls.addStretch()
+        self.status_label = QLabel()
+        controls.addWidget(self.status_label)
+        layout.addLayout(controls)
+
+        grid = QGridLayout()
+        self.revenue_table = self._add_table(grid, 0, 0, "Revenue", ["Period", "Bills", "Revenue"])
+        self.payments_table = self._add_table(grid, 0, 1, "Payment methods", ["Payment", "Bills", "Revenue", "Share"])
+        self.items_table = self._add_table(grid, 1, 0, "Top items", ["Item", "Sold", "Revenue"])
+        self.customers_table = self._add_table(grid, 1, 1, "Top customers", ["Customer", "Phone", "Bills", "Revenue"])
+        layout.addLayout(grid)
+
+        self.load()
+
+    def _add_table(self, grid, row, column, title, headers):
+        """Add a titled read-only table to ``grid`` and return it."""
+        box = QVBoxLayout()
+        title_label = QLabel(title)
+        title_label.setFont(QFont("Segoe UI", 11, QFont.Bold))
+        box.addWidget(title_label)
+        table = QTableWidget(0, len(headers))
+        table.setHorizontalHeaderLabels(headers)
+        table.verticalHeader().setVisible(False)
+        table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        box.addWidget(table)
+        grid.addLayout(box, row, column)
+        return table
+
+    def load(self):
+        """Fetch the reports for the selected period."""
+        period = self.period_combo.currentData()
+        self.status_label.setText("Loading…")
+        self.executor.submit(
+            lambda connection: billing_reports.dashboard(connection, period),
+            self._show_report,
+            self._show_error,
+            tag="reports",
+            retry=True,
+        )
+
+    def _show_report(self, report):
+        """Fill every table from a loaded dashboard."""
+        with METRICS.timer("ui.reports"):
+            period = report["period"]
+            self._fill(
+                self.revenue_table,
+                [
+                    (self._bucket_label(bucket, period), invoices, revenue)
+                    for bucket, invoices, revenue in report["revenue"]
+                ],
+                money_columns={2},
+            )
+            total = sum(revenue for _method, _invoices, revenue in report["payments"]) or 1
+            self._fill(
+                self.payments_table,
+                [
+                    (method, invoices, revenue, f"{revenue * 100 / total:.1f}%")
+                    for method, invoices, revenue in report["payments"]
+                ],
+                money_columns={2},
+            )
+            self._fill(self.items_table, report["top_items"], money_columns={2})
+            self._fill(self.customers_table, report["top_customers"], money_columns={3})
+        self.status_label.setText(f"Top items and customers since {report['ranking_start']:%d %b %Y}")
+
+    def _show_error(self, message):
+        """Report a failure to load the dashboard."""
+        self.status_label.setText("")
+        QMessageBox.critical(self, "Database Error", f"Could not load reports: {message}")
+
+    @staticmethod
+    def _bucket_label(bucket, period):
+        """Return the display label of a revenue bucket."""
+        if period == "month":
+            return f"{bucket:%b %Y}"
+        if period == "week":
+            return f"Week of {bucket:%d %b %Y}"
+        return f"{bucket:%a %d %b %Y}"
+
+    @staticmethod
+    def _fill(table, rows, money_columns):
+        """Replace the contents of ``table`` with ``rows``, formatting ``money_columns`` as rupees."""
+        table.setRowCount(len(rows))
+        for row_index, row in enumerate(rows):
+            for column, value in enumerate(row):
+                if value is None:
+                    text = ""
+                elif column in money_columns:
+                    text = f"₹{value:,.2f}"
+                else:
+                    text = str(value)
+                item = QTableWidgetItem(text)
+                if column:
+                    item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+                table.setItem(row_index, column, item)
+
+
 class ModernBillingApp(QMainWindow):
     """A modern billing system application with a GUI built using PySide6."""
 
+    # Emitted from the invoice worker's thread with an invoice id and the file written, or the error
+    invoice_rendered = Signal(int, str)
+    invoice_failed = Signal(int, str)
+
     # Constants for styling
-    COLORS = {
-        "primary": "#3498db",  # Blue
-        "secondary": "#2ecc71",  # Green
-        "accent": "#9b59b6",  # Purple
-        "danger": "#e74c3c",  # Red
-        "warning": "#f39c12",  # Orange
-        "background": "#f9f9f9",  # Light Gray
-        "card": "#ffffff",  # White
-        "text": "#2c3e50",  # Dark Blue Gray
-        "text_light": "#7f8c8d",  # Gray
-        "border": "#ecf0f1",  # Very Light Gray
-    }
+    COLORS = COLORS
 
     # Database configuration
-    DB_CONFIG = {
-        "host": "localhost",
-        "user": "root",
-        "password": "1234",
-        "database": "billing_db",
-    }
+    DB_CONFIG = DB_CONFIG
+
+    # Delay after the last filter edit before the bills are re-queried
+    FILTER_DEBOUNCE_MS = 300
+
+    # Age after which the item catalog is checked for other terminals' changes
+    CATALOG_REFRESH_SECONDS = 60
+
+    # Local queue for bills saved while the database is unreachable
+    JOURNAL_PATH = JOURNAL_PATH
+    SYNC_INTERVAL_MS = 5000
+    REPLAY_BATCH = 100
+    # Delay before replaying again after a transient error, doubling up to REPLAY_RETRY_MAX_MS
+    REPLAY_RETRY_MIN_MS = 1000
+    REPLAY_RETRY_MAX_MS = 60000
+
+    # Polling for other terminals' bills: the interval doubles while nothing changes, up to FEED_MAX_MS
+    FEED_MIN_MS = 2000
+    FEED_MAX_MS = 30000
+
+    # Counters and latency histograms, rewritten every METRICS_FLUSH_MS, and the slow-query log
+    METRICS_PATH = os.path.expanduser("~/.billing_metrics.json")
+    METRICS_FLUSH_MS = 30000
+    SLOW_QUERY_LOG = os.path.expanduser("~/.billing_slow_queries.log")
 
     def __init__(self):
-        """Initialize the main window and its components."""
+        """Initialize the main window and its components.
+
+        The window is shown before any database work starts: connecting,
+        checking the schema and loading the first page all happen on worker
+        threads afterwards, so time to the first frame does not depend on the
+        server or the size of the history.
+        """
         super().__init__()
+        self._startup = _StartupReport()
+        self._startup.mark("imported")
         self.setWindowTitle("Elegant Billing System")
         self.setGeometry(100, 100, 1000, 700)
 
@@ -63,10 +751,72 @@ class ModernBillingApp(QMainWindow):
         self.price_input = None
         self.payment_method = None
 
+        # Line items collected for the bill being entered: (item, quantity, price)
+        self.cart = []
+
+        # Summary totals, kept in sync incrementally by delta refreshes
+        self._bill_count = 0
+        self._total_revenue = 0
+        self.customer_cache = CustomerCache()
+        self.item_catalog = ItemCatalog()
+        self._catalog_loading = False
+        self._catalog_refreshed_at = 0.0
+        # Worker process typesetting invoices, started with the first saved bill
+        self._invoice_renderer = None
+        self.invoice_rendered.connect(self._on_invoice_rendered)
+        self.invoice_failed.connect(self._on_invoice_failed)
+
+        # Restarted on every filter edit so the query runs once typing pauses
+        self._filter_timer = QTimer(self)
+        self._filter_timer.setSingleShot(True)
+        self._filter_timer.setInterval(self.FILTER_DEBOUNCE_MS)
+        self._filter_timer.timeout.connect(self.apply_filters)
+
+        self.db = DatabaseExecutor(ConnectionManager(self.DB_CONFIG), parent=self)
+
+        # Bills queued locally while offline, replayed in batches once the server answers
+        self.journal = Journal(self.JOURNAL_PATH)
+        self._database_ready = False
+        self._syncing = False
+        self._replay_batch = self.REPLAY_BATCH
+        self._replay_delay = self.REPLAY_RETRY_MIN_MS
+        self._replay_timer = QTimer(self)
+        self._replay_timer.setSingleShot(True)
+        self._replay_timer.timeout.connect(self._sync_journal)
+        self._sync_timer = QTimer(self)
+        self._sync_timer.setInterval(self.SYNC_INTERVAL_MS)
+        self._sync_timer.timeout.connect(self._sync_journal)
+
+        # Change feed: (last_bill_id, bill_count, revenue) of all bills when last read, polled to spot changes
+        self._feed_checkpoint = None
+        self._feed_interval = self.FEED_MIN_MS
+        self._feed_timer = QTimer(self)
+        self._feed_timer.setSingleShot(True)
+        self._feed_timer.timeout.connect(self._poll_changes)
+
+        # Last finished database task, shown in the footer as "name latency"
+        self._busy = False
+        self._last_timing = ""
+        try:
+            log_slow_queries_to(self.SLOW_QUERY_LOG)
+        except OSError as e:
+            print(f"Could not open the slow-query log: {e}")
+        self._metrics_timer = QTimer(self)
+        self._metrics_timer.setInterval(self.METRICS_FLUSH_MS)
+        self._metrics_timer.timeout.connect(self._write_metrics)
+        self._metrics_timer.start()
+
         self._setup_styles()
-        self._initialize_database()
         self._setup_ui()
+        self._startup.mark("window built")
+        self.db.busy_changed.connect(self._set_busy)
+        self.db.task_timed.connect(self._show_latency)
+        self.db.online_changed.connect(self._on_online_changed)
+        self.bills_model.page_loaded.connect(lambda: self._startup.finish("first page"))
+        self._update_pending_label()
         self.show()
+        QTimer.singleShot(0, lambda: self._startup.mark("interactive"))
+        self._initialize_database()
 
     def _setup_styles(self):
         """Set up the application-wide stylesheet."""
@@ -111,7 +861,7 @@ class ModernBillingApp(QMainWindow):
                 border: 0px;
                 width: 30px;
             }
-            QTableWidget {
+            QTableView {
                 alternate-background-color: #f5f5f5;
                 gridline-color: %(border)s;
                 selection-background-color: #e0f2fe;
@@ -119,7 +869,7 @@ class ModernBillingApp(QMainWindow):
                 border: none;
                 border-radius: 8px;
             }
-            QTableWidget::item {
+            QTableView::item {
                 padding: 5px;
                 border-bottom: 1px solid %(border)s;
             }
@@ -146,40 +896,30 @@ class ModernBillingApp(QMainWindow):
         self.create_footer()
 
     def _initialize_database(self):
-        """Initialize the database connection and create tables if they don't exist."""
-        try:
-            self.connection = mysql.connector.connect(**self.DB_CONFIG)
-            if self.connection.is_connected():
-                self.cursor = self.connection.cursor()
-                self.cursor.execute("CREATE DATABASE IF NOT EXISTS billing_db")
-                self.cursor.execute("USE billing_db")
-                self.cursor.execute(
-                    """
-                    CREATE TABLE IF NOT EXISTS customers (
-                        customer_id INT AUTO_INCREMENT PRIMARY KEY,
-                        name VARCHAR(100) NOT NULL,
-                        phone VARCHAR(20) DEFAULT NULL
-                    )
-                    """
-                )
-                self.cursor.execute(
-                    """
-                    CREATE TABLE IF NOT EXISTS bills (
-                        bill_id INT AUTO_INCREMENT PRIMARY KEY,
-                        customer_id INT,
-                        item VARCHAR(100) NOT NULL,
-                        quantity INT NOT NULL,
-                        price DECIMAL(10, 2) NOT NULL,
-                        payment_method VARCHAR(50) DEFAULT 'Cash',
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        FOREIGN KEY (customer_id) REFERENCES customers(customer_id)
-                    )
-                    """
-                )
-                print("Database connection successful")
-        except mysql.connector.Error as e:
-            QMessageBox.critical(self, "Database Error", f"Cannot connect to database: {e}")
-            sys.exit(1)
+        """Apply pending schema migrations on a worker thread, then load the bills."""
+        self.db.submit(billing_schema.migrate, self._on_database_ready, self._on_database_failed, retry=True)
+
+    def _on_database_ready(self, applied):
+        """Load the bills once the schema is in place."""
+        print("Database connection successful")
+        self._startup.mark("database ready")
+        if applied:
+            print(f"Applied schema migrations: {', '.join(map(str, applied))}")
+        self._database_ready = True
+        self._syncing = False
+        self.view_bills()
+        self._sync_journal()
+        self._feed_timer.start(self._feed_interval)
+
+    def _on_database_failed(self, message):
+        """Work offline if the server is unreachable; report any other failure and quit."""
+        self._syncing = False
+        if not self.db.online:
+            self._startup.finish("offline")
+            self._schedule_sync()
+            return
+        QMessageBox.critical(self, "Database Error", f"Cannot connect to database: {message}")
+        QApplication.exit(1)
 
     def create_header(self):
         """Create the header section with title and date."""
@@ -235,9 +975,18 @@ class ModernBillingApp(QMainWindow):
         footer_layout = QHBoxLayout(footer)
         footer_layout.setContentsMargins(10, 0, 10, 0)
 
-        status_label = QLabel("Ready")
-        status_label.setStyleSheet(f"color: {self.COLORS['text_light']};")
-        footer_layout.addWidget(status_label)
+        self.status_label = QLabel("Ready")
+        self.status_label.setStyleSheet(f"color: {self.COLORS['text_light']};")
+        footer_layout.addWidget(self.status_label)
+
+        self.pending_label = QLabel()
+        self.pending_label.setAlignment(Qt.AlignCenter)
+        self.pending_label.setStyleSheet(f"color: {self.COLORS['warning']}; font-weight: bold;")
+        footer_layout.addWidget(self.pending_label)
+
+        self.invoice_label = QLabel()
+        self.invoice_label.setAlignment(Qt.AlignCenter)
+        footer_layout.addWidget(self.invoice_label)
 
         version_label = QLabel("v1.0.0")
         version_label.setAlignment(Qt.AlignRight)
@@ -283,10 +1032,13 @@ class ModernBillingApp(QMainWindow):
         # Form fields
         fields_layout = QVBoxLayout()
         fields_layout.setSpacing(15)
-        self._add_form_field(fields_layout, "Customer Name", self.name_input)
-        self._add_form_field(fields_layout, "Phone Number", self.phone_input)
-        self._add_form_field(fields_layout, "Item", self.item_input)
+        self._add_form_field(fields_layout, "Customer Name", "name_input")
+        self._add_form_field(fields_layout, "Phone Number", "phone_input")
+        self.phone_input.editingFinished.connect(self._prefill_customer)
+        self._add_form_field(fields_layout, "Item", "item_input")
+        self._setup_item_completer()
         self._add_quantity_price_fields(fields_layout)
+        self._add_cart(fields_layout)
         self._add_payment_method(fields_layout)
 
         form_layout.addLayout(fields_layout)
@@ -294,27 +1046,127 @@ class ModernBillingApp(QMainWindow):
         form_layout.addLayout(self._create_action_buttons())
         parent.addWidget(form_container)
 
-    def _add_form_field(self, layout, label_text, input_widget):
-        """Add a labeled input field to the layout."""
+    def _add_form_field(self, layout, label_text, attr_name):
+        """Add a labeled input field to the layout and store it as ``attr_name``."""
         field_layout = QVBoxLayout()
         label = QLabel(label_text)
         label.setFont(QFont("Segoe UI", 12))
         field_layout.addWidget(label)
+        input_widget = getattr(self, attr_name)
         if input_widget is None:
             input_widget = QLineEdit()
-            setattr(self, f"{label_text.lower().replace(' ', '_')}_input", input_widget)
+            setattr(self, attr_name, input_widget)
         input_widget.setPlaceholderText(f"Enter {label_text.lower()}")
         input_widget.setMinimumHeight(40)
         field_layout.addWidget(input_widget)
         layout.addLayout(field_layout)
 
+    def _setup_item_completer(self):
+        """Attach catalog autocomplete to the item field."""
+        self.item_completer_model = QStringListModel(self)
+        self.item_completer = QCompleter(self.item_completer_model, self)
+        self.item_completer.setCaseSensitivity(Qt.CaseInsensitive)
+        self.item_completer.activated.connect(self._fill_item_price)
+        self.item_input.setCompleter(self.item_completer)
+        self.item_input.textEdited.connect(self._complete_item)
+        self.item_input.editingFinished.connect(self._prefill_item_price)
+
+    def _complete_item(self, text):
+        """Offer catalog items starting with the typed text."""
+        self._refresh_item_catalog()
+        text = text.strip()
+        self.item_completer_model.setStringList(self.item_catalog.complete(text) if text else [])
+        if text:
+            self.item_completer.setCompletionPrefix(text)
+            self.item_completer.complete()
+
+    def _fill_item_price(self, name):
+        """Fill in the catalog price of a chosen item."""
+        price = self.item_catalog.price(name)
+        if price is not None:
+            self.price_input.setText(f"{price:.2f}")
+
+    def _prefill_item_price(self):
+        """Fill in the catalog price for a typed item if no price was entered."""
+        if not self.price_input.text().strip():
+            self._fill_item_price(self.item_input.text())
+
+    def _refresh_item_catalog(self):
+        """Load the catalog on first use and pick up other terminals' changes when stale."""
+        if self._catalog_loading:
+            return
+        if self.item_catalog.loaded and time.monotonic() - self._catalog_refreshed_at < self.CATALOG_REFRESH_SECONDS:
+            return
+        since = self.item_catalog.watermark if self.item_catalog.loaded else None
+        self._catalog_loading = True
+        self.db.submit(
+            lambda connection: fetch_items(connection, since),
+            self._on_item_catalog_loaded,
+            self._on_item_catalog_failed,
+            tag="item_catalog",
+            retry=True,
+        )
+
+    def _on_item_catalog_loaded(self, rows):
+        """Merge freshly loaded catalog rows into the index."""
+        self._catalog_loading = False
+        self._catalog_refreshed_at = time.monotonic()
+        self.item_catalog.apply(rows)
+
+    def _on_item_catalog_failed(self, _message):
+        """Keep completing from what is loaded; the next keystroke retries."""
+        self._catalog_loading = False
+
     def _add_quantity_price_fields(self, layout):
         """Add quantity and price fields in a horizontal layout."""
         qty_price_layout = QHBoxLayout()
-        self._add_form_field(qty_price_layout, "Quantity", self.quantity_input)
-        self._add_form_field(qty_price_layout, "Price (₹)", self.price_input)
+        self._add_form_field(qty_price_layout, "Quantity", "quantity_input")
+        self._add_form_field(qty_price_layout, "Price (₹)", "price_input")
         layout.addLayout(qty_price_layout)
 
+    def _add_cart(self, layout):
+        """Add the cart of line items collected for the current bill."""
+        cart_buttons = QHBoxLayout()
+        self.add_item_button = QPushButton("Add Item")
+        self.add_item_button.setStyleSheet(
+            f"""
+            background-color: {self.COLORS['primary']};
+            color: white;
+            padding: 5px 15px;
+            """
+        )
+        self.add_item_button.clicked.connect(self.add_to_cart)
+        cart_buttons.addWidget(self.add_item_button)
+
+        self.remove_item_button = QPushButton("Remove")
+        self.remove_item_button.setStyleSheet(
+            f"""
+            background-color: {self.COLORS['danger']};
+            color: white;
+            padding: 5px 15px;
+            """
+        )
+        self.remove_item_button.clicked.connect(self.remove_from_cart)
+        cart_buttons.addWidget(self.remove_item_button)
+        cart_buttons.addStretch()
+
+        self.cart_total_label = QLabel("Cart: ₹0.00")
+        self.cart_total_label.setFont(QFont("Segoe UI", 11, QFont.Bold))
+        self.cart_total_label.setStyleSheet(f"color: {self.COLORS['secondary']};")
+        cart_buttons.addWidget(self.cart_total_label)
+        layout.addLayout(cart_buttons)
+
+        self.cart_table = QTableWidget(0, 4)
+        self.cart_table.setHorizontalHeaderLabels(["Item", "Qty", "Price", "Total"])
+        self.cart_table.verticalHeader().setVisible(False)
+        self.cart_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.cart_table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.cart_table.setMaximumHeight(150)
+        self.cart_table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        for column in (1, 2, 3):
+            self.cart_table.horizontalHeader().setSectionResizeMode(column, QHeaderView.ResizeToContents)
+        layout.addWidget(self.cart_table)
+
     def _add_payment_method(self, layout):
         """Add payment method dropdown to the layout."""
         payment_layout = QVBoxLayout()
@@ -323,7 +1175,7 @@ class ModernBillingApp(QMainWindow):
         payment_layout.addWidget(self.payment_label)
         if self.payment_method is None:
             self.payment_method = QComboBox()
-            self.payment_method.addItems(["Cash", "Credit Card", "Debit Card", "Scanner", "UPI"])
+            self.payment_method.addItems(PAYMENT_METHODS)
             self.payment_method.setMinimumHeight(40)
         payment_layout.addWidget(self.payment_method)
         layout.addLayout(payment_layout)
@@ -390,6 +1242,28 @@ class ModernBillingApp(QMainWindow):
         )
         refresh_button.clicked.connect(self.view_bills)
         header_layout.addWidget(refresh_button)
+
+        self.export_button = QPushButton("Export")
+        self.export_button.setStyleSheet(
+            f"""
+            background-color: {self.COLORS['accent']};
+            color: white;
+            padding: 5px 15px;
+            """
+        )
+        self.export_button.clicked.connect(self.export_bills)
+        header_layout.addWidget(self.export_button)
+
+        reports_button = QPushButton("Reports")
+        reports_button.setStyleSheet(
+            f"""
+            background-color: {self.COLORS['secondary']};
+            color: white;
+            padding: 5px 15px;
+            """
+        )
+        reports_button.clicked.connect(self.show_reports)
+        header_layout.addWidget(reports_button)
         table_layout.addLayout(header_layout)
 
         # Separator
@@ -397,18 +1271,27 @@ class ModernBillingApp(QMainWindow):
         separator.setFrameShape(QFrame.HLine)
         separator.setStyleSheet(f"background-color: {self.COLORS['border']}; margin: 0 0 10px 0;")
         table_layout.addWidget(separator)
+        table_layout.addLayout(self._create_filter_bar())
 
         # Table setup
-        self.bills_table = QTableWidget()
-        self.bills_table.setColumnCount(8)
-        self.bills_table.setHorizontalHeaderLabels(
-            ["ID", "Customer", "Phone", "Item", "Qty", "Price", "Payment", "Total"]
-        )
+        self.bills_model = BillsTableModel(self.db, self)
+        self.bills_model.load_failed.connect(self._show_load_error)
+        self.bills_model.summary_loaded.connect(self._show_summary)
+        self.bills_model.summary_pending.connect(self._show_summary_pending)
+        self.bills_model.snapshot_loaded.connect(self._on_snapshot_loaded)
+        self.bills_model.bills_added.connect(self._add_to_summary)
+        self.bills_model.refresh_required.connect(self.view_bills)
+        self.bills_table = QTableView()
+        self.bills_table.setModel(self.bills_model)
         self.bills_table.setAlternatingRowColors(True)
         self.bills_table.verticalHeader().setVisible(False)
         self.bills_table.setShowGrid(False)
-        self.bills_table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.bills_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.bills_table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.bills_table.horizontalHeader().setSortIndicator(0, Qt.DescendingOrder)
         self.bills_table.setSortingEnabled(True)
+        self.bills_table.selectionModel().selectionChanged.connect(self._show_selection_total)
+        self.bills_model.modelReset.connect(self._show_selection_total)
 
         # Configure column widths
         header = self.bills_table.horizontalHeader()
@@ -420,6 +1303,8 @@ class ModernBillingApp(QMainWindow):
         header.setSectionResizeMode(5, QHeaderView.ResizeToContents)
         header.setSectionResizeMode(6, QHeaderView.ResizeToContents)
         header.setSectionResizeMode(7, QHeaderView.ResizeToContents)
+        # Size columns to the rows on screen; measuring every loaded row made each sort and page relayout O(rows)
+        header.setResizeContentsPrecision(0)
 
         self.bills_table.verticalHeader().setDefaultSectionSize(40)
         table_layout.addWidget(self.bills_table)
@@ -439,6 +1324,11 @@ class ModernBillingApp(QMainWindow):
         self.transactions_label.setFont(QFont("Segoe UI", 11))
         summary_layout.addWidget(self.transactions_label)
 
+        summary_layout.addStretch()
+        self.selection_label = QLabel()
+        self.selection_label.setFont(QFont("Segoe UI", 11))
+        summary_layout.addWidget(self.selection_label)
+
         summary_layout.addStretch()
         self.revenue_label = QLabel("Total Revenue: ₹0.00")
         self.revenue_label.setFont(QFont("Segoe UI", 11, QFont.Bold))
@@ -447,100 +1337,520 @@ class ModernBillingApp(QMainWindow):
 
         table_layout.addWidget(summary_frame)
         parent.addWidget(table_container)
-        self.view_bills()
 
-    def save_bill(self):
-        """Save a new bill to the database."""
-        data = {
-            "name": self.name_input.text().strip(),
-            "phone": self.phone_input.text().strip(),
-            "item": self.item_input.text().strip(),
-            "quantity": self.quantity_input.text().strip(),
-            "price": self.price_input.text().strip(),
-            "payment_method": self.payment_method.currentText(),
-        }
-
-        if not all([data["name"], data["item"], data["quantity"], data["price"]]):
-            QMessageBox.warning(self, "Input Required", "Please fill all required fields before saving!")
+    def _read_line_item(self):
+        """Validate the item fields and return ``(item, quantity, price)``, or None."""
+        try:
+            return validate_line_item(self.item_input.text(), self.quantity_input.text(), self.price_input.text())
+        except ValidationError as e:
+            QMessageBox.warning(self, e.title, str(e))
+            return None
+
+    def add_to_cart(self):
+        """Move the item in the form into the cart."""
+        line = self._read_line_item()
+        if line is None:
+            return
+        self.cart.append(line)
+        item, quantity, price = line
+        row = self.cart_table.rowCount()
+        self.cart_table.insertRow(row)
+        for column, text in enumerate([item, str(quantity), f"₹{price:.2f}", f"₹{quantity * price:.2f}"]):
+            self.cart_table.setItem(row, column, QTableWidgetItem(text))
+        self._update_cart_total()
+        for widget in [self.item_input, self.quantity_input, self.price_input]:
+            widget.clear()
+        self.item_input.setFocus()
+
+    def remove_from_cart(self):
+        """Remove the selected line from the cart."""
+        row = self.cart_table.currentRow()
+        if row < 0:
             return
+        self.cart_table.removeRow(row)
+        del self.cart[row]
+        self._update_cart_total()
+
+    def _update_cart_total(self):
+        """Show the running total of the cart."""
+        total = sum(quantity * price for _item, quantity, price in self.cart)
+        self.cart_total_label.setText(f"Cart: ₹{total:.2f}")
+
+    def _create_filter_bar(self):
+        """Create and return the search and filter bar above the bills table."""
+        filter_layout = QHBoxLayout()
+        self.search_input = QLineEdit()
+        self.search_input.setPlaceholderText("Customer name or phone")
+        self.item_filter_input = QLineEdit()
+        self.item_filter_input.setPlaceholderText("Item")
+
+        self.payment_filter = QComboBox()
+        self.payment_filter.addItem("All payments")
+        self.payment_filter.addItems(PAYMENT_METHODS)
 
+        self.date_from_filter = self._create_date_filter("From: any")
+        self.date_to_filter = self._create_date_filter("To: any")
+
+        for widget in [self.search_input, self.item_filter_input]:
+            widget.textChanged.connect(self._filter_timer.start)
+            filter_layout.addWidget(widget, 2)
+        self.payment_filter.currentIndexChanged.connect(self._filter_timer.start)
+        filter_layout.addWidget(self.payment_filter, 1)
+        for widget in [self.date_from_filter, self.date_to_filter]:
+            widget.dateChanged.connect(self._filter_timer.start)
+            filter_layout.addWidget(widget, 1)
+
+        clear_filter_button = QPushButton("✕")
+        clear_filter_button.setToolTip("Clear filters")
+        clear_filter_button.setStyleSheet(
+            f"""
+            background-color: {self.COLORS['text_light']};
+            color: white;
+            padding: 5px 10px;
+            """
+        )
+        clear_filter_button.clicked.connect(self.clear_filters)
+        filter_layout.addWidget(clear_filter_button)
+        return filter_layout
+
+    def _create_date_filter(self, empty_text):
+        """Create a date picker whose minimum date stands for "no bound"."""
+        date_filter = QDateEdit()
+        date_filter.setCalendarPopup(True)
+        date_filter.setDisplayFormat("yyyy-MM-dd")
+        date_filter.setMinimumDate(QDate(2000, 1, 1))
+        date_filter.setSpecialValueText(empty_text)
+        date_filter.setDate(date_filter.minimumDate())
+        return date_filter
+
+    def _filter_conditions(self):
+        """Return the SQL ``(conditions, params)`` for the filter bar's current values."""
+        date_from = date_to = None
+        if self.date_from_filter.date() != self.date_from_filter.minimumDate():
+            date_from = self.date_from_filter.date().toPython()
+        if self.date_to_filter.date() != self.date_to_filter.minimumDate():
+            # The "to" date is inclusive, so compare against the following midnight
+            date_to = self.date_to_filter.date().addDays(1).toPython()
+        return billing_repository.bill_filter(
+            search=self.search_input.text().strip(),
+            item=self.item_filter_input.text().strip(),
+            payment_method=self.payment_filter.currentText() if self.payment_filter.currentIndex() > 0 else None,
+            date_from=date_from,
+            date_to=date_to,
+        )
+
+    def apply_filters(self):
+        """Reload the table and totals for the filter bar's current values."""
+        conditions, params = self._filter_conditions()
+        self.bills_model.set_filter(conditions, params)
+
+    def clear_filters(self):
+        """Reset every filter and show the full history again."""
+        for widget in [self.search_input, self.item_filter_input]:
+            widget.blockSignals(True)
+            widget.clear()
+            widget.blockSignals(False)
+        self.payment_filter.blockSignals(True)
+        self.payment_filter.setCurrentIndex(0)
+        self.payment_filter.blockSignals(False)
+        for widget in [self.date_from_filter, self.date_to_filter]:
+            widget.blockSignals(True)
+            widget.setDate(widget.minimumDate())
+            widget.blockSignals(False)
+        self._filter_timer.stop()
+        self.apply_filters()
+
+    def save_bill(self):
+        """Save the cart, plus any item still in the form, as one bill."""
         try:
-            quantity_val = int(data["quantity"])
-            price_val = float(data["price"])
-            if quantity_val <= 0 or price_val <= 0:
-                QMessageBox.warning(self, "Invalid Input", "Quantity and Price must be positive values!")
+            name, phone = validate_customer(self.name_input.text(), self.phone_input.text())
+        except ValidationError as e:
+            QMessageBox.warning(self, e.title, str(e))
+            return
+
+        lines = list(self.cart)
+        if self.item_input.text().strip() or not lines:
+            line = self._read_line_item()
+            if line is None:
                 return
+            lines.append(line)
 
-            try:
-                self.cursor.execute("INSERT INTO customers (name, phone) VALUES (%s, %s)", (data["name"], data["phone"]))
-                self.connection.commit()
-                customer_id = self.cursor.lastrowid
-
-                self.cursor.execute(
-                    """
-                    INSERT INTO bills (customer_id, item, quantity, price, payment_method)
-                    VALUES (%s, %s, %s, %s, %s)
-                    """,
-                    (customer_id, data["item"], quantity_val, price_val, data["payment_method"]),
-                )
-                self.connection.commit()
+        cached = self.customer_cache.get(phone) if phone else None
+        invoice = billing_repository.new_invoice(
+            name,
+            phone,
+            self.payment_method.currentText(),
+            lines,
+            customer_id=cached[0] if cached is not None and cached[1] == name else None,
+        )
+        if not self._database_ready or not self.db.online or len(self.journal):
+            # Queue behind any bills already waiting so they reach the server in order
+            self._queue_bill(invoice)
+            return
+        self.save_button.setEnabled(False)
+        self.db.submit(
+            lambda connection: billing_repository.save_invoice(connection, invoice),
+            lambda saved: self._on_bill_saved(invoice, saved),
+            lambda message: self._on_save_failed(invoice, message),
+            name="save_bill",
+        )
 
-                self.show_success_message("Transaction saved successfully!")
-                self.clear_form()
-                self.view_bills()
-            except mysql.connector.Error as e:
-                self.connection.rollback()
-                QMessageBox.critical(self, "Database Error", f"Could not save transaction: {e}")
-        except ValueError:
-            QMessageBox.warning(self, "Invalid Input", "Please enter valid numbers for quantity and price!")
+    def _prefill_customer(self):
+        """Fill in the customer name for a known phone number."""
+        phone = self.phone_input.text().strip()
+        if not phone or self.name_input.text().strip():
+            return
+        cached = self.customer_cache.get(phone)
+        if cached is not None:
+            self.name_input.setText(cached[1])
+            return
+        self.db.submit(
+            lambda connection: billing_repository.find_customer(connection, phone),
+            lambda customer: self._on_customer_found(phone, customer),
+            tag="customer_lookup",
+            retry=True,
+        )
 
-    def view_bills(self):
-        """Retrieve and display all bills in the table."""
+    def _on_customer_found(self, phone, customer):
+        """Cache a looked-up customer and prefill the name if still empty."""
+        if customer is None:
+            return
+        self.customer_cache.put(phone, customer)
+        if self.phone_input.text().strip() == phone and not self.name_input.text().strip():
+            self.name_input.setText(customer[1])
+
+    def _on_bill_saved(self, invoice, saved):
+        """Confirm a saved transaction and refresh the table."""
+        self._cache_customer(invoice, saved)
+        for item, _quantity, price in invoice["lines"]:
+            self.item_catalog.update(item, price)
+        self.save_button.setEnabled(True)
+        self._render_invoice(saved[0], invoice)
+        self.show_success_message("Transaction saved successfully!")
+        self.clear_form()
+        self.refresh_new_bills()
+
+    def _render_invoice(self, invoice_id, invoice):
+        """Queue the PDF invoice for a saved bill on the invoice worker; the outcome arrives by signal."""
+        import billing_invoice  # Off the startup path: only needed once a bill is saved
+
+        if self._invoice_renderer is None:
+            self._invoice_renderer = billing_invoice.BackgroundRenderer(self.COLORS)
+        submitted = time.perf_counter()
+        try:
+            future = self._invoice_renderer.submit(invoice_id, invoice)
+        except RuntimeError as e:
+            # The worker died; the next invoice starts a new one
+            self._invoice_renderer = None
+            self._on_invoice_failed(invoice_id, str(e))
+            return
+        future.add_done_callback(lambda done: self._invoice_done(invoice_id, done, submitted))
+
+    def _invoice_done(self, invoice_id, future, submitted):
+        """Pass a finished invoice on to the GUI thread; runs on the worker pool's thread."""
+        METRICS.observe("invoice.render", (time.perf_counter() - submitted) * 1000)
         try:
-            self.cursor.execute(
-                """
-                SELECT b.bill_id, c.name, c.phone, b.item, b.quantity, b.price, b.payment_method, b.price * b.quantity as total
-                FROM bills b
-                JOIN customers c ON b.customer_id = c.customer_id
-                ORDER BY b.bill_id DESC
-                """
+            path = future.result()
+        except Exception as e:  # OSError writing the file, or the worker process dying
+            self.invoice_failed.emit(invoice_id, f"{type(e).__name__}: {e}")
+        else:
+            self.invoice_rendered.emit(invoice_id, path)
+
+    def _on_invoice_rendered(self, invoice_id, path):
+        """Show where the last invoice was written in the footer."""
+        self.invoice_label.setStyleSheet(f"color: {self.COLORS['text_light']};")
+        self.invoice_label.setText(f"Invoice {invoice_id}: {path}")
+
+    def _on_invoice_failed(self, invoice_id, message):
+        """Report an invoice that could not be written; the bill itself is saved."""
+        print(f"Could not write the invoice for bill {invoice_id}: {message}")
+        self.invoice_label.setStyleSheet(f"color: {self.COLORS['danger']};")
+        self.invoice_label.setText(f"Invoice {invoice_id} could not be written")
+
+    def _cache_customer(self, invoice, saved):
+        """Remember the customer a saved invoice was filed under."""
+        if invoice["phone"]:
+            self.customer_cache.put(invoice["phone"], (saved[1], invoice["name"]))
+
+    def _on_save_failed(self, invoice, message):
+        """Queue the bill locally if the server went away, else report the failure."""
+        self.save_button.setEnabled(True)
+        if not self.db.online:
+            self._queue_bill(invoice)
+            return
+        QMessageBox.critical(self, "Database Error", f"Could not save transaction: {message}")
+
+    def _queue_bill(self, invoice):
+        """Keep a bill in the local journal until the server can take it."""
+        self.journal.append(invoice)
+        for item, _quantity, price in invoice["lines"]:
+            self.item_catalog.update(item, price)
+        self._update_pending_label()
+        self._schedule_sync()
+        self.show_success_message("Database unavailable: transaction saved locally and will be synced automatically.")
+        self.clear_form()
+
+    def _schedule_sync(self):
+        """Keep retrying the server while it is unreachable or bills are queued."""
+        if not self._sync_timer.isActive():
+            self._sync_timer.start()
+
+    def _sync_journal(self):
+        """Finish startup if the server was unreachable, then replay the next batch of queued bills."""
+        if self._syncing or self._replay_timer.isActive():
+            return
+        if not self._database_ready:
+            self._syncing = True
+            self.db.submit(billing_schema.migrate, self._on_database_ready, self._on_database_failed, retry=True)
+            return
+        if not len(self.journal):
+            self._sync_timer.stop()
+            return
+        invoices = self.journal.peek(self._replay_batch)
+        self._syncing = True
+        self.db.submit(
+            lambda connection: billing_repository.save_invoices(connection, invoices),
+            lambda saved: self._on_journal_replayed(invoices, saved),
+            self._on_replay_failed,
+            name="journal_replay",
+            on_rejected=lambda message: self._on_replay_rejected(invoices, message),
+        )
+
+    def _on_journal_replayed(self, invoices, saved):
+        """Drop replayed bills from the journal and continue with the next batch."""
+        self._syncing = False
+        self._replay_batch = self.REPLAY_BATCH
+        self._replay_delay = self.REPLAY_RETRY_MIN_MS
+        self.journal.remove(invoice["client_ref"] for invoice in invoices)
+        for invoice, result in zip(invoices, saved):
+            if result is not None:
+                self._cache_customer(invoice, result)
+                self._render_invoice(result[0], invoice)
+        self._update_pending_label()
+        self.refresh_new_bills()
+        if len(self.journal):
+            QTimer.singleShot(0, self._sync_journal)
+
+    def _on_replay_failed(self, message):
+        """Keep the queued bills and replay them again after a growing delay.
+
+        The server is either unreachable, in which case the sync timer waits
+        for it, or failed for a reason that may pass, such as a lock wait
+        timeout, a deadlock or no free connection.
+        """
+        self._syncing = False
+        if not self.db.online:
+            return
+        print(f"Replaying queued bills failed, retrying in {self._replay_delay / 1000:g} s: {message}")
+        self._replay_timer.start(self._replay_delay)
+        self._replay_delay = min(self._replay_delay * 2, self.REPLAY_RETRY_MAX_MS)
+
+    def _on_replay_rejected(self, invoices, message):
+        """Isolate and set aside a queued bill the server refuses for its data."""
+        self._syncing = False
+        if len(invoices) > 1:
+            # Retry one bill at a time to find the one the server rejects
+            self._replay_batch = 1
+        else:
+            self.journal.reject(invoices[0]["client_ref"], message)
+            self._update_pending_label()
+            QMessageBox.warning(
+                self,
+                "Sync Error",
+                f"A bill saved offline was rejected by the database and set aside: {message}",
             )
-            bills = self.cursor.fetchall()
-
-            self.bills_table.setRowCount(0)
-            total_revenue = 0
-
-            for row_index, bill in enumerate(bills):
-                self.bills_table.insertRow(row_index)
-                self._add_table_item(row_index, 0, str(bill[0]), Qt.AlignCenter)
-                self._add_table_item(row_index, 1, str(bill[1]))
-                self._add_table_item(row_index, 2, str(bill[2] if bill[2] else ""))
-                self._add_table_item(row_index, 3, str(bill[3]))
-                self._add_table_item(row_index, 4, str(bill[4]), Qt.AlignCenter)
-                self._add_table_item(row_index, 5, f"₹{bill[5]:.2f}", Qt.AlignRight | Qt.AlignVCenter)
-                self._add_table_item(row_index, 6, str(bill[6]), Qt.AlignCenter)
-                self._add_table_item(
-                    row_index, 7, f"₹{bill[7]:.2f}", Qt.AlignRight | Qt.AlignVCenter, QFont("Segoe UI", 9, QFont.Bold)
-                )
-                total_revenue += bill[7]
+        QTimer.singleShot(0, self._sync_journal)
 
-            self.transactions_label.setText(f"Total Transactions: {len(bills)}")
-            self.revenue_label.setText(f"Total Revenue: ₹{total_revenue:.2f}")
-        except mysql.connector.Error as e:
-            QMessageBox.critical(self, "Database Error", f"Could not retrieve transactions: {e}")
+    def _on_online_changed(self, online):
+        """Show the connection state and replay queued bills as soon as the server is back."""
+        self._update_pending_label()
+        if online:
+            print("Database reachable again")
+            self._sync_journal()
+        else:
+            print("Database unreachable, working offline")
+            self._schedule_sync()
+
+    def _poll_changes(self):
+        """Read the running totals to see whether any terminal saved or archived bills.
+
+        The totals are a single-row primary key read, and only bills newer
+        than the last checkpoint are summed with them, so an idle terminal
+        costs the server one cheap query every ``FEED_MAX_MS``.
+        """
+        if not self.db.online:
+            # The sync timer is already probing the server
+            self._feed_timer.start(self.FEED_MAX_MS)
+            return
+        since = self._feed_checkpoint[0] if self._feed_checkpoint else 0
+        self.db.submit(
+            lambda connection: billing_repository.fetch_changes(connection, since),
+            lambda changes: self._on_changes_polled(since, changes),
+            lambda message: self._feed_timer.start(self.FEED_MAX_MS),
+            tag="change_feed",
+            retry=True,
+        )
+
+    def _on_snapshot_loaded(self, last_bill_id, bill_count, revenue):
+        """Check the next poll against the totals a first page was read with."""
+        self._feed_checkpoint = (last_bill_id, bill_count, revenue)
 
-    def _add_table_item(self, row, col, text, alignment=Qt.AlignLeft, font=None):
-        """Add an item to the table with specified alignment and font."""
-        item = QTableWidgetItem(text)
-        item.setTextAlignment(alignment)
-        if font:
-            item.setFont(font)
-        self.bills_table.setItem(row, col, item)
+    def _on_changes_polled(self, since, changes):
+        """Reconcile the table with the running totals, backing off while they stay put.
+
+        The bills at or below the checkpoint's newest one must still add up
+        to its totals. Fewer means old months were archived; more means a
+        save committed below the watermark after it was read. A delta
+        refresh only looks above the watermark and would miss either, so
+        the first page is reloaded. Bills added above it are merged in as a
+        delta.
+        """
+        if self._feed_checkpoint is not None and self._feed_checkpoint[0] != since:
+            # A reload read a newer checkpoint while this poll was in flight
+            self._feed_timer.start(self.FEED_MIN_MS)
+            return
+        bill_count, revenue, last_bill_id, newer_count, newer_revenue = changes
+        previous, self._feed_checkpoint = self._feed_checkpoint, (last_bill_id, bill_count, revenue)
+        kept = (bill_count - newer_count, revenue - newer_revenue)
+        if previous is None or (kept == previous[1:] and not newer_count):
+            self._feed_interval = min(self._feed_interval * 2, self.FEED_MAX_MS)
+        else:
+            self._feed_interval = self.FEED_MIN_MS
+            if kept[0] < previous[1]:
+                print("Bills were archived on another terminal, reloading")
+                self._reload_for_feed(bill_count, revenue)
+            elif kept != previous[1:]:
+                print("A bill was committed below the loaded ones, reloading")
+                self._reload_for_feed(bill_count, revenue)
+            else:
+                self.refresh_new_bills()
+        if not self.bills_model.is_filtered() and self.bills_model.watermark == last_bill_id:
+            # The table holds every bill the totals cover, so they are exactly its totals
+            self._show_summary(bill_count, revenue)
+        self._feed_timer.start(self._feed_interval)
+
+    def _reload_for_feed(self, bill_count, revenue):
+        """Reload the bills, showing the polled totals meanwhile when they are the table's."""
+        if not self.bills_model.is_filtered():
+            self._show_summary(bill_count, revenue)
+        self.view_bills()
+
+    def _update_pending_label(self):
+        """Show how many bills are waiting to be synced in the footer."""
+        pending = len(self.journal)
+        if self.db.online and not pending:
+            self.pending_label.clear()
+            return
+        state = "Offline" if not self.db.online else "Syncing"
+        plural = "" if pending == 1 else "s"
+        self.pending_label.setText(f"{state}: {pending} bill{plural} pending")
+
+    def view_bills(self):
+        """Reload the first page of bills; the summary totals are read with it."""
+        self.bills_model.reload()
+
+    def refresh_new_bills(self):
+        """Merge only the bills added since the last refresh into the table and totals."""
+        if not self.bills_model.fetch_newer():
+            self.view_bills()
+
+    def _show_summary(self, bill_count, revenue):
+        """Display the bill count and total revenue."""
+        self._bill_count, self._total_revenue = bill_count, revenue
+        self._update_summary_labels()
+
+    def _show_summary_pending(self):
+        """Show that the totals of a new filter are still being aggregated."""
+        self.transactions_label.setText("Total Transactions: …")
+        self.revenue_label.setText("Total Revenue: …")
+
+    def _add_to_summary(self, count, revenue):
+        """Adjust the displayed totals by the bills merged in by a delta refresh."""
+        self._bill_count += count
+        self._total_revenue += revenue
+        self._update_summary_labels()
+
+    def _show_selection_total(self):
+        """Show the bill count and revenue of the selected rows while more than one is selected."""
+        rows = [index.row() for index in self.bills_table.selectionModel().selectedRows()]
+        if len(rows) < 2:
+            self.selection_label.clear()
+            return
+        count, revenue = self.bills_model.subtotal(rows)
+        self.selection_label.setText(f"Selected: {count} · ₹{revenue:.2f}")
+
+    def _update_summary_labels(self):
+        """Render the current totals into the summary labels."""
+        self.transactions_label.setText(f"Total Transactions: {self._bill_count}")
+        self.revenue_label.setText(f"Total Revenue: ₹{self._total_revenue:.2f}")
+
+    def _show_load_error(self, message):
+        """Report a failure to retrieve bills, unless the footer already shows the server is offline."""
+        if not self.db.online:
+            return
+        QMessageBox.critical(self, "Database Error", f"Could not retrieve transactions: {message}")
+
+    def export_bills(self):
+        """Export the full transaction history to a file on a worker thread."""
+        path, _ = QFileDialog.getSaveFileName(
+            self, "Export Transactions", "bills.csv", "CSV (*.csv);;JSON Lines (*.jsonl);;Parquet (*.parquet)"
+        )
+        if not path:
+            return
+        try:
+            import billing_export  # Off the startup path: only needed once the user exports
+
+            fmt = billing_export.format_for_path(path)
+        except ValueError as e:
+            QMessageBox.warning(self, "Invalid File", str(e))
+            return
+
+        self.export_button.setEnabled(False)
+        self.db.submit(
+            lambda connection: billing_export.export_bills(connection, path, fmt),
+            lambda count: self._on_export_finished(path, count),
+            self._on_export_failed,
+            name="export",
+        )
+
+    def _on_export_finished(self, path, count):
+        """Confirm a finished export."""
+        self.export_button.setEnabled(True)
+        self.show_success_message(f"Exported {count} transactions to {path}")
+
+    def _on_export_failed(self, message):
+        """Report an export that could not be completed."""
+        self.export_button.setEnabled(True)
+        QMessageBox.critical(self, "Export Error", f"Could not export transactions: {message}")
+
+    def show_reports(self):
+        """Open the sales reports dashboard."""
+        ReportsDialog(self.db, self).exec()
+
+    def _set_busy(self, busy):
+        """Show whether database work is in progress in the footer."""
+        self._busy = busy
+        self.status_label.setText("Working…" if busy else f"Ready · {self._last_timing}".rstrip(" ·"))
+
+    def _show_latency(self, name, ms):
+        """Show the latency of the last finished database task in the footer."""
+        self._last_timing = f"{name} {ms:,.0f} ms"
+        self._set_busy(self._busy)
+
+    def _write_metrics(self):
+        """Write the current metrics snapshot to ``METRICS_PATH``."""
+        try:
+            METRICS.write_snapshot(self.METRICS_PATH)
+        except OSError as e:
+            print(f"Could not write metrics: {e}")
 
     def clear_form(self):
-        """Clear all input fields and reset the form."""
+        """Clear all input fields and the cart, and reset the form."""
         for widget in [self.name_input, self.phone_input, self.item_input, self.quantity_input, self.price_input]:
             widget.clear()
+        self.cart = []
+        self.cart_table.setRowCount(0)
+        self._update_cart_total()
         self.payment_method.setCurrentIndex(0)  # Reset to "Cash"
         self.name_input.setFocus()
 
@@ -553,26 +1863,29 @@ class ModernBillingApp(QMainWindow):
         msg.setStandardButtons(QMessageBox.Ok)
         msg.setStyleSheet(
             f"""
-            QMessageBox {
+            QMessageBox {{
                 background-color: {self.COLORS['card']};
                 color: {self.COLORS['text']};
-            }
-            QPushButton {
+            }}
+            QPushButton {{
                 background-color: {self.COLORS['primary']};
                 color: white;
                 padding: 8px 16px;
                 border-radius: 4px;
-            }
+            }}
             """
         )
         msg.exec()
 
     def closeEvent(self, event):
         """Handle window close event to clean up database connections."""
-        if hasattr(self, "connection") and self.connection.is_connected():
-            self.cursor.close()
-            self.connection.close()
-            print("Database connection closed")
+        self._feed_timer.stop()
+        if self._invoice_renderer is not None:
+            self._invoice_renderer.shutdown()
+        self.db.shutdown()
+        self.journal.close()
+        self._write_metrics()
+        print("Database connection closed")
         event.accept()
 
 if __name__ == "__main__":
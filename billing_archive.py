@@ -0,0 +1,321 @@
+"""Monthly partitions of the bills table and archival of closed months.
+
+On MySQL ``bills`` is range partitioned by the month of ``created_at``:
+one partition ``pYYYYMM`` per month and ``p_future`` for anything after
+the last of them. Queries bounded on ``created_at`` read only the months
+in range, and a closed month leaves the table by swapping its partition
+with an empty staging table and dropping it, rather than by deleting its
+rows one by one. ``ensure_partitions`` splits the next months off
+``p_future``; ``archive`` runs it first.
+
+``archive`` moves every month before the hot window into
+``bills_archive``, a compressed table, records it in ``archived_months``
+and deducts it from the running totals. The bills table, and so the app,
+its searches and totals, then cover only the hot months. The sales rollups
+keep every month, so reports over archived periods are unchanged, and
+``billing_reports rebuild`` and ``billing_export --archived`` read both
+tables through ``ALL_BILLS``.
+
+SQLite has no partitioning; there each month is moved with an INSERT and
+a DELETE in one transaction.
+
+Usage:
+    python billing_archive.py status
+    python billing_archive.py archive --keep-months 12
+    python billing_archive.py partitions --ahead 3
+"""
+
+import argparse
+import sys
+from datetime import date, datetime, timedelta
+
+import mysql.connector
+
+from billing_connection import DB_CONFIG, connect, dialect
+
+# Months, counting the current one, that stay in the bills table
+HOT_MONTHS = 12
+
+# Future months given their own partition ahead of time
+PARTITIONS_AHEAD = 3
+
+FUTURE_PARTITION = "p_future"
+
+# Empty copy of bills without partitioning that a month's partition is swapped into
+STAGING_TABLE = "bills_archive_staging"
+
+ARCHIVE_COLUMNS = "bill_id, invoice_id, customer_id, item, quantity, price, payment_method, created_at"
+
+# Live and archived bills together, for queries over the whole history
+ALL_BILLS = f"(SELECT {ARCHIVE_COLUMNS} FROM bills UNION ALL SELECT {ARCHIVE_COLUMNS} FROM bills_archive)"
+
+
+def month_start(day):
+    """Return the first day of the month containing ``day``."""
+    return day.replace(day=1)
+
+
+def next_month(month):
+    """Return the first day of the month after ``month``."""
+    return month_start(month + timedelta(days=32))
+
+
+def previous_month(month):
+    """Return the first day of the month before ``month``."""
+    return month_start(month - timedelta(days=1))
+
+
+def partition_name(month):
+    """Return the name of the partition holding ``month``."""
+    return month.strftime("p%Y%m")
+
+
+def partition_definitions(first, last):
+    """Return the partition clauses for each month from ``first`` to ``last``, then ``p_future``."""
+    clauses = []
+    month = first
+    while month <= last:
+        clauses.append(
+            f"PARTITION {partition_name(month)} VALUES LESS THAN (UNIX_TIMESTAMP('{next_month(month)}'))"
+        )
+        month = next_month(month)
+    clauses.append(f"PARTITION {FUTURE_PARTITION} VALUES LESS THAN MAXVALUE")
+    return ", ".join(clauses)
+
+
+def partitioned_months(cursor):
+    """Return the months that have their own partition of bills, oldest first.
+
+    Empty when bills is not partitioned, as on SQLite.
+    """
+    if dialect(cursor) == "sqlite":
+        return []
+    cursor.execute(
+        """
+        SELECT PARTITION_NAME FROM information_schema.PARTITIONS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'bills' AND PARTITION_NAME IS NOT NULL
+        ORDER BY PARTITION_ORDINAL_POSITION
+        """
+    )
+    return [
+        datetime.strptime(name, "p%Y%m").date() for (name,) in cursor.fetchall() if name != FUTURE_PARTITION
+    ]
+
+
+def last_partitioned_month(months_ahead=PARTITIONS_AHEAD, today=None):
+    """Return the last month that should have its own partition."""
+    month = month_start(today or date.today())
+    for _ in range(months_ahead):
+        month = next_month(month)
+    return month
+
+
+def ensure_partitions(cursor, months_ahead=PARTITIONS_AHEAD, today=None):
+    """Give every month up to ``months_ahead`` from now its own partition and return the months added.
+
+    The new partitions are split off ``p_future``, which only holds rows
+    when this has not run for longer than ``months_ahead`` months.
+    """
+    months = partitioned_months(cursor)
+    if not months:
+        return []
+    first = next_month(months[-1])
+    last = last_partitioned_month(months_ahead, today)
+    if first > last:
+        return []
+    cursor.execute(
+        f"ALTER TABLE bills REORGANIZE PARTITION {FUTURE_PARTITION} INTO ({partition_definitions(first, last)})"
+    )
+    added = []
+    while first <= last:
+        added.append(first)
+        first = next_month(first)
+    return added
+
+
+def _archive_rows(cursor, source, before=None):
+    """Copy the bills in ``source``, created before ``before`` if given, into the archive without committing.
+
+    Rows already archived are skipped, so a month whose partition was not
+    dropped after an interrupted run is archived again without being
+    counted twice. The copied rows are recorded in ``archived_months``
+    under the month each was created in, which for rows of the oldest
+    partition or ``p_future`` need not be the partition's own. Returns
+    ``(month, bill_count, revenue)`` per month copied, oldest first.
+    """
+    conditions = ["NOT EXISTS (SELECT 1 FROM bills_archive a WHERE a.bill_id = b.bill_id)"]
+    params = []
+    if before is not None:
+        conditions.insert(0, "b.created_at < %s")
+        params.append(before)
+    new_rows = f"FROM {source} b WHERE {' AND '.join(conditions)}"
+    cursor.execute(
+        f"""
+        SELECT DATE_FORMAT(b.created_at, '%Y-%m-01'), COUNT(*), SUM(b.price * b.quantity) {new_rows}
+        GROUP BY DATE_FORMAT(b.created_at, '%Y-%m-01') ORDER BY 1
+        """,
+        params,
+    )
+    months = [(date.fromisoformat(month), count, revenue) for month, count, revenue in cursor.fetchall()]
+    if not months:
+        return []
+    columns = ", ".join(f"b.{column}" for column in ARCHIVE_COLUMNS.split(", "))
+    cursor.execute(f"INSERT INTO bills_archive ({ARCHIVE_COLUMNS}) SELECT {columns} {new_rows}", params)
+    cursor.executemany(
+        """
+        INSERT INTO archived_months (month, bill_count, revenue) VALUES (%s, %s, %s)
+        ON DUPLICATE KEY UPDATE bill_count = bill_count + VALUES(bill_count), revenue = revenue + VALUES(revenue)
+        """,
+        months,
+    )
+    cursor.execute(
+        "UPDATE bill_totals SET bill_count = bill_count - %s, revenue = revenue - %s WHERE id = 1",
+        (sum(count for _month, count, _revenue in months), sum(revenue for _month, _count, revenue in months)),
+    )
+    return months
+
+
+def _by_month(archived):
+    """Sum ``(month, bill_count, revenue)`` entries that share a month, oldest first."""
+    totals = {}
+    for month, count, revenue in archived:
+        previous_count, previous_revenue = totals.get(month, (0, 0))
+        totals[month] = (previous_count + count, previous_revenue + revenue)
+    return [(month, count, revenue) for month, (count, revenue) in sorted(totals.items())]
+
+
+def _unstage(connection, cursor):
+    """Archive and clear the rows in the staging table; return ``(month, bill_count, revenue)`` per month."""
+    archived = _archive_rows(cursor, STAGING_TABLE)
+    connection.commit()
+    cursor.execute(f"TRUNCATE TABLE {STAGING_TABLE}")
+    return archived
+
+
+def _archive_partition(connection, cursor, month):
+    """Move one month's partition into the archive and drop it; return ``(month, bill_count, revenue)`` per month.
+
+    The partition's rows are swapped out into the empty staging table in
+    one step and archived from there, so saves never wait on the copy. The
+    now empty partition is dropped only once a count under a write lock
+    on bills shows nothing was saved into it since; otherwise the swap is
+    repeated for the late rows.
+    """
+    name = partition_name(month)
+    archived = []
+    while True:
+        cursor.execute(f"ALTER TABLE bills EXCHANGE PARTITION {name} WITH TABLE {STAGING_TABLE}")
+        archived.extend(_unstage(connection, cursor))
+        cursor.execute("LOCK TABLES bills WRITE")
+        try:
+            cursor.execute(f"SELECT COUNT(*) FROM bills PARTITION ({name})")
+            if cursor.fetchone()[0] == 0:
+                cursor.execute(f"ALTER TABLE bills DROP PARTITION {name}")
+                return _by_month(archived)
+        finally:
+            cursor.execute("UNLOCK TABLES")
+
+
+def archive(connection, keep_months=HOT_MONTHS, today=None):
+    """Move every month before the last ``keep_months`` out of bills and return what was archived.
+
+    Returns ``(month, bill_count, revenue)`` per month archived, oldest
+    first; each month is committed on its own. Bills older than the oldest
+    month still in the table are archived with it, but counted under the
+    month they were created in.
+    """
+    cutoff = month_start(today or date.today())
+    for _ in range(keep_months - 1):
+        cutoff = previous_month(cutoff)
+    archived = []
+    with connection.cursor() as cursor:
+        if dialect(connection) == "sqlite":
+            # Only the months that have bills, so a sparse history is not walked month by month
+            cursor.execute(
+                "SELECT DISTINCT DATE_FORMAT(created_at, '%Y-%m-01') FROM bills WHERE created_at < %s ORDER BY 1",
+                (cutoff,),
+            )
+            for month in [date.fromisoformat(month) for (month,) in cursor.fetchall()]:
+                archived.extend(_archive_rows(cursor, "bills", next_month(month)))
+                cursor.execute("DELETE FROM bills WHERE created_at < %s", (next_month(month),))
+                connection.commit()
+            return archived
+
+        archived.extend(_unstage(connection, cursor))
+        ensure_partitions(cursor, today=today)
+        for month in partitioned_months(cursor):
+            if month >= cutoff:
+                break
+            archived.extend(_archive_partition(connection, cursor, month))
+    return _by_month(archived)
+
+
+def status(connection):
+    """Return ``(hot, archived)`` lists of ``(month, bill_count, revenue)``, oldest first."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT DATE_FORMAT(created_at, '%Y-%m-01'), COUNT(*), SUM(price * quantity)
+            FROM bills GROUP BY DATE_FORMAT(created_at, '%Y-%m-01') ORDER BY 1
+            """
+        )
+        hot = [(date.fromisoformat(month), count, revenue) for month, count, revenue in cursor.fetchall()]
+        cursor.execute("SELECT month, bill_count, revenue FROM archived_months ORDER BY month")
+        archived = cursor.fetchall()
+    return hot, archived
+
+
+def main(argv=None):
+    """Archive, inspect or partition the bills history from the command line."""
+    parser = argparse.ArgumentParser(description="Partition the bills table and archive closed months.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("status", help="list the months in the bills table and in the archive")
+    archive_command = commands.add_parser("archive", help="move months before the hot window to the archive")
+    archive_command.add_argument(
+        "--keep-months",
+        type=int,
+        default=HOT_MONTHS,
+        help=f"months, counting this one, to keep in the bills table (default: {HOT_MONTHS})",
+    )
+    partitions_command = commands.add_parser("partitions", help="add partitions for the coming months")
+    partitions_command.add_argument(
+        "--ahead", type=int, default=PARTITIONS_AHEAD, help=f"months to partition ahead (default: {PARTITIONS_AHEAD})"
+    )
+    args = parser.parse_args(argv)
+    if args.command == "archive" and args.keep_months < 1:
+        parser.error("--keep-months must be at least 1")
+
+    try:
+        connection = connect(DB_CONFIG)
+    except mysql.connector.Error as e:
+        print(f"Cannot connect to database: {e}", file=sys.stderr)
+        return 1
+
+    try:
+        if args.command == "archive":
+            for month, count, revenue in archive(connection, args.keep_months):
+                print(f"Archived {month:%Y-%m}: {count} bills, ₹{revenue:,.2f}")
+            return 0
+        if args.command == "partitions":
+            with connection.cursor() as cursor:
+                added = ensure_partitions(cursor, args.ahead)
+            print(f"Added partitions for {', '.join(f'{month:%Y-%m}' for month in added) or 'no new months'}")
+            return 0
+        hot, archived = status(connection)
+    except mysql.connector.Error as e:
+        print(f"Archive failed: {e}", file=sys.stderr)
+        return 1
+    finally:
+        connection.close()
+
+    print("In the bills table:")
+    for month, count, revenue in hot:
+        print(f"  {month:%Y-%m}  {count:>8} bills  ₹{revenue:>14,.2f}")
+    print("Archived:")
+    for month, count, revenue in archived:
+        print(f"  {month:%Y-%m}  {count:>8} bills  ₹{revenue:>14,.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
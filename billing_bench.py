@@ -0,0 +1,470 @@
+"""Benchmarks for saving bills and populating the bills table.
+
+Seeds a scratch database with synthetic customers and bills, then measures
+insert throughput, the app's refresh latency, table population and sort
+time and peak memory with the real window running under the offscreen Qt
+platform.
+Results are written as JSON with the environment they were measured in,
+and ``--compare`` prints the change against an earlier run.
+
+The scratch database is dropped and recreated unless ``--reuse`` finds it
+already seeded with the requested number of rows. With
+``BILLING_BACKEND=sqlite`` it is a SQLite file named after ``--database``
+in the temporary directory, and no server is needed.
+
+Usage:
+    python billing_bench.py --rows 100k
+    python billing_bench.py --rows 1m --reuse --compare benchmark-1000000.json
+"""
+
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import mysql.connector
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+import billing_repository
+import billing_schema
+from billing_connection import DB_CONFIG, connect
+from billing_import import BulkImporter
+from billing_metrics import slow_query_log
+
+FIRST_NAMES = [
+    "Aarav", "Aditi", "Arjun", "Ananya", "Divya", "Farhan", "Ishaan", "Kavya", "Meera", "Neha",
+    "Nikhil", "Priya", "Rahul", "Riya", "Rohan", "Saanvi", "Sanjay", "Tara", "Vikram", "Zoya",
+]
+LAST_NAMES = [
+    "Agarwal", "Bose", "Chopra", "Das", "Gupta", "Iyer", "Joshi", "Kapoor", "Khan", "Menon",
+    "Mehta", "Nair", "Patel", "Rao", "Reddy", "Shah", "Sharma", "Singh", "Verma", "Yadav",
+]
+ITEM_KINDS = [
+    "Rice", "Atta", "Dal", "Sugar", "Tea", "Coffee", "Milk", "Paneer", "Ghee", "Oil",
+    "Biscuits", "Soap", "Shampoo", "Toothpaste", "Detergent", "Spices", "Snacks", "Juice", "Bread", "Eggs",
+]
+ITEM_SIZES = ["100g", "250g", "500g", "1kg", "2kg", "5kg", "200ml", "500ml", "1L", "Pack"]
+
+# Relative frequencies of bill shapes seen at a typical counter
+PAYMENT_WEIGHTS = {"Cash": 35, "UPI": 30, "Credit Card": 15, "Debit Card": 15, "Scanner": 5}
+LINES_WEIGHTS = {1: 35, 2: 25, 3: 15, 4: 10, 5: 8, 6: 7}
+QUANTITY_WEIGHTS = {1: 60, 2: 20, 3: 8, 4: 5, 5: 5, 10: 2}
+HOUR_WEIGHTS = {9: 3, 10: 5, 11: 7, 12: 8, 13: 7, 14: 5, 15: 5, 16: 6, 17: 9, 18: 11, 19: 12, 20: 10, 21: 6}
+
+
+def parse_count(value):
+    """Parse a row count such as ``10000``, ``100k`` or ``1m``."""
+    text = value.strip().lower()
+    scale = {"k": 1000, "m": 1000000}.get(text[-1:], 1)
+    try:
+        return int(float(text[:-1] if scale > 1 else text) * scale)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid row count: {value!r}") from None
+
+
+class SyntheticData:
+    """Deterministic generator of realistic-looking invoices.
+
+    Item popularity and customer loyalty follow Zipf-like curves, weekends
+    are busier than weekdays, bills cluster in the evening rush, and most
+    bills have one or two lines of a single unit. Invoices come out in time
+    order over the last ``days`` days, so bill ids grow with ``created_at``
+    just as they do in production.
+    """
+
+    def __init__(self, rows, seed=1, days=365, items=500):
+        """Prepare a generator for ``rows`` bill lines."""
+        self.rows = rows
+        self.days = days
+        self.random = random.Random(seed)
+        self.items = [
+            (f"{self.random.choice(ITEM_KINDS)} {self.random.choice(ITEM_SIZES)} #{index}", self._price())
+            for index in range(items)
+        ]
+        self._item_weights = self._zipf_weights(items, 1.1)
+        self.customers = [self._customer(index) for index in range(max(100, rows // 8))]
+        self._customer_weights = self._zipf_weights(len(self.customers), 0.8)
+
+    def _price(self):
+        """Return a log-normally distributed shelf price."""
+        return Decimal(str(round(max(1.0, math.exp(self.random.gauss(4.0, 1.0))), 2)))
+
+    def _customer(self, index):
+        """Return a ``(name, phone)`` pair; about one customer in ten leaves no phone."""
+        name = f"{self.random.choice(FIRST_NAMES)} {self.random.choice(LAST_NAMES)}"
+        phone = "" if self.random.random() < 0.1 else f"9{index:09d}"
+        return name, phone
+
+    @staticmethod
+    def _zipf_weights(count, exponent):
+        """Return cumulative weights for ``count`` ranks falling off as ``rank ** -exponent``."""
+        total, weights = 0.0, []
+        for rank in range(1, count + 1):
+            total += rank ** -exponent
+            weights.append(total)
+        return weights
+
+    def _choose(self, weights):
+        """Pick a key of a ``{value: weight}`` mapping."""
+        return self.random.choices(list(weights), weights=list(weights.values()))[0]
+
+    def invoice(self, created_at):
+        """Return one random invoice dict stamped ``created_at``."""
+        name, phone = self.random.choices(self.customers, cum_weights=self._customer_weights)[0]
+        lines = []
+        for item, price in self.random.choices(
+            self.items, cum_weights=self._item_weights, k=self._choose(LINES_WEIGHTS)
+        ):
+            lines.append((item, self._choose(QUANTITY_WEIGHTS), price))
+        return {
+            "name": name,
+            "phone": phone,
+            "payment_method": self._choose(PAYMENT_WEIGHTS),
+            "created_at": created_at,
+            "lines": lines,
+        }
+
+    def invoices(self):
+        """Yield invoices in time order until exactly ``rows`` lines have been produced."""
+        mean_lines = sum(k * w for k, w in LINES_WEIGHTS.items()) / sum(LINES_WEIGHTS.values())
+        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        start = today - timedelta(days=self.days - 1)
+        day_weights = [1.4 if (start + timedelta(days=d)).weekday() >= 5 else 1.0 for d in range(self.days)]
+        per_weight = self.rows / mean_lines / sum(day_weights)
+
+        produced = 0
+        for offset, weight in enumerate(day_weights):
+            day = start + timedelta(days=offset)
+            count = int(per_weight * weight + self.random.random())
+            if offset == self.days - 1:
+                # Let the final day absorb whatever the estimate missed
+                count = max(count, self.rows - produced)
+            times = sorted(
+                day + timedelta(hours=self._choose(HOUR_WEIGHTS), seconds=self.random.randrange(3600))
+                for _ in range(count)
+            )
+            for created_at in times:
+                invoice = self.invoice(created_at)
+                invoice["lines"] = invoice["lines"][: self.rows - produced]
+                produced += len(invoice["lines"])
+                yield invoice
+                if produced >= self.rows:
+                    return
+
+
+def _percentiles(samples):
+    """Return p50/p95/max in milliseconds for a list of durations in seconds."""
+    samples = sorted(samples)
+    return {
+        "p50_ms": round(statistics.median(samples) * 1000, 3),
+        "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000, 3),
+        "max_ms": round(samples[-1] * 1000, 3),
+    }
+
+
+def _reset_sqlite(config, rows, reuse):
+    """Delete the scratch SQLite file, or return True if ``reuse`` finds it seeded with ``rows``."""
+    path = config["path"]
+    if reuse and os.path.exists(path):
+        connection = connect(config)
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT COUNT(*) FROM bills")
+                if cursor.fetchone()[0] == rows:
+                    return True
+        except mysql.connector.Error:
+            pass
+        finally:
+            connection.close()
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    return False
+
+
+def _reset_mysql(config, rows, reuse):
+    """Drop and recreate the scratch database, or return True if ``reuse`` finds it seeded with ``rows``."""
+    server_config = {key: value for key, value in config.items() if key != "database"}
+    name = config["database"]
+    connection = connect(server_config)
+    try:
+        with connection.cursor() as cursor:
+            if reuse:
+                cursor.execute("SHOW DATABASES LIKE %s", (name,))
+                if cursor.fetchall():
+                    cursor.execute(f"SELECT COUNT(*) FROM `{name}`.bills")
+                    if cursor.fetchone()[0] == rows:
+                        return True
+            cursor.execute(f"DROP DATABASE IF EXISTS `{name}`")
+            cursor.execute(f"CREATE DATABASE `{name}`")
+    finally:
+        connection.close()
+    return False
+
+
+def prepare_database(config, rows, seed, reuse):
+    """Create and seed the scratch database, returning seeding metrics."""
+    reset = _reset_sqlite if config.get("backend") == "sqlite" else _reset_mysql
+    if reset(config, rows, reuse):
+        return {"reused": True}
+
+    connection = connect(config)
+    try:
+        billing_schema.migrate(connection)
+        importer = BulkImporter(connection, batch_size=5000)
+        started = time.perf_counter()
+        importer.run(SyntheticData(rows, seed).invoices())
+        elapsed = time.perf_counter() - started
+    finally:
+        connection.close()
+    return {
+        "reused": False,
+        "rows": importer.rows,
+        "invoices": importer.invoices,
+        "seconds": round(elapsed, 3),
+        "rows_per_s": round(importer.rows / elapsed),
+    }
+
+
+def bench_inserts(config, count, seed):
+    """Measure the app's save path one invoice per transaction and in shared transactions."""
+    data = SyntheticData(1000, seed + 1)
+    connection = connect(config)
+    try:
+        invoices = [
+            billing_repository.new_invoice(sample["name"], sample["phone"], sample["payment_method"], sample["lines"])
+            for sample in (data.invoice(datetime.now()) for _ in range(count * 2))
+        ]
+        latencies = []
+        started = time.perf_counter()
+        for invoice in invoices[:count]:
+            began = time.perf_counter()
+            billing_repository.save_invoice(connection, invoice)
+            latencies.append(time.perf_counter() - began)
+        single = time.perf_counter() - started
+
+        started = time.perf_counter()
+        batch = invoices[count:]
+        for start in range(0, len(batch), 50):
+            billing_repository.save_invoices(connection, batch[start:start + 50])
+        grouped = time.perf_counter() - started
+    finally:
+        connection.close()
+    return {
+        "single": dict(_percentiles(latencies), invoices_per_s=round(count / single)),
+        "grouped_50": {"invoices_per_s": round(count / grouped)},
+    }
+
+
+def bench_gui(config, repeats, populate_rows):
+    """Measure startup, refresh and population of the real window under offscreen Qt."""
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    # Imported here so the database benchmarks run without a Qt installation
+    from PySide6.QtWidgets import QApplication
+
+    import billing_app
+
+    app = QApplication.instance() or QApplication([])
+    # Latest busy state of the window's executor; starts busy with the startup migration
+    idle = [False]
+
+    def wait_idle(timeout=600):
+        """Process events until the window's executor has drained its queue."""
+        deadline = time.perf_counter() + timeout
+        while not idle[-1] and time.perf_counter() < deadline:
+            app.processEvents()
+            time.sleep(0.0005)
+        app.processEvents()
+
+    journal_dir = tempfile.TemporaryDirectory()
+    billing_app.ModernBillingApp.DB_CONFIG = config
+    # Keep the window's journal, metrics snapshot and slow-query log out of the user's home directory
+    billing_app.ModernBillingApp.JOURNAL_PATH = os.path.join(journal_dir.name, "journal.sqlite3")
+    billing_app.ModernBillingApp.METRICS_PATH = os.path.join(journal_dir.name, "metrics.json")
+    billing_app.ModernBillingApp.SLOW_QUERY_LOG = os.path.join(journal_dir.name, "slow_queries.log")
+    started = time.perf_counter()
+    window = billing_app.ModernBillingApp()
+    window.db.busy_changed.connect(lambda busy: idle.append(not busy))
+    wait_idle()
+    startup = time.perf_counter() - started
+
+    def timed(action):
+        """Return how long ``action`` plus the database work it triggers takes."""
+        began = time.perf_counter()
+        action()
+        wait_idle()
+        return time.perf_counter() - began
+
+    reloads = [timed(window.view_bills) for _ in range(repeats)]
+
+    connection = connect(config)
+    data = SyntheticData(1000, 99)
+    deltas = []
+    try:
+        for _ in range(repeats):
+            sample = data.invoice(datetime.now())
+            invoice = billing_repository.new_invoice(
+                sample["name"], sample["phone"], sample["payment_method"], sample["lines"]
+            )
+            billing_repository.save_invoice(connection, invoice)
+            deltas.append(timed(window.refresh_new_bills))
+    finally:
+        connection.close()
+
+    def populate():
+        """Page rows into the table until ``populate_rows`` are loaded or history runs out."""
+        model = window.bills_model
+        while model.rowCount() < populate_rows and model.canFetchMore():
+            model.fetchMore()
+            wait_idle()
+
+    timed(window.view_bills)
+    population = timed(populate)
+    loaded = window.bills_model.rowCount()
+
+    # Re-sort the populated table by every column in both directions, as header clicks would
+    sorts = []
+    for column in range(window.bills_model.columnCount()):
+        for order in (billing_app.Qt.AscendingOrder, billing_app.Qt.DescendingOrder):
+            sorts.append(timed(lambda: window.bills_model.sort(column, order)))
+
+    timed(window.view_bills)
+    tracemalloc.start()
+    timed(populate)
+    _current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    window.close()
+    # Detach the slow-query log the window opened in the temporary directory before removing it
+    for handler in list(slow_query_log.handlers):
+        if getattr(handler, "baseFilename", None) == os.path.abspath(billing_app.ModernBillingApp.SLOW_QUERY_LOG):
+            slow_query_log.removeHandler(handler)
+            handler.close()
+    journal_dir.cleanup()
+    return {
+        "startup_ms": round(startup * 1000, 3),
+        "reload": _percentiles(reloads),
+        "delta_refresh": _percentiles(deltas),
+        "populate": {
+            "rows": loaded,
+            "seconds": round(population, 3),
+            "rows_per_s": round(loaded / population) if population else None,
+            "python_peak_mb": round(peak / 1e6, 2),
+        },
+        "sort": _percentiles(sorts),
+    }
+
+
+def _environment(config):
+    """Describe where the benchmark ran, so results are only compared like for like."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    connection = connect(config)
+    try:
+        server = connection.get_server_info()
+    finally:
+        connection.close()
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "server": server,
+    }
+
+
+def _flatten(results, prefix=""):
+    """Return ``{"a.b.c": value}`` for every number nested in ``results``."""
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[prefix + key] = value
+    return flat
+
+
+def compare(previous, current):
+    """Print each metric of ``current`` next to ``previous`` with the relative change."""
+    old, new = _flatten(previous["results"]), _flatten(current["results"])
+    if previous["meta"].get("rows") != current["meta"].get("rows"):
+        print("Warning: runs used different row counts", file=sys.stderr)
+    width = max(map(len, new), default=0)
+    for metric, value in new.items():
+        before = old.get(metric)
+        change = f"{(value - before) / before * 100:+.1f}%" if before else ""
+        print(f"{metric:<{width}}  {before if before is not None else '-':>12}  {value:>12}  {change}")
+
+
+def main(argv=None):
+    """Run the benchmarks from the command line."""
+    parser = argparse.ArgumentParser(description="Benchmark saving and viewing bills on synthetic data.")
+    parser.add_argument(
+        "--rows", type=parse_count, default=parse_count("100k"), help="bill lines to seed, e.g. 10k, 100k, 1m"
+    )
+    parser.add_argument("--seed", type=int, default=1, help="random seed for the synthetic data (default: 1)")
+    parser.add_argument("--database", default="billing_bench", help="scratch database name (default: billing_bench)")
+    parser.add_argument("--reuse", action="store_true", help="keep an existing scratch database seeded with --rows")
+    parser.add_argument("--inserts", type=int, default=500, help="invoices saved per insert benchmark (default: 500)")
+    parser.add_argument("--repeats", type=int, default=20, help="repetitions of each refresh (default: 20)")
+    parser.add_argument("--populate", type=int, default=10000, help="rows paged into the table (default: 10000)")
+    parser.add_argument("--skip-gui", action="store_true", help="only run the database benchmarks")
+    parser.add_argument("--output", help="where to write the JSON results (default: benchmark-<rows>.json)")
+    parser.add_argument("--compare", metavar="JSON", help="earlier results to compare against")
+    args = parser.parse_args(argv)
+
+    if DB_CONFIG.get("backend") == "sqlite":
+        config = dict(DB_CONFIG, path=os.path.join(tempfile.gettempdir(), f"{args.database}.sqlite3"))
+        live = config["path"] == DB_CONFIG["path"]
+    else:
+        config = dict(DB_CONFIG, database=args.database)
+        live = args.database == DB_CONFIG["database"]
+    if live:
+        parser.error("refusing to benchmark against the live database; pick another --database")
+
+    try:
+        results = {"seed": prepare_database(config, args.rows, args.seed, args.reuse)}
+        results["insert"] = bench_inserts(config, args.inserts, args.seed)
+        if not args.skip_gui:
+            results["gui"] = bench_gui(config, args.repeats, args.populate)
+        meta = dict(_environment(config), rows=args.rows, seed=args.seed)
+    except mysql.connector.Error as e:
+        print(f"Benchmark failed: {e}", file=sys.stderr)
+        return 1
+    if resource is not None:
+        # ru_maxrss is in kilobytes on Linux
+        meta["peak_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    report = {"meta": meta, "results": results}
+
+    output = args.output or f"benchmark-{args.rows}.json"
+    with open(output, "w", encoding="utf-8") as target:
+        json.dump(report, target, indent=2)
+    print(json.dumps(report, indent=2))
+    print(f"Results written to {output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as source:
+            compare(json.load(source), report)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
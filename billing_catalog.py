@@ -0,0 +1,84 @@
+"""In-memory item catalog with a sorted prefix index for autocomplete."""
+
+from bisect import bisect_left, insort
+
+from billing_connection import execute_prepared
+
+CATALOG_QUERY = "SELECT name, price, updated_at FROM items"
+CHANGES_QUERY = "SELECT name, price, updated_at FROM items WHERE updated_at >= %s"
+
+
+def fetch_items(connection, since=None):
+    """Return ``(name, price, updated_at)`` rows changed since ``since``, or all rows."""
+    if since is None:
+        cursor = execute_prepared(connection, CATALOG_QUERY)
+    else:
+        cursor = execute_prepared(connection, CHANGES_QUERY, (since,))
+    return cursor.fetchall()
+
+
+def save_items(cursor, lines):
+    """Record the latest price of every ``(item, quantity, price)`` line in the catalog.
+
+    Names match case-insensitively, so each item is written once, in
+    case-folded name order; concurrent writers then lock the catalog rows
+    in the same order.
+    """
+    prices = {}
+    for item, _quantity, price in lines:
+        prices[item.casefold()] = (item, price)
+    cursor.executemany(
+        "INSERT INTO items (name, price) VALUES (%s, %s) ON DUPLICATE KEY UPDATE price = VALUES(price)",
+        [prices[key] for key in sorted(prices)],
+    )
+
+
+class ItemCatalog:
+    """Item names and prices indexed for case-insensitive prefix lookups.
+
+    Names are kept in a sorted list of case-folded keys, so completing a
+    prefix is one ``bisect`` plus a short scan regardless of catalog size.
+    Changes are merged in place with ``insort`` rather than rebuilding.
+    """
+
+    def __init__(self):
+        """Initialize an empty, not yet loaded catalog."""
+        self._keys = []
+        self._items = {}
+        self.loaded = False
+        # Newest updated_at seen, used to fetch only later changes
+        self.watermark = None
+
+    def __len__(self):
+        """Return the number of items in the catalog."""
+        return len(self._keys)
+
+    def apply(self, rows):
+        """Merge ``(name, price, updated_at)`` rows into the index."""
+        for name, price, updated_at in rows:
+            self.update(name, price)
+            if updated_at is not None and (self.watermark is None or updated_at > self.watermark):
+                self.watermark = updated_at
+        self.loaded = True
+
+    def update(self, name, price):
+        """Add ``name`` or change its price."""
+        key = name.casefold()
+        if key not in self._items:
+            insort(self._keys, key)
+        self._items[key] = (name, price)
+
+    def complete(self, prefix, limit=20):
+        """Return up to ``limit`` item names starting with ``prefix``, in order."""
+        prefix = prefix.casefold()
+        names = []
+        index = bisect_left(self._keys, prefix)
+        while index < len(self._keys) and len(names) < limit and self._keys[index].startswith(prefix):
+            names.append(self._items[self._keys[index]][0])
+            index += 1
+        return names
+
+    def price(self, name):
+        """Return the catalog price of ``name``, or None if it is not in the catalog."""
+        entry = self._items.get(name.strip().casefold())
+        return entry[1] if entry else None
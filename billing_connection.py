@@ -0,0 +1,254 @@
+"""Pooled database connections with health checks, reconnect and prepared statements.
+
+Connections go to a MySQL server by default. Setting ``BILLING_BACKEND=sqlite``
+(and optionally ``BILLING_SQLITE_PATH``) keeps everything in a local SQLite
+file instead, through the mysql.connector-compatible ``billing_sqlite``.
+"""
+
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+import mysql.connector
+from mysql.connector import errorcode
+
+import billing_sqlite
+from billing_metrics import instrument
+
+# Database configuration
+DB_CONFIG = {
+    "host": "localhost",
+    "user": "root",
+    "password": "1234",
+    "database": "billing_db",
+}
+
+if os.environ.get("BILLING_BACKEND", "mysql") == "sqlite":
+    DB_CONFIG = {"backend": "sqlite", "path": os.environ.get("BILLING_SQLITE_PATH", billing_sqlite.DEFAULT_PATH)}
+
+# Client errors meaning the server connection is gone and must be replaced
+CONNECTION_LOST_ERRORS = {
+    errorcode.CR_SERVER_GONE_ERROR,
+    errorcode.CR_SERVER_LOST,
+    errorcode.CR_SERVER_LOST_EXTENDED,
+    errorcode.CR_CONN_HOST_ERROR,
+    errorcode.CR_CONNECTION_ERROR,
+}
+
+
+def connect(config=DB_CONFIG, **options):
+    """Open a connection on the backend ``config`` names.
+
+    ``options`` are extra mysql.connector arguments and are ignored by SQLite.
+    """
+    if config.get("backend") == "sqlite":
+        return billing_sqlite.connect(config["path"])
+    return mysql.connector.connect(**{key: value for key, value in config.items() if key != "backend"}, **options)
+
+
+def dialect(connection):
+    """Return ``"sqlite"`` for an embedded SQLite connection or cursor and ``"mysql"`` otherwise."""
+    return getattr(connection, "dialect", "mysql")
+
+
+def is_connection_lost(error):
+    """Return True if ``error`` means the connection itself is unusable."""
+    return isinstance(error, mysql.connector.InterfaceError) or error.errno in CONNECTION_LOST_ERRORS
+
+
+def is_rejected(error):
+    """Return True if the server refused ``error``'s statement for the data it carried.
+
+    Constraint violations and invalid values fail the same way however
+    often they are retried. Anything else, such as a lock wait timeout, a
+    deadlock or a pool checkout timeout, may pass on a later attempt.
+    """
+    return isinstance(error, (mysql.connector.IntegrityError, mysql.connector.DataError))
+
+
+def execute_prepared(connection, sql, params=()):
+    """Execute ``sql`` as a server-side prepared statement and return its cursor.
+
+    Prepared cursors are cached per connection and per statement text, so a
+    statement is parsed by the server once per connection and every later
+    call only ships the parameters. Fetch all rows before running another
+    statement on the same connection.
+    """
+    cursors = connection.__dict__.setdefault("_prepared_cursors", {})
+    cursor = cursors.get(sql)
+    if cursor is None:
+        cursor = cursors[sql] = connection.cursor(prepared=True)
+    cursor.execute(sql, params)
+    return cursor
+
+
+def fetch_row(connection, sql, params=()):
+    """Execute ``sql`` as a prepared statement and return its first row, or None.
+
+    Every row is read off the cached cursor, so the connection is free for
+    the next statement even if the query matched more than one.
+    """
+    rows = execute_prepared(connection, sql, params).fetchall()
+    return rows[0] if rows else None
+
+
+def _forget_prepared(connection):
+    """Drop the prepared cursors cached on ``connection``."""
+    for cursor in connection.__dict__.pop("_prepared_cursors", {}).values():
+        try:
+            cursor.close()
+        except mysql.connector.Error:
+            pass
+
+
+class ConnectionManager:
+    """Thread-safe pool of database connections.
+
+    Connections are opened lazily up to ``pool_size`` and handed out most
+    recently used first. One that has sat idle longer than
+    ``HEALTH_CHECK_AFTER`` seconds is pinged on checkout and transparently
+    reconnected if the server dropped it; one that fails mid-use with a lost
+    connection error is discarded rather than returned to the pool. Every
+    connection is wrapped by ``billing_metrics.instrument``, so all
+    statements run through the pool are timed.
+    """
+
+    HEALTH_CHECK_AFTER = 30
+    RECONNECT_ATTEMPTS = 3
+    RECONNECT_DELAY = 1
+    CHECKOUT_TIMEOUT = 30
+
+    def __init__(self, config=DB_CONFIG, pool_size=4):
+        """Initialize an empty pool for ``config``."""
+        self.config = dict(config)
+        self.pool_size = pool_size
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._open = []
+        self._closed = False
+
+    @contextmanager
+    def connection(self):
+        """Check out a healthy connection for the duration of the ``with`` block.
+
+        Any transaction left open is rolled back on return, so the next user
+        never inherits uncommitted work or a stale read snapshot.
+        """
+        connection = self._checkout()
+        try:
+            yield connection
+        except mysql.connector.Error as e:
+            if is_connection_lost(e):
+                self._discard(connection)
+            else:
+                self._checkin(connection)
+            raise
+        except BaseException:
+            self._checkin(connection)
+            raise
+        else:
+            self._checkin(connection)
+
+    def run(self, fn, retry=False):
+        """Return ``fn(connection)``, retrying once on a lost connection if ``retry``.
+
+        Only pass ``retry=True`` for work that is safe to repeat, such as reads.
+        """
+        try:
+            with self.connection() as connection:
+                return fn(connection)
+        except mysql.connector.Error as e:
+            if not (retry and is_connection_lost(e)):
+                raise
+        with self.connection() as connection:
+            return fn(connection)
+
+    def close(self):
+        """Close every pooled connection and refuse further checkouts."""
+        with self._lock:
+            self._closed = True
+            connections, self._open = self._open, []
+        for connection in connections:
+            self._close_quietly(connection)
+
+    def _checkout(self):
+        """Return an idle connection, a new one, or wait for one to be returned."""
+        deadline = time.monotonic() + self.CHECKOUT_TIMEOUT
+        while True:
+            try:
+                connection, returned_at = self._idle.get_nowait()
+            except queue.Empty:
+                connection = self._open_new()
+                if connection is not None:
+                    return connection
+                try:
+                    connection, returned_at = self._idle.get(timeout=max(0, deadline - time.monotonic()))
+                except queue.Empty:
+                    raise mysql.connector.errors.PoolError("Timed out waiting for a database connection") from None
+            if time.monotonic() - returned_at > self.HEALTH_CHECK_AFTER:
+                self._ensure_alive(connection)
+            return connection
+
+    def _open_new(self):
+        """Open a connection if the pool has room, else return None."""
+        with self._lock:
+            if self._closed:
+                raise mysql.connector.errors.PoolError("Connection pool is closed")
+            if len(self._open) >= self.pool_size:
+                return None
+            # Reserve the slot before connecting so the lock isn't held over the network
+            self._open.append(None)
+        try:
+            connection = instrument(connect(self.config))
+        except BaseException:
+            with self._lock:
+                self._open.remove(None)
+            raise
+        with self._lock:
+            self._open[self._open.index(None)] = connection
+        return connection
+
+    def _ensure_alive(self, connection):
+        """Ping an idle connection and reconnect it if the server dropped it."""
+        connection_id = connection.connection_id
+        try:
+            connection.ping(reconnect=True, attempts=self.RECONNECT_ATTEMPTS, delay=self.RECONNECT_DELAY)
+        except mysql.connector.Error:
+            self._discard(connection)
+            raise
+        if connection.connection_id != connection_id:
+            # Server-side prepared statements died with the old session
+            _forget_prepared(connection)
+
+    def _checkin(self, connection):
+        """Return a connection to the idle pool, ending any open transaction."""
+        try:
+            if connection.in_transaction:
+                connection.rollback()
+        except mysql.connector.Error:
+            self._discard(connection)
+            return
+        with self._lock:
+            closed = self._closed
+        if closed:
+            self._close_quietly(connection)
+        else:
+            self._idle.put((connection, time.monotonic()))
+
+    def _discard(self, connection):
+        """Close a broken connection and free its pool slot."""
+        with self._lock:
+            if connection in self._open:
+                self._open.remove(connection)
+        self._close_quietly(connection)
+
+    @staticmethod
+    def _close_quietly(connection):
+        """Close ``connection``, ignoring errors from an already dead session."""
+        _forget_prepared(connection)
+        try:
+            connection.close()
+        except mysql.connector.Error:
+            pass
@@ -0,0 +1,221 @@
+"""Streaming export of the transaction history to CSV, JSONL or Parquet.
+
+Rows are read through an unbuffered cursor in ``fetchmany`` batches and
+written out as they arrive, so memory use stays flat however many bills are
+exported. ``--archived`` includes the months moved to the archive by
+``billing_archive``. Parquet output needs the optional ``pyarrow`` package.
+
+Usage:
+    python billing_export.py bills.csv
+    python billing_export.py bills.jsonl --from 2024-01-01 --to 2024-02-01
+    python billing_export.py bills.parquet
+    python billing_export.py history.csv --archived --to 2024-01-01
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+import mysql.connector
+
+from billing_archive import ALL_BILLS
+from billing_connection import DB_CONFIG, connect
+
+FORMATS = ("csv", "jsonl", "parquet")
+
+COLUMNS = [
+    "bill_id",
+    "invoice_id",
+    "created_at",
+    "customer",
+    "phone",
+    "item",
+    "quantity",
+    "price",
+    "payment_method",
+    "total",
+]
+
+EXPORT_QUERY = """
+    SELECT b.bill_id, b.invoice_id, b.created_at, c.name, c.phone, b.item, b.quantity, b.price,
+           b.payment_method, b.price * b.quantity AS total
+    FROM {bills} b
+    JOIN customers c ON b.customer_id = c.customer_id
+    {where}
+    ORDER BY b.bill_id
+"""
+
+BATCH_SIZE = 10000
+
+
+def format_for_path(path):
+    """Return the export format implied by the extension of ``path``."""
+    extension = os.path.splitext(path)[1].lower().lstrip(".")
+    if extension == "ndjson":
+        return "jsonl"
+    if extension not in FORMATS:
+        raise ValueError(f"Cannot tell the export format from {path!r}; use .csv, .jsonl or .parquet")
+    return extension
+
+
+class _CsvWriter:
+    """Write batches of rows as CSV with a header line."""
+
+    def __init__(self, path):
+        """Open ``path`` and write the header line."""
+        self._file = open(path, "w", newline="", encoding="utf-8")
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(COLUMNS)
+
+    def write(self, rows):
+        """Append a batch of rows."""
+        self._writer.writerows(rows)
+
+    def close(self):
+        """Flush and close the file."""
+        self._file.close()
+
+
+class _JsonlWriter:
+    """Write batches of rows as one JSON object per line."""
+
+    def __init__(self, path):
+        """Open ``path`` for writing."""
+        self._file = open(path, "w", encoding="utf-8")
+
+    def write(self, rows):
+        """Append a batch of rows."""
+        for row in rows:
+            record = dict(zip(COLUMNS, row))
+            record["created_at"] = record["created_at"].isoformat() if record["created_at"] else None
+            record["price"] = str(record["price"])
+            record["total"] = str(record["total"])
+            self._file.write(json.dumps(record, ensure_ascii=False))
+            self._file.write("\n")
+
+    def close(self):
+        """Flush and close the file."""
+        self._file.close()
+
+
+class _ParquetWriter:
+    """Write each batch of rows as one Parquet row group."""
+
+    def __init__(self, path):
+        """Open a Parquet writer on ``path``, failing clearly without pyarrow."""
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise RuntimeError("Parquet export needs pyarrow: pip install pyarrow") from None
+        self._pyarrow = pyarrow
+        self._schema = pyarrow.schema(
+            [
+                ("bill_id", pyarrow.int64()),
+                ("invoice_id", pyarrow.int64()),
+                ("created_at", pyarrow.timestamp("s")),
+                ("customer", pyarrow.string()),
+                ("phone", pyarrow.string()),
+                ("item", pyarrow.string()),
+                ("quantity", pyarrow.int64()),
+                ("price", pyarrow.decimal128(10, 2)),
+                ("payment_method", pyarrow.string()),
+                ("total", pyarrow.decimal128(20, 2)),
+            ]
+        )
+        self._writer = pyarrow.parquet.ParquetWriter(path, self._schema)
+
+    def write(self, rows):
+        """Append a batch of rows as a row group."""
+        columns = list(zip(*rows))
+        self._writer.write_table(self._pyarrow.Table.from_arrays(columns, schema=self._schema))
+
+    def close(self):
+        """Write the footer and close the file."""
+        self._writer.close()
+
+
+WRITERS = {"csv": _CsvWriter, "jsonl": _JsonlWriter, "parquet": _ParquetWriter}
+
+
+def export_bills(connection, path, fmt=None, date_from=None, date_to=None, batch_size=BATCH_SIZE, archived=False):
+    """Stream bills created in ``[date_from, date_to)`` to ``path`` and return the row count.
+
+    Either bound may be None to leave that side of the range open. Archived
+    bills are only included when ``archived`` is true.
+    """
+    fmt = fmt or format_for_path(path)
+    conditions, params = [], []
+    if date_from is not None:
+        conditions.append("b.created_at >= %s")
+        params.append(date_from)
+    if date_to is not None:
+        conditions.append("b.created_at < %s")
+        params.append(date_to)
+    where = "WHERE " + " AND ".join(conditions) if conditions else ""
+
+    writer = WRITERS[fmt](path)
+    count = 0
+    try:
+        with connection.cursor(buffered=False) as cursor:
+            cursor.execute(EXPORT_QUERY.format(bills=ALL_BILLS if archived else "bills", where=where), params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                writer.write(rows)
+                count += len(rows)
+    finally:
+        writer.close()
+    return count
+
+
+def _parse_date(value):
+    """Parse an ISO date or timestamp given on the command line."""
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid date: {value!r}") from None
+
+
+def main(argv=None):
+    """Run the exporter from the command line."""
+    parser = argparse.ArgumentParser(description="Export billing transactions to CSV, JSONL or Parquet.")
+    parser.add_argument("path", help="output file (.csv, .jsonl or .parquet)")
+    parser.add_argument("--format", choices=FORMATS, help="output format (default: from the file extension)")
+    parser.add_argument("--from", dest="date_from", type=_parse_date, help="only bills created at or after this date")
+    parser.add_argument("--to", dest="date_to", type=_parse_date, help="only bills created before this date")
+    parser.add_argument("--archived", action="store_true", help="include bills moved to the archive")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help=f"rows per fetch (default: {BATCH_SIZE})")
+    args = parser.parse_args(argv)
+
+    try:
+        fmt = args.format or format_for_path(args.path)
+        connection = connect(DB_CONFIG)
+    except (ValueError, mysql.connector.Error) as e:
+        print(f"Cannot export: {e}", file=sys.stderr)
+        return 1
+
+    try:
+        started = time.perf_counter()
+        count = export_bills(
+            connection, args.path, fmt, args.date_from, args.date_to, args.batch_size, archived=args.archived
+        )
+        elapsed = time.perf_counter() - started
+    except (RuntimeError, mysql.connector.Error) as e:
+        print(f"Export failed: {e}", file=sys.stderr)
+        return 1
+    finally:
+        connection.close()
+
+    rate = count / elapsed if elapsed > 0 else 0
+    print(f"Exported {count} rows to {args.path} in {elapsed:.2f}s: {rate:,.0f} rows/s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,329 @@
+"""Bulk import of historical or batch transactions from CSV or JSONL files.
+
+Each input row is one line item with the columns ``name``, ``phone``,
+``item``, ``quantity``, ``price`` and optionally ``payment_method``,
+``created_at`` (ISO 8601) and ``invoice``. Consecutive rows sharing an
+``invoice`` value are saved as one multi-item bill; rows without one become
+single-item bills. Rows are validated with the same rules as the billing form
+before anything is written, then inserted in batched transactions.
+
+Usage:
+    python billing_import.py history.csv
+    python billing_import.py tills.jsonl --batch-size 10000 --load-data
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+from decimal import Decimal
+
+import mysql.connector
+
+import billing_schema
+from billing_catalog import save_items
+from billing_reports import add_sales
+from billing_connection import DB_CONFIG, connect
+from billing_validation import ValidationError, text_field, validate_customer, validate_line_item
+
+# Invalid rows to list before giving up on reporting more
+MAX_REPORTED_ERRORS = 20
+
+
+def read_records(path):
+    """Yield ``(line_number, record)`` pairs from a CSV or JSONL file.
+
+    CSV records are row dicts. JSONL records are the lines themselves, left
+    for ``parse_record`` to decode, so a malformed line is reported as an
+    invalid row like any other.
+    """
+    with open(path, newline="", encoding="utf-8") as source:
+        if path.lower().endswith((".jsonl", ".ndjson")):
+            for line_number, line in enumerate(source, 1):
+                if line.strip():
+                    yield line_number, line
+        else:
+            # Line 1 is the header row
+            for line_number, record in enumerate(csv.DictReader(source), 2):
+                yield line_number, record
+
+
+def parse_record(record, default_created_at):
+    """Return a validated row dict, raising ValidationError if the record is invalid.
+
+    ``record`` is a CSV row dict or a JSONL line still to be decoded.
+    """
+    if isinstance(record, str):
+        try:
+            record = json.loads(record)
+        except json.JSONDecodeError as e:
+            raise ValidationError("Invalid Input", f"Invalid JSON: {e.msg} at column {e.colno}") from None
+        if not isinstance(record, dict):
+            raise ValidationError("Invalid Input", "Expected a JSON object")
+    try:
+        return _parse_fields(record, default_created_at)
+    except (TypeError, AttributeError) as e:
+        # A decoded value of a type no rule expected
+        raise ValidationError("Invalid Input", f"Invalid value: {e}") from None
+
+
+def _parse_fields(record, default_created_at):
+    """Return the validated row dict for the fields of a decoded ``record``."""
+    name, phone = validate_customer(text_field(record, "name"), text_field(record, "phone"))
+    item, quantity, price = validate_line_item(text_field(record, "item"), record.get("quantity"), record.get("price"))
+    payment_method = (text_field(record, "payment_method") or "Cash").strip() or "Cash"
+
+    created_at = (text_field(record, "created_at") or "").strip()
+    try:
+        created_at = datetime.fromisoformat(created_at) if created_at else default_created_at
+    except ValueError:
+        raise ValidationError("Invalid Input", f"Invalid created_at timestamp: {created_at!r}") from None
+
+    return {
+        "name": name,
+        "phone": phone,
+        "item": item,
+        "quantity": quantity,
+        "price": Decimal(str(price)),
+        "payment_method": payment_method,
+        "created_at": created_at,
+        "invoice": str(record.get("invoice") or "").strip(),
+    }
+
+
+def validate_file(path):
+    """Return ``(invalid_count, first_errors)`` for ``path`` without touching the database."""
+    now = datetime.now().replace(microsecond=0)
+    invalid, errors = 0, []
+    for line_number, record in read_records(path):
+        try:
+            parse_record(record, now)
+        except ValidationError as e:
+            invalid += 1
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append((line_number, str(e)))
+    return invalid, errors
+
+
+def read_invoices(path):
+    """Yield invoices as dicts with a ``lines`` list, skipping invalid rows."""
+    now = datetime.now().replace(microsecond=0)
+    invoice = None
+    for _line_number, record in read_records(path):
+        try:
+            row = parse_record(record, now)
+        except ValidationError:
+            continue
+        line = (row["item"], row["quantity"], row["price"])
+        if invoice is not None and row["invoice"] and row["invoice"] == invoice["invoice"]:
+            invoice["lines"].append(line)
+            continue
+        if invoice is not None:
+            yield invoice
+        invoice = dict(row, lines=[line])
+    if invoice is not None:
+        yield invoice
+
+
+class BulkImporter:
+    """Write invoices to the database in large batched transactions.
+
+    Each batch briefly holds write locks on the billing tables so it can
+    assign customer and invoice ids itself; that lets every table be written
+    with one multi-row ``executemany`` (or ``LOAD DATA LOCAL INFILE``) and the
+    whole batch committed at once, without a round trip per invoice.
+    """
+
+    LOCK_TABLES = (
+        "LOCK TABLES customers WRITE, invoices WRITE, bills WRITE, bill_totals WRITE, items WRITE, "
+        "sales_daily WRITE, sales_items_monthly WRITE, sales_customers_monthly WRITE"
+    )
+
+    def __init__(self, connection, batch_size=5000, load_data=False):
+        """Initialize an importer writing through ``connection``."""
+        self.connection = connection
+        self.batch_size = batch_size
+        self.load_data = load_data
+        self._customer_ids = {}
+        self.rows = 0
+        self.invoices = 0
+
+    def run(self, invoices):
+        """Import every invoice from the ``invoices`` iterable."""
+        batch = []
+        for invoice in invoices:
+            batch.append(invoice)
+            if len(batch) >= self.batch_size:
+                self._write_batch(batch)
+                batch = []
+        if batch:
+            self._write_batch(batch)
+
+    def _write_batch(self, batch):
+        """Insert one batch of invoices in a single transaction."""
+        with self.connection.cursor() as cursor:
+            cursor.execute(self.LOCK_TABLES)
+            try:
+                customer_ids = self._insert_batch(cursor, batch)
+                self.connection.commit()
+            except BaseException:
+                self.connection.rollback()
+                raise
+            finally:
+                cursor.execute("UNLOCK TABLES")
+        self._customer_ids.update(customer_ids)
+        self.invoices += len(batch)
+        self.rows += sum(len(invoice["lines"]) for invoice in batch)
+
+    def _insert_batch(self, cursor, batch):
+        """Assign ids and write customers, invoices, lines and totals for ``batch``.
+
+        Returns ``{phone: customer_id}`` for every phone the batch touched.
+        """
+        customer_id = self._max_id(cursor, "customers", "customer_id")
+        invoice_id = self._max_id(cursor, "invoices", "invoice_id")
+        known = self._lookup_customers(cursor, {invoice["phone"] for invoice in batch if invoice["phone"]})
+
+        new_customers, invoice_rows, bill_rows = [], [], []
+        revenue = Decimal(0)
+        for invoice in batch:
+            phone = invoice["phone"]
+            invoice_customer = known.get(phone) if phone else None
+            if invoice_customer is None:
+                customer_id += 1
+                invoice_customer = customer_id
+                new_customers.append((customer_id, invoice["name"], phone or None))
+                if phone:
+                    known[phone] = customer_id
+            invoice_id += 1
+            invoice_rows.append((invoice_id, invoice_customer, invoice["payment_method"], invoice["created_at"]))
+            for item, quantity, price in invoice["lines"]:
+                bill_rows.append(
+                    (invoice_id, invoice_customer, item, quantity, price, invoice["payment_method"], invoice["created_at"])
+                )
+                revenue += quantity * price
+
+        if new_customers:
+            cursor.executemany("INSERT INTO customers (customer_id, name, phone) VALUES (%s, %s, %s)", new_customers)
+        self._insert_rows(cursor, "invoices", ["invoice_id", "customer_id", "payment_method", "created_at"], invoice_rows)
+        self._insert_rows(
+            cursor,
+            "bills",
+            ["invoice_id", "customer_id", "item", "quantity", "price", "payment_method", "created_at"],
+            bill_rows,
+        )
+        cursor.execute(
+            "UPDATE bill_totals SET bill_count = bill_count + %s, revenue = revenue + %s WHERE id = 1",
+            (len(bill_rows), revenue),
+        )
+        save_items(cursor, [line for invoice in batch for line in invoice["lines"]])
+        add_sales(cursor, bill_rows)
+        return known
+
+    def _lookup_customers(self, cursor, phones):
+        """Return ``{phone: customer_id}`` for the phones that already exist."""
+        found = {phone: self._customer_ids[phone] for phone in phones if phone in self._customer_ids}
+        missing = [phone for phone in phones if phone not in found]
+        for start in range(0, len(missing), 1000):
+            chunk = missing[start:start + 1000]
+            placeholders = ", ".join(["%s"] * len(chunk))
+            cursor.execute(f"SELECT phone, customer_id FROM customers WHERE phone IN ({placeholders})", chunk)
+            found.update(cursor.fetchall())
+        return found
+
+    def _insert_rows(self, cursor, table, columns, rows):
+        """Bulk insert ``rows`` into ``table`` with executemany or LOAD DATA."""
+        if self.load_data:
+            self._load_rows(cursor, table, columns, rows)
+            return
+        placeholders = ", ".join(["%s"] * len(columns))
+        cursor.executemany(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})", rows)
+
+    def _load_rows(self, cursor, table, columns, rows):
+        """Stream ``rows`` to the server through a temporary file and LOAD DATA LOCAL INFILE."""
+        with tempfile.NamedTemporaryFile("w", suffix=".tsv", encoding="utf-8", delete=False) as spool:
+            for row in rows:
+                spool.write("\t".join(self._tsv_field(value) for value in row))
+                spool.write("\n")
+        try:
+            cursor.execute(
+                f"""
+                LOAD DATA LOCAL INFILE %s INTO TABLE {table}
+                CHARACTER SET utf8mb4
+                FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\'
+                LINES TERMINATED BY '\\n'
+                ({', '.join(columns)})
+                """,
+                (spool.name,),
+            )
+        finally:
+            os.unlink(spool.name)
+
+    @staticmethod
+    def _tsv_field(value):
+        """Encode one value in LOAD DATA's default escaping."""
+        if value is None:
+            return "\\N"
+        if isinstance(value, datetime):
+            return value.strftime("%Y-%m-%d %H:%M:%S")
+        return str(value).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n")
+
+    @staticmethod
+    def _max_id(cursor, table, column):
+        """Return the largest id currently in ``table``, or 0 when empty."""
+        cursor.execute(f"SELECT COALESCE(MAX({column}), 0) FROM {table}")
+        return cursor.fetchone()[0]
+
+
+def main(argv=None):
+    """Run the importer from the command line."""
+    parser = argparse.ArgumentParser(description="Import transactions from CSV or JSONL into the billing database.")
+    parser.add_argument("path", help="CSV file with a header row, or a .jsonl file")
+    parser.add_argument("--batch-size", type=int, default=5000, help="invoices per transaction (default: 5000)")
+    parser.add_argument("--load-data", action="store_true", help="use LOAD DATA LOCAL INFILE instead of executemany")
+    parser.add_argument("--skip-invalid", action="store_true", help="import valid rows even if some rows are invalid")
+    args = parser.parse_args(argv)
+    if args.load_data and DB_CONFIG.get("backend") == "sqlite":
+        parser.error("--load-data needs a MySQL server")
+
+    invalid, errors = validate_file(args.path)
+    for line_number, message in errors:
+        print(f"{args.path}:{line_number}: {message}", file=sys.stderr)
+    if invalid > len(errors):
+        print(f"... and {invalid - len(errors)} more invalid rows", file=sys.stderr)
+    if invalid and not args.skip_invalid:
+        print("Nothing imported; fix the rows above or pass --skip-invalid.", file=sys.stderr)
+        return 1
+
+    try:
+        connection = connect(DB_CONFIG, allow_local_infile=args.load_data)
+    except mysql.connector.Error as e:
+        print(f"Cannot connect to database: {e}", file=sys.stderr)
+        return 1
+
+    try:
+        billing_schema.migrate(connection)
+        importer = BulkImporter(connection, batch_size=args.batch_size, load_data=args.load_data)
+        started = time.perf_counter()
+        importer.run(read_invoices(args.path))
+        elapsed = time.perf_counter() - started
+    except mysql.connector.Error as e:
+        print(f"Import failed: {e}", file=sys.stderr)
+        return 1
+    finally:
+        connection.close()
+
+    rate = importer.rows / elapsed if elapsed > 0 else 0
+    print(
+        f"Imported {importer.rows} rows in {importer.invoices} bills "
+        f"({invalid} invalid rows skipped) in {elapsed:.2f}s: {rate:,.0f} rows/s"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
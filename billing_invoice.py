@@ -0,0 +1,341 @@
+"""Printable invoices, rendered to PDF or HTML one at a time or in batches.
+
+An invoice is laid out as HTML in the app's colour theme and typeset into
+a PDF by ``QTextDocument`` and ``QPdfWriter``. ``InvoiceRenderer`` fills
+the theme into the page template once and keeps one document whose
+stylesheet is parsed once, so each invoice only costs filling in its own
+fields and rows and laying out the page.
+
+The app hands each bill's invoice to a ``BackgroundRenderer`` worker
+process right after it is saved, so the counter never waits on it. The
+command line renders every invoice with bills in a date range, in chunks
+spread over a pool of worker processes, so typesetting runs on every core.
+
+Usage:
+    python billing_invoice.py --from 2024-06-01 --to 2024-06-02
+    python billing_invoice.py --from 2024-06-01 --to 2024-07-01 --out june --format html --workers 8
+"""
+
+import argparse
+import html
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime, timedelta
+from itertools import islice
+from string import Template
+
+import mysql.connector
+from PySide6.QtCore import QBuffer, QByteArray, QIODevice
+from PySide6.QtGui import QGuiApplication, QPageSize, QPdfWriter, QTextDocument
+
+from billing_archive import ALL_BILLS
+from billing_connection import DB_CONFIG, connect
+from billing_theme import COLORS
+
+FORMATS = ("pdf", "html")
+
+INVOICE_DIR = os.path.join(os.path.expanduser("~"), "Invoices")
+
+SHOP_NAME = "Elegant Billing System"
+
+# Resolution the PDF is typeset at; enough for a receipt printer or A4 laser
+PDF_DPI = 300
+
+# Invoices handed to a worker process at a time
+CHUNK_SIZE = 200
+
+BATCH_SIZE = 10000
+
+STYLE = """
+body { color: $text; font-family: 'Segoe UI', sans-serif; font-size: 10pt; }
+h1 { color: $primary; font-size: 20pt; }
+h2 { color: $text; font-size: 14pt; }
+th { background-color: $primary; color: #ffffff; text-align: left; }
+table.lines td { border-bottom: 1px solid $border; }
+.muted { color: $text_light; }
+.amount { text-align: right; }
+.total { color: $secondary; font-size: 14pt; font-weight: bold; }
+"""
+
+PAGE = """<html>
+<head><meta charset="utf-8"><title>Invoice $invoice_id</title>$head</head>
+<body>
+<table width="100%"><tr>
+<td><h1>$shop</h1></td>
+<td class="amount"><h2>Invoice #$invoice_id</h2><span class="muted">$created_at</span></td>
+</tr></table>
+<p><b>Billed to:</b> $name<br><span class="muted">$phone</span></p>
+<table class="lines" width="100%" cellspacing="0" cellpadding="6">
+<tr><th>#</th><th>Item</th><th class="amount">Qty</th><th class="amount">Price</th><th class="amount">Amount</th></tr>
+$rows
+</table>
+<p class="amount">Paid by $payment_method</p>
+<p class="amount total">Total: ₹$total</p>
+</body>
+</html>
+"""
+
+ROW = Template(
+    '<tr><td>$number</td><td>$item</td><td class="amount">$quantity</td>'
+    '<td class="amount">₹$price</td><td class="amount">₹$amount</td></tr>'
+)
+
+INVOICE_QUERY = """
+    SELECT b.invoice_id, b.created_at, c.name, c.phone, b.payment_method, b.item, b.quantity, b.price
+    FROM {bills} b
+    LEFT JOIN customers c ON c.customer_id = b.customer_id
+    WHERE b.created_at >= %s AND b.created_at < %s
+    ORDER BY b.invoice_id, b.bill_id
+"""
+
+
+def invoice_filename(invoice_id, fmt="pdf"):
+    """Return the file name an invoice is written under."""
+    return f"invoice-{invoice_id}.{fmt}"
+
+
+class InvoiceRenderer:
+    """Render invoices with a page template compiled once for a colour theme.
+
+    Invoices are dicts shaped like ``billing_repository.new_invoice``
+    results: ``name``, ``phone``, ``payment_method``, ``created_at`` and
+    ``lines`` of ``(item, quantity, price)``.
+    """
+
+    def __init__(self, colors=COLORS):
+        """Initialize a renderer for the ``colors`` theme."""
+        self.style = Template(STYLE).substitute(colors)
+        # Only the per-invoice fields are left to fill in
+        self._page = Template(Template(PAGE).safe_substitute(shop=html.escape(SHOP_NAME)))
+        self._standalone_head = f"<style>{self.style}</style>"
+        self._document = None
+
+    def html(self, invoice_id, invoice, standalone=True):
+        """Return the invoice as an HTML page, with its stylesheet inlined if ``standalone``."""
+        rows = []
+        total = 0
+        for number, (item, quantity, price) in enumerate(invoice["lines"], 1):
+            amount = quantity * price
+            total += amount
+            rows.append(
+                ROW.substitute(
+                    number=number,
+                    item=html.escape(item),
+                    quantity=quantity,
+                    price=f"{price:,.2f}",
+                    amount=f"{amount:,.2f}",
+                )
+            )
+        return self._page.substitute(
+            head=self._standalone_head if standalone else "",
+            invoice_id=invoice_id,
+            created_at=f"{invoice['created_at']:%d %b %Y, %H:%M}",
+            name=html.escape(invoice["name"] or ""),
+            phone=html.escape(invoice["phone"] or ""),
+            payment_method=html.escape(invoice["payment_method"] or "Cash"),
+            rows="\n".join(rows),
+            total=f"{total:,.2f}",
+        )
+
+    def pdf(self, invoice_id, invoice):
+        """Return the invoice typeset as PDF bytes."""
+        if self._document is None:
+            self._document = QTextDocument()
+            self._document.setDefaultStyleSheet(self.style)
+        self._document.setHtml(self.html(invoice_id, invoice, standalone=False))
+
+        data = QByteArray()
+        buffer = QBuffer(data)
+        buffer.open(QIODevice.WriteOnly)
+        writer = QPdfWriter(buffer)
+        writer.setPageSize(QPageSize(QPageSize.A5))
+        writer.setResolution(PDF_DPI)
+        writer.setTitle(f"Invoice {invoice_id}")
+        writer.setCreator(SHOP_NAME)
+        self._document.print_(writer)
+        buffer.close()
+        return data.data()
+
+    def save(self, invoice_id, invoice, directory=INVOICE_DIR, fmt="pdf"):
+        """Write the invoice into ``directory`` and return the file's path."""
+        path = os.path.join(directory, invoice_filename(invoice_id, fmt))
+        if fmt == "pdf":
+            with open(path, "wb") as target:
+                target.write(self.pdf(invoice_id, invoice))
+        else:
+            with open(path, "w", encoding="utf-8") as target:
+                target.write(self.html(invoice_id, invoice))
+        return path
+
+
+def read_invoices(connection, date_from, date_to, archived=False, batch_size=BATCH_SIZE):
+    """Yield ``(invoice_id, invoice)`` for every invoice with bills created in ``[date_from, date_to)``.
+
+    Rows are streamed through an unbuffered cursor; archived bills are only
+    included when ``archived`` is true.
+    """
+    current_id = invoice = None
+    with connection.cursor(buffered=False) as cursor:
+        cursor.execute(INVOICE_QUERY.format(bills=ALL_BILLS if archived else "bills"), (date_from, date_to))
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for invoice_id, created_at, name, phone, payment_method, item, quantity, price in rows:
+                if invoice_id != current_id:
+                    if invoice is not None:
+                        yield current_id, invoice
+                    current_id = invoice_id
+                    invoice = {
+                        "name": name,
+                        "phone": phone,
+                        "payment_method": payment_method,
+                        "created_at": created_at,
+                        "lines": [],
+                    }
+                invoice["lines"].append((item, quantity, price))
+    if invoice is not None:
+        yield current_id, invoice
+
+
+# Workers are spawned rather than forked: Qt and open connections do not survive a fork
+_SPAWN = multiprocessing.get_context("spawn")
+
+# Per worker process, set up by _start_worker
+_application = None
+_renderer = None
+
+
+def _start_worker(colors, fmt):
+    """Set up Qt, when typesetting PDFs, and a renderer in a new worker process."""
+    global _application, _renderer
+    if fmt == "pdf":
+        os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+        _application = QGuiApplication.instance() or QGuiApplication([])
+    _renderer = InvoiceRenderer(colors)
+
+
+def _render_chunk(invoices, directory, fmt):
+    """Render a chunk of invoices in a worker process and return how many were written."""
+    for invoice_id, invoice in invoices:
+        _renderer.save(invoice_id, invoice, directory, fmt)
+    return len(invoices)
+
+
+def _render_one(invoice_id, invoice, directory, fmt):
+    """Render one invoice in a worker process and return its path."""
+    os.makedirs(directory, exist_ok=True)
+    return _renderer.save(invoice_id, invoice, directory, fmt)
+
+
+class BackgroundRenderer:
+    """Render single invoices in a worker process, so typesetting never blocks the caller.
+
+    The worker is started with the first invoice and kept for the next
+    ones; invoices are rendered one at a time, in the order submitted.
+    """
+
+    def __init__(self, colors=COLORS, directory=INVOICE_DIR, fmt="pdf"):
+        """Initialize a renderer writing ``fmt`` invoices into ``directory``."""
+        self.colors = colors
+        self.directory = directory
+        self.fmt = fmt
+        self._pool = None
+
+    def submit(self, invoice_id, invoice):
+        """Queue an invoice and return a future resolving to the path it was written to."""
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                1, mp_context=_SPAWN, initializer=_start_worker, initargs=(self.colors, self.fmt)
+            )
+        return self._pool.submit(_render_one, invoice_id, invoice, self.directory, self.fmt)
+
+    def shutdown(self):
+        """Finish the queued invoices and stop the worker."""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+
+def render_batch(invoices, directory=INVOICE_DIR, fmt="pdf", workers=None, chunk_size=CHUNK_SIZE, colors=COLORS):
+    """Render ``(invoice_id, invoice)`` pairs into ``directory`` on a process pool and return the count.
+
+    Invoices are read from the iterable as workers free up, keeping at
+    most two chunks per worker in flight, so a long range never sits in
+    memory whole.
+    """
+    os.makedirs(directory, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+    invoices = iter(invoices)
+    count = 0
+    with ProcessPoolExecutor(workers, mp_context=_SPAWN, initializer=_start_worker, initargs=(colors, fmt)) as pool:
+        pending = set()
+        while True:
+            chunk = list(islice(invoices, chunk_size))
+            if not chunk:
+                break
+            if len(pending) >= 2 * workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                count += sum(future.result() for future in done)
+            pending.add(pool.submit(_render_chunk, chunk, directory, fmt))
+        count += sum(future.result() for future in wait(pending).done)
+    return count
+
+
+def _parse_date(value):
+    """Parse an ISO date or timestamp given on the command line."""
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid date: {value!r}") from None
+
+
+def main(argv=None):
+    """Render the invoices for a date range from the command line."""
+    parser = argparse.ArgumentParser(description="Render the invoices for a date range to PDF or HTML.")
+    parser.add_argument(
+        "--from", dest="date_from", type=_parse_date, required=True, help="only bills created at or after this date"
+    )
+    parser.add_argument(
+        "--to", dest="date_to", type=_parse_date, help="only bills created before this date (default: the next day)"
+    )
+    parser.add_argument("--out", default=INVOICE_DIR, help=f"output directory (default: {INVOICE_DIR})")
+    parser.add_argument("--format", choices=FORMATS, default="pdf", help="output format (default: pdf)")
+    parser.add_argument("--workers", type=int, help="worker processes (default: one per core)")
+    parser.add_argument("--archived", action="store_true", help="include bills moved to the archive")
+    args = parser.parse_args(argv)
+    date_to = args.date_to or args.date_from + timedelta(days=1)
+    if args.workers is not None and args.workers < 1:
+        parser.error("--workers must be at least 1")
+
+    try:
+        connection = connect(DB_CONFIG)
+    except mysql.connector.Error as e:
+        print(f"Cannot connect to database: {e}", file=sys.stderr)
+        return 1
+
+    try:
+        started = time.perf_counter()
+        count = render_batch(
+            read_invoices(connection, args.date_from, date_to, archived=args.archived),
+            args.out,
+            args.format,
+            args.workers,
+        )
+        elapsed = time.perf_counter() - started
+    except (OSError, RuntimeError, mysql.connector.Error) as e:
+        print(f"Rendering failed: {e}", file=sys.stderr)
+        return 1
+    finally:
+        connection.close()
+
+    rate = count / elapsed if elapsed > 0 else 0
+    print(f"Rendered {count} invoices to {args.out} in {elapsed:.2f}s: {rate:,.0f} invoices/s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
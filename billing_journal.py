@@ -0,0 +1,109 @@
+"""Durable local queue of bills saved while the database was unreachable.
+
+Queued invoices are kept in a small SQLite file next to the user's home
+directory, so they survive a crash or restart until they have been replayed
+to MySQL. Every invoice carries a ``client_ref`` that is stored in the
+``invoices`` table on replay; replaying an invoice that already made it to
+the server is detected by that reference and skipped, which keeps replay
+idempotent. Only a count is held in memory; entries are read back in
+batches.
+"""
+
+import json
+import os
+import sqlite3
+from datetime import datetime
+
+DEFAULT_PATH = os.path.join(os.path.expanduser("~"), ".billing_journal.sqlite3")
+
+
+def _encode(invoice):
+    """Serialize an invoice dict for storage."""
+    record = dict(invoice, created_at=invoice["created_at"].isoformat())
+    return json.dumps(record, ensure_ascii=False)
+
+
+def _decode(payload):
+    """Restore an invoice dict written by ``_encode``."""
+    invoice = json.loads(payload)
+    invoice["created_at"] = datetime.fromisoformat(invoice["created_at"])
+    invoice["lines"] = [tuple(line) for line in invoice["lines"]]
+    return invoice
+
+
+class Journal:
+    """Append-only queue of invoices waiting to be written to MySQL.
+
+    Meant to be used from a single thread. Invoices that the server rejects
+    outright can be moved aside with ``reject`` so they do not block the
+    rest of the queue.
+    """
+
+    def __init__(self, path=DEFAULT_PATH):
+        """Open or create the journal at ``path``."""
+        self.path = path
+        self._db = sqlite3.connect(path)
+        self._db.execute("PRAGMA journal_mode = WAL")
+        self._db.execute("PRAGMA synchronous = FULL")
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS pending (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                client_ref TEXT NOT NULL UNIQUE,
+                invoice TEXT NOT NULL
+            )
+            """
+        )
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS rejected (
+                client_ref TEXT PRIMARY KEY,
+                invoice TEXT NOT NULL,
+                error TEXT NOT NULL,
+                rejected_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+            )
+            """
+        )
+        self._db.commit()
+        self._count = self._db.execute("SELECT COUNT(*) FROM pending").fetchone()[0]
+
+    def __len__(self):
+        """Return the number of invoices waiting to be replayed."""
+        return self._count
+
+    def append(self, invoice):
+        """Durably queue ``invoice``; queuing the same ``client_ref`` twice is a no-op."""
+        with self._db:
+            cursor = self._db.execute(
+                "INSERT OR IGNORE INTO pending (client_ref, invoice) VALUES (?, ?)",
+                (invoice["client_ref"], _encode(invoice)),
+            )
+        self._count += cursor.rowcount
+
+    def peek(self, limit):
+        """Return up to ``limit`` of the oldest queued invoices without removing them."""
+        rows = self._db.execute("SELECT invoice FROM pending ORDER BY seq LIMIT ?", (limit,)).fetchall()
+        return [_decode(payload) for (payload,) in rows]
+
+    def remove(self, client_refs):
+        """Drop the invoices with the given references once they are safely on the server."""
+        with self._db:
+            cursor = self._db.executemany("DELETE FROM pending WHERE client_ref = ?", [(ref,) for ref in client_refs])
+        self._count -= cursor.rowcount
+
+    def reject(self, client_ref, error):
+        """Move an invoice the server will not accept out of the queue."""
+        with self._db:
+            self._db.execute(
+                """
+                INSERT OR REPLACE INTO rejected (client_ref, invoice, error)
+                SELECT client_ref, invoice, ? FROM pending WHERE client_ref = ?
+                """,
+                (error, client_ref),
+            )
+            cursor = self._db.execute("DELETE FROM pending WHERE client_ref = ?", (client_ref,))
+        self._count -= cursor.rowcount
+
+    def close(self):
+        """Close the journal file."""
+        self._db.close()
@@ -0,0 +1,151 @@
+"""Load test for the HTTP ingest service against a local database.
+
+Simulates many terminals, each posting bills one after another over its
+own keep-alive connection, and reports throughput and latency. Unless
+``--url`` points at a running service, one is started in-process against
+the database in ``DB_CONFIG``, which also reports how many bills each
+shared transaction carried.
+
+Every bill written is real, so point this at a scratch database.
+
+Usage:
+    python billing_loadtest.py --terminals 50 --bills 200
+    python billing_loadtest.py --url http://127.0.0.1:8080 --terminals 20
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from urllib.parse import urlsplit
+
+import mysql.connector
+
+import billing_schema
+from billing_connection import DB_CONFIG, ConnectionManager
+from billing_server import BillingServer
+from billing_validation import PAYMENT_METHODS
+
+
+def _random_bill(terminal, number, lines):
+    """Return a plausible bill body for ``terminal``."""
+    return {
+        "name": f"Load Test {terminal}",
+        "phone": f"9{terminal:04d}{number % 1000:05d}",
+        "payment_method": random.choice(PAYMENT_METHODS),
+        "lines": [
+            {
+                "item": f"Item {random.randrange(500)}",
+                "quantity": random.randint(1, 5),
+                "price": random.randint(100, 99999) / 100,
+            }
+            for _ in range(lines)
+        ],
+    }
+
+
+async def _post(reader, writer, host, body):
+    """Send one POST /bills on an open connection and return the response status."""
+    writer.write(
+        (
+            f"POST /bills HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n\r\n"
+        ).encode("latin-1")
+        + body
+    )
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        key, _, value = line.decode("latin-1").partition(":")
+        if key.strip().lower() == "content-length":
+            length = int(value)
+    await reader.readexactly(length)
+    return status
+
+
+async def _terminal(host, port, terminal, bills, lines, latencies, errors):
+    """Post ``bills`` bills in sequence, recording each latency."""
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for number in range(bills):
+            body = json.dumps(_random_bill(terminal, number, lines)).encode()
+            started = time.perf_counter()
+            status = await _post(reader, writer, host, body)
+            latencies.append(time.perf_counter() - started)
+            if status not in (200, 201):
+                errors.append(status)
+    finally:
+        writer.close()
+
+
+def _percentile(sorted_values, fraction):
+    """Return the value at ``fraction`` of the way through ``sorted_values``."""
+    index = min(len(sorted_values) - 1, int(len(sorted_values) * fraction))
+    return sorted_values[index]
+
+
+async def run(url, terminals, bills, lines, writers):
+    """Run the load test and print a report."""
+    server = manager = None
+    if url:
+        parts = urlsplit(url)
+        host, port = parts.hostname, parts.port or 80
+    else:
+        manager = ConnectionManager(DB_CONFIG, pool_size=writers + 2)
+        await asyncio.to_thread(manager.run, billing_schema.migrate)
+        server = BillingServer(manager, writers=writers)
+        host, port = await server.start("127.0.0.1", 0)
+
+    latencies, errors = [], []
+    try:
+        started = time.perf_counter()
+        await asyncio.gather(
+            *(_terminal(host, port, terminal, bills, lines, latencies, errors) for terminal in range(terminals))
+        )
+        elapsed = time.perf_counter() - started
+    finally:
+        if server is not None:
+            await server.close()
+            manager.close()
+
+    latencies.sort()
+    total = len(latencies)
+    print(f"{total} bills from {terminals} terminals in {elapsed:.2f}s: {total / elapsed:,.0f} bills/s")
+    print(
+        f"latency p50 {_percentile(latencies, 0.5) * 1000:.1f} ms, "
+        f"p95 {_percentile(latencies, 0.95) * 1000:.1f} ms, "
+        f"p99 {_percentile(latencies, 0.99) * 1000:.1f} ms"
+    )
+    if server is not None and server.committer.batches:
+        committer = server.committer
+        print(f"{committer.batches} transactions, {committer.invoices / committer.batches:.1f} bills per transaction")
+    if errors:
+        print(f"{len(errors)} requests failed", file=sys.stderr)
+    return 1 if errors else 0
+
+
+def main(argv=None):
+    """Run the load test from the command line."""
+    parser = argparse.ArgumentParser(description="Load test the billing ingest service.")
+    parser.add_argument("--url", help="service to test (default: start one in-process against DB_CONFIG)")
+    parser.add_argument("--terminals", type=int, default=50, help="concurrent terminals (default: 50)")
+    parser.add_argument("--bills", type=int, default=200, help="bills posted per terminal (default: 200)")
+    parser.add_argument("--lines", type=int, default=3, help="line items per bill (default: 3)")
+    parser.add_argument("--writers", type=int, default=2, help="writers of the in-process service (default: 2)")
+    args = parser.parse_args(argv)
+
+    try:
+        return asyncio.run(run(args.url, args.terminals, args.bills, args.lines, args.writers))
+    except (OSError, mysql.connector.Error) as e:
+        print(f"Load test failed: {e}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
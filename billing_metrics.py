@@ -0,0 +1,274 @@
+"""Counters, latency histograms and a slow-query log for the hot paths.
+
+``METRICS`` is the process-wide registry. Database calls are measured by
+wrapping connections with ``instrument``, which the connection pool does
+for every connection it opens; other code times itself with
+``METRICS.timer(name)``. A snapshot can be written to a JSON file with
+``write_snapshot`` or served in the Prometheus text format from
+``prometheus_text``.
+
+Statements slower than ``SLOW_QUERY_MS`` are logged to the
+``billing.slow_queries`` logger with their text, row count and duration.
+"""
+
+import json
+import logging
+import os
+import re
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Statements at least this slow, in milliseconds, go to the slow-query log
+SLOW_QUERY_MS = float(os.environ.get("BILLING_SLOW_QUERY_MS", 200))
+
+# Upper bounds of the latency histogram buckets, in milliseconds
+BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, float("inf")]
+
+# Longest statement text written to the slow-query log
+MAX_LOGGED_SQL = 1000
+
+slow_query_log = logging.getLogger("billing.slow_queries")
+
+
+class Histogram:
+    """Latency distribution over the fixed ``BUCKETS_MS`` buckets."""
+
+    def __init__(self):
+        """Initialize an empty histogram."""
+        self.counts = [0] * len(BUCKETS_MS)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, ms):
+        """Record one duration in milliseconds."""
+        self.counts[bisect_left(BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def quantile(self, fraction):
+        """Return the upper bound of the bucket holding the ``fraction`` quantile."""
+        target = fraction * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS_MS, self.counts):
+            seen += count
+            if count and seen >= target:
+                return min(bound, self.max_ms)
+        return self.max_ms
+
+    def snapshot(self):
+        """Return the histogram as a JSON-friendly dict."""
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total_ms / self.count, 3) if self.count else 0,
+            "p50_ms": round(self.quantile(0.5), 3),
+            "p95_ms": round(self.quantile(0.95), 3),
+            "max_ms": round(self.max_ms, 3),
+            "buckets": {str(bound): count for bound, count in zip(BUCKETS_MS, self.counts) if count},
+        }
+
+
+class Metrics:
+    """Thread-safe registry of named counters and latency histograms."""
+
+    def __init__(self):
+        """Initialize an empty registry."""
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+
+    def increment(self, name, amount=1):
+        """Add ``amount`` to the counter ``name``."""
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def observe(self, name, ms):
+        """Record a duration in milliseconds in the histogram ``name``."""
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram()
+            histogram.observe(ms)
+
+    @contextmanager
+    def timer(self, name):
+        """Time the ``with`` block into the histogram ``name``."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, (time.perf_counter() - started) * 1000)
+
+    def snapshot(self):
+        """Return every counter and histogram as a JSON-friendly dict."""
+        with self._lock:
+            return {
+                "counters": dict(self._counters),
+                "histograms": {name: histogram.snapshot() for name, histogram in self._histograms.items()},
+            }
+
+    def prometheus_text(self):
+        """Return every metric in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            for name, value in sorted(self._counters.items()):
+                metric = _metric_name(name) + "_total"
+                lines += [f"# TYPE {metric} counter", f"{metric} {value}"]
+            for name, histogram in sorted(self._histograms.items()):
+                metric = _metric_name(name) + "_ms"
+                lines.append(f"# TYPE {metric} histogram")
+                cumulative = 0
+                for bound, count in zip(BUCKETS_MS, histogram.counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                    lines.append(f'{metric}_bucket{{le="{le}"}} {cumulative}')
+                lines += [f"{metric}_sum {histogram.total_ms:.3f}", f"{metric}_count {histogram.count}"]
+        return "\n".join(lines) + "\n"
+
+    def write_snapshot(self, path):
+        """Atomically write a JSON snapshot to ``path``."""
+        snapshot = dict(self.snapshot(), written_at=time.strftime("%Y-%m-%dT%H:%M:%S"))
+        temporary = f"{path}.tmp"
+        with open(temporary, "w", encoding="utf-8") as target:
+            json.dump(snapshot, target, indent=2, sort_keys=True)
+        os.replace(temporary, path)
+
+
+METRICS = Metrics()
+
+
+def _metric_name(name):
+    """Return ``name`` as a valid Prometheus metric name."""
+    return "billing_" + re.sub(r"[^a-zA-Z0-9_]", "_", name)
+
+
+def log_slow_queries_to(path):
+    """Append the slow-query log to the file at ``path``."""
+    handler = logging.FileHandler(path, encoding="utf-8")
+    handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+    slow_query_log.addHandler(handler)
+    slow_query_log.setLevel(logging.INFO)
+
+
+class _InstrumentedCursor:
+    """Cursor proxy that times each statement from execute until its rows are read.
+
+    A statement with a result set is complete once ``fetchall`` or
+    ``fetchone`` returns, or ``fetchmany`` comes back short, so the
+    measurement includes streaming the rows from the server.
+    """
+
+    def __init__(self, cursor):
+        """Wrap ``cursor``."""
+        self._cursor = cursor
+        self._statement = None
+        self._started = 0.0
+        self._rows = 0
+
+    def __getattr__(self, name):
+        """Delegate everything not instrumented to the wrapped cursor."""
+        return getattr(self._cursor, name)
+
+    def __enter__(self):
+        """Return the proxy for use in a ``with`` block."""
+        return self
+
+    def __exit__(self, *exc_info):
+        """Close the wrapped cursor."""
+        self.close()
+
+    def execute(self, operation, *args, **kwargs):
+        """Execute one statement, timing it."""
+        return self._run(self._cursor.execute, operation, args, kwargs)
+
+    def executemany(self, operation, *args, **kwargs):
+        """Execute one statement for every parameter set, timing the whole batch."""
+        return self._run(self._cursor.executemany, operation, args, kwargs)
+
+    def _run(self, method, operation, args, kwargs):
+        """Call ``method`` and start measuring the statement it runs."""
+        self._finish()
+        self._statement = operation
+        self._rows = 0
+        self._started = time.perf_counter()
+        try:
+            result = method(operation, *args, **kwargs)
+        except Exception:
+            METRICS.increment("db.errors")
+            self._finish()
+            raise
+        if self._cursor.description is None:
+            self._rows = max(self._cursor.rowcount, 0)
+            self._finish()
+        return result
+
+    def fetchone(self):
+        """Fetch one row and complete the statement."""
+        row = self._cursor.fetchone()
+        self._rows += row is not None
+        self._finish()
+        return row
+
+    def fetchall(self):
+        """Fetch the remaining rows and complete the statement."""
+        rows = self._cursor.fetchall()
+        self._rows += len(rows)
+        self._finish()
+        return rows
+
+    def fetchmany(self, size=1):
+        """Fetch up to ``size`` rows, completing the statement when they run out."""
+        rows = self._cursor.fetchmany(size)
+        self._rows += len(rows)
+        if len(rows) < size:
+            self._finish()
+        return rows
+
+    def close(self):
+        """Complete any pending statement and close the wrapped cursor."""
+        self._finish()
+        return self._cursor.close()
+
+    def _finish(self):
+        """Record the pending statement, if any."""
+        if self._statement is None:
+            return
+        ms = (time.perf_counter() - self._started) * 1000
+        statement, self._statement = self._statement, None
+        text = " ".join(statement.split()) if isinstance(statement, str) else str(statement)
+        kind = text.split(" ", 1)[0].lower() or "query"
+        METRICS.increment("db.queries")
+        METRICS.increment("db.rows", self._rows)
+        METRICS.observe(f"db.{kind}", ms)
+        if ms >= SLOW_QUERY_MS:
+            METRICS.increment("db.slow_queries")
+            slow_query_log.warning("slow query: %.1f ms, %d rows: %s", ms, self._rows, text[:MAX_LOGGED_SQL])
+
+
+class InstrumentedConnection:
+    """Connection proxy whose cursors are timed by ``_InstrumentedCursor``."""
+
+    def __init__(self, connection):
+        """Wrap ``connection``."""
+        self._connection = connection
+
+    def __getattr__(self, name):
+        """Delegate everything not instrumented to the wrapped connection."""
+        return getattr(self._connection, name)
+
+    def cursor(self, *args, **kwargs):
+        """Return an instrumented cursor."""
+        return _InstrumentedCursor(self._connection.cursor(*args, **kwargs))
+
+    def commit(self):
+        """Commit, timing the round trip."""
+        with METRICS.timer("db.commit"):
+            return self._connection.commit()
+
+
+def instrument(connection):
+    """Return ``connection`` wrapped so every statement on it is measured."""
+    return InstrumentedConnection(connection)
@@ -0,0 +1,306 @@
+"""Sales reports served from rollup tables kept current on every save.
+
+Three rollups are maintained in the same transaction as the bills they
+summarize:
+
+* ``sales_daily``: invoices, units and revenue per day and payment method
+* ``sales_items_monthly``: units and revenue per month and item
+* ``sales_customers_monthly``: invoices and revenue per month and customer
+
+Reports read only the rollup rows inside their window, so a dashboard
+costs the same whether the history holds a month of bills or ten years.
+``rebuild`` recomputes the rollups from the live and archived bills if
+they ever drift; archiving bills leaves the rollups untouched, so reports
+cover archived months too.
+
+Usage:
+    python billing_reports.py rebuild
+    python billing_reports.py show --period week
+"""
+
+import argparse
+import sys
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+
+import mysql.connector
+
+from billing_archive import ALL_BILLS
+from billing_connection import DB_CONFIG, connect, execute_prepared
+
+# Buckets shown for each reporting period
+PERIODS = {"day": 30, "week": 12, "month": 12}
+
+# Days to step from a bucket's first day to land inside the next bucket
+BUCKET_STEP = {"day": 1, "week": 7, "month": 31}
+
+TOP_LIMIT = 10
+
+ROLLUP_TABLES = ["sales_daily", "sales_items_monthly", "sales_customers_monthly"]
+
+# Each statement reads the bills from ``{bills}``, a table or subquery
+REBUILD_STATEMENTS = [
+    """
+    INSERT INTO sales_daily (day, payment_method, invoices, quantity, revenue)
+    SELECT DATE(created_at), COALESCE(payment_method, 'Cash'), COUNT(DISTINCT invoice_id),
+           SUM(quantity), SUM(price * quantity)
+    FROM {bills}
+    GROUP BY DATE(created_at), COALESCE(payment_method, 'Cash')
+    """,
+    """
+    INSERT INTO sales_items_monthly (month, item, quantity, revenue)
+    SELECT DATE_FORMAT(created_at, '%Y-%m-01'), item, SUM(quantity), SUM(price * quantity)
+    FROM {bills}
+    GROUP BY DATE_FORMAT(created_at, '%Y-%m-01'), item
+    """,
+    """
+    INSERT INTO sales_customers_monthly (month, customer_id, invoices, revenue)
+    SELECT DATE_FORMAT(created_at, '%Y-%m-01'), customer_id, COUNT(DISTINCT invoice_id), SUM(price * quantity)
+    FROM {bills}
+    WHERE customer_id IS NOT NULL
+    GROUP BY DATE_FORMAT(created_at, '%Y-%m-01'), customer_id
+    """,
+]
+
+LOCK_TABLES = (
+    "LOCK TABLES bills READ, bills_archive READ, "
+    "sales_daily WRITE, sales_items_monthly WRITE, sales_customers_monthly WRITE"
+)
+
+
+def _item_key(entry):
+    """Sort an item rollup entry by month, then by item name compared case-insensitively."""
+    (month, item), _totals = entry
+    return month, item.casefold()
+
+
+def add_sales(cursor, rows):
+    """Add bill rows to the rollups without committing.
+
+    ``rows`` are ``(invoice_id, customer_id, item, quantity, price,
+    payment_method, created_at)`` tuples, as written to ``bills``. Each
+    rollup's upserts are issued in key order, item names case-folded as
+    the table compares them. That only keeps concurrent transactions from
+    deadlocking if each calls this once with all of its rows: separate
+    calls for the invoices of one transaction interleave their keys.
+    """
+    daily = defaultdict(lambda: [set(), 0, 0])
+    items = defaultdict(lambda: [0, 0])
+    customers = defaultdict(lambda: [set(), 0])
+    for invoice_id, customer_id, item, quantity, price, payment_method, created_at in rows:
+        day = created_at.date()
+        month = day.replace(day=1)
+        revenue = quantity * price
+        entry = daily[day, payment_method or "Cash"]
+        entry[0].add(invoice_id)
+        entry[1] += quantity
+        entry[2] += revenue
+        entry = items[month, item]
+        entry[0] += quantity
+        entry[1] += revenue
+        if customer_id is not None:
+            entry = customers[month, customer_id]
+            entry[0].add(invoice_id)
+            entry[1] += revenue
+
+    cursor.executemany(
+        """
+        INSERT INTO sales_daily (day, payment_method, invoices, quantity, revenue) VALUES (%s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE invoices = invoices + VALUES(invoices), quantity = quantity + VALUES(quantity),
+                                revenue = revenue + VALUES(revenue)
+        """,
+        [
+            (day, method, len(ids), quantity, revenue)
+            for (day, method), (ids, quantity, revenue) in sorted(daily.items())
+        ],
+    )
+    cursor.executemany(
+        """
+        INSERT INTO sales_items_monthly (month, item, quantity, revenue) VALUES (%s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE quantity = quantity + VALUES(quantity), revenue = revenue + VALUES(revenue)
+        """,
+        [
+            (month, item, quantity, revenue)
+            for (month, item), (quantity, revenue) in sorted(items.items(), key=_item_key)
+        ],
+    )
+    if customers:
+        cursor.executemany(
+            """
+            INSERT INTO sales_customers_monthly (month, customer_id, invoices, revenue) VALUES (%s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE invoices = invoices + VALUES(invoices), revenue = revenue + VALUES(revenue)
+            """,
+            [
+                (month, customer_id, len(ids), revenue)
+                for (month, customer_id), (ids, revenue) in sorted(customers.items())
+            ],
+        )
+
+
+def rebuild(connection):
+    """Recompute every rollup from the live and archived bills in one transaction.
+
+    Saves block on the table locks until the rebuild finishes.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(LOCK_TABLES)
+        try:
+            for table in ROLLUP_TABLES:
+                cursor.execute(f"DELETE FROM {table}")
+            for statement in REBUILD_STATEMENTS:
+                cursor.execute(statement.format(bills=f"{ALL_BILLS} all_bills"))
+            connection.commit()
+        except BaseException:
+            connection.rollback()
+            raise
+        finally:
+            cursor.execute("UNLOCK TABLES")
+
+
+def bucket_start(day, period):
+    """Return the first day of the ``period`` bucket containing ``day``."""
+    if period == "week":
+        return day - timedelta(days=day.weekday())
+    if period == "month":
+        return day.replace(day=1)
+    return day
+
+
+def window_start(period, today=None):
+    """Return the first day of the oldest bucket shown for ``period``."""
+    start = bucket_start(today or date.today(), period)
+    for _ in range(PERIODS[period] - 1):
+        start = bucket_start(start - timedelta(days=1), period)
+    return start
+
+
+def revenue_by_period(connection, period, start):
+    """Return ``(bucket_start, invoices, revenue)`` for every bucket from ``start`` to today."""
+    cursor = execute_prepared(
+        connection,
+        "SELECT day, SUM(invoices), SUM(revenue) FROM sales_daily WHERE day >= %s GROUP BY day",
+        (start,),
+    )
+    totals = {}
+    bucket = start
+    today = date.today()
+    while bucket <= today:
+        totals[bucket] = [0, 0]
+        bucket = bucket_start(bucket + timedelta(days=BUCKET_STEP[period]), period)
+    for day, invoices, revenue in cursor.fetchall():
+        entry = totals.setdefault(bucket_start(day, period), [0, 0])
+        entry[0] += int(invoices)
+        entry[1] += revenue
+    return [(bucket, invoices, revenue) for bucket, (invoices, revenue) in sorted(totals.items())]
+
+
+def payment_split(connection, start):
+    """Return ``(payment_method, invoices, revenue)`` since ``start``, largest revenue first."""
+    cursor = execute_prepared(
+        connection,
+        """
+        SELECT payment_method, SUM(invoices), SUM(revenue) FROM sales_daily
+        WHERE day >= %s GROUP BY payment_method ORDER BY SUM(revenue) DESC
+        """,
+        (start,),
+    )
+    return [(method, int(invoices), revenue) for method, invoices, revenue in cursor.fetchall()]
+
+
+def top_items(connection, month, limit=TOP_LIMIT):
+    """Return the ``limit`` best-selling ``(item, quantity, revenue)`` since ``month``."""
+    cursor = execute_prepared(
+        connection,
+        """
+        SELECT item, SUM(quantity), SUM(revenue) FROM sales_items_monthly
+        WHERE month >= %s GROUP BY item ORDER BY SUM(revenue) DESC LIMIT %s
+        """,
+        (month, limit),
+    )
+    return [(item, int(quantity), revenue) for item, quantity, revenue in cursor.fetchall()]
+
+
+def top_customers(connection, month, limit=TOP_LIMIT):
+    """Return the ``limit`` highest-spending ``(name, phone, invoices, revenue)`` since ``month``."""
+    cursor = execute_prepared(
+        connection,
+        """
+        SELECT c.name, c.phone, t.invoices, t.revenue
+        FROM (
+            SELECT customer_id, SUM(invoices) AS invoices, SUM(revenue) AS revenue
+            FROM sales_customers_monthly
+            WHERE month >= %s GROUP BY customer_id ORDER BY SUM(revenue) DESC LIMIT %s
+        ) t
+        JOIN customers c ON c.customer_id = t.customer_id
+        ORDER BY t.revenue DESC
+        """,
+        (month, limit),
+    )
+    return [(name, phone, int(invoices), revenue) for name, phone, invoices, revenue in cursor.fetchall()]
+
+
+def dashboard(connection, period):
+    """Return every report for the window ``period`` covers, as a dict.
+
+    Item and customer rankings are kept per month, so they cover the window
+    from the start of its first month (``ranking_start``).
+    """
+    start = window_start(period)
+    month = start.replace(day=1)
+    return {
+        "period": period,
+        "start": start,
+        "ranking_start": month,
+        "revenue": revenue_by_period(connection, period, start),
+        "payments": payment_split(connection, start),
+        "top_items": top_items(connection, month),
+        "top_customers": top_customers(connection, month),
+    }
+
+
+def main(argv=None):
+    """Rebuild or print the reports from the command line."""
+    parser = argparse.ArgumentParser(description="Maintain and print the billing sales reports.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("rebuild", help="recompute the rollup tables from the bills history")
+    show = commands.add_parser("show", help="print the dashboard")
+    show.add_argument("--period", choices=PERIODS, default="day", help="bucket size (default: day)")
+    args = parser.parse_args(argv)
+
+    try:
+        connection = connect(DB_CONFIG)
+    except mysql.connector.Error as e:
+        print(f"Cannot connect to database: {e}", file=sys.stderr)
+        return 1
+
+    try:
+        if args.command == "rebuild":
+            started = time.perf_counter()
+            rebuild(connection)
+            print(f"Rebuilt {', '.join(ROLLUP_TABLES)} in {time.perf_counter() - started:.2f}s")
+            return 0
+        report = dashboard(connection, args.period)
+    except mysql.connector.Error as e:
+        print(f"Report failed: {e}", file=sys.stderr)
+        return 1
+    finally:
+        connection.close()
+
+    print(f"Revenue per {report['period']} since {report['start']}:")
+    for bucket, invoices, revenue in report["revenue"]:
+        print(f"  {bucket}  {invoices:>8} bills  ₹{revenue:>14,.2f}")
+    print("Payment methods:")
+    for method, invoices, revenue in report["payments"]:
+        print(f"  {method:<12} {invoices:>8} bills  ₹{revenue:>14,.2f}")
+    print(f"Top items since {report['ranking_start']}:")
+    for item, quantity, revenue in report["top_items"]:
+        print(f"  {item:<30} {quantity:>8} sold  ₹{revenue:>14,.2f}")
+    print(f"Top customers since {report['ranking_start']}:")
+    for name, phone, invoices, revenue in report["top_customers"]:
+        print(f"  {name:<30} {phone or '':<15} {invoices:>6} bills  ₹{revenue:>14,.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,264 @@
+"""Persistence for bills, customers and totals, independent of any GUI.
+
+Every function takes an open connection and leaves connection management
+to the caller, so the same code runs on the desktop app's worker threads,
+in the HTTP ingest service and in scripts. Bills are passed around as
+invoice dicts built by ``new_invoice``; their ``client_ref`` makes saving
+the same invoice twice harmless.
+"""
+
+import uuid
+from datetime import datetime
+
+import mysql.connector
+
+from billing_catalog import save_items
+from billing_connection import execute_prepared, fetch_row
+from billing_reports import add_sales
+
+BILLS_QUERY = """
+    SELECT b.bill_id, c.name, c.phone, b.item, b.quantity, b.price, b.payment_method, b.price * b.quantity AS total
+    FROM bills b
+    JOIN customers c ON b.customer_id = c.customer_id
+    {where}
+    ORDER BY b.bill_id DESC
+    LIMIT %s
+"""
+
+
+def new_client_ref():
+    """Return a fresh reference identifying one invoice across retries."""
+    return uuid.uuid4().hex
+
+
+def new_invoice(name, phone, payment_method, lines, customer_id=None, client_ref=None):
+    """Return an invoice dict for ``lines`` of ``(item, quantity, price)``, stamped now.
+
+    ``customer_id`` may be given when the customer is already known to
+    exist, skipping the customer upsert on save.
+    """
+    return {
+        "name": name,
+        "phone": phone,
+        "customer_id": customer_id,
+        "payment_method": payment_method,
+        "lines": list(lines),
+        "created_at": datetime.now().replace(microsecond=0),
+        "client_ref": client_ref or new_client_ref(),
+    }
+
+
+def like_prefix(text):
+    """Return a ``LIKE ... ESCAPE '!'`` pattern matching values that start with ``text``."""
+    escaped = text.replace("!", "!!").replace("%", "!%").replace("_", "!_")
+    return escaped + "%"
+
+
+def bill_filter(search="", item="", payment_method=None, date_from=None, date_to=None):
+    """Return the SQL ``(conditions, params)`` selecting bills that match every given criterion.
+
+    ``search`` matches a customer name prefix, or a phone prefix when it
+    starts with a digit or ``+``; ``item`` matches an item prefix. Dates
+    bound ``created_at`` to ``[date_from, date_to)``.
+    """
+    conditions, params = [], []
+    if search:
+        column = "phone" if search[0].isdigit() or search[0] == "+" else "name"
+        conditions.append(f"b.customer_id IN (SELECT customer_id FROM customers WHERE {column} LIKE %s ESCAPE '!')")
+        params.append(like_prefix(search))
+    if item:
+        conditions.append("b.item LIKE %s ESCAPE '!'")
+        params.append(like_prefix(item))
+    if payment_method:
+        conditions.append("b.payment_method = %s")
+        params.append(payment_method)
+    if date_from is not None:
+        conditions.append("b.created_at >= %s")
+        params.append(date_from)
+    if date_to is not None:
+        conditions.append("b.created_at < %s")
+        params.append(date_to)
+    return conditions, params
+
+
+def fetch_bills(connection, where, params, limit):
+    """Return up to ``limit`` bill rows matching ``where``, newest first."""
+    cursor = execute_prepared(connection, BILLS_QUERY.format(where=where), list(params) + [limit])
+    return cursor.fetchall()
+
+
+def fetch_summary(connection, where="", params=(), last_bill_id=None):
+    """Return the ``(bill_count, revenue)`` of the bills matching ``where``.
+
+    Unfiltered totals come straight from the running-totals row; filtered
+    ones are aggregated over the matching bills using the filter's indexes,
+    up to ``last_bill_id`` when given.
+    """
+    if not where:
+        return fetch_row(connection, "SELECT bill_count, revenue FROM bill_totals WHERE id = 1") or (0, 0)
+    if last_bill_id is not None:
+        where, params = f"{where} AND b.bill_id <= %s", list(params) + [last_bill_id]
+    return fetch_row(
+        connection, f"SELECT COUNT(*), COALESCE(SUM(b.price * b.quantity), 0) FROM bills b {where}", params
+    )
+
+
+def fetch_first_page(connection, where, params, limit):
+    """Return ``(bill_count, revenue, last_bill_id, rows)`` for the first page of bills matching ``where``.
+
+    The running totals of all bills and ``last_bill_id``, the newest bill
+    they cover, come from one statement and so one snapshot; ``rows`` is
+    the first page of the matching bills up to that one, read by keyset.
+    Loading bills newer than ``last_bill_id`` afterwards then counts every
+    bill exactly once. A filter's own totals cost an aggregate over its
+    bills, so they are left to ``fetch_summary`` with the same
+    ``last_bill_id`` rather than holding up the page.
+    """
+    totals = fetch_row(
+        connection,
+        "SELECT bill_count, revenue, (SELECT COALESCE(MAX(bill_id), 0) FROM bills) FROM bill_totals WHERE id = 1",
+    )
+    bill_count, revenue, last_bill_id = totals or (0, 0, 0)
+    bounded = f"{where} AND b.bill_id <= %s" if where else "WHERE b.bill_id <= %s"
+    return bill_count, revenue, last_bill_id, fetch_bills(connection, bounded, list(params) + [last_bill_id], limit)
+
+
+def fetch_changes(connection, since_bill_id):
+    """Return ``(bill_count, revenue, last_bill_id, newer_count, newer_revenue)`` for the change feed.
+
+    The running totals and the newest bill_id are read in one statement
+    with the count and revenue of the bills above ``since_bill_id``, so the
+    difference is what the bills at or below it now add up to. Only the new
+    bills are summed, through the primary key.
+    """
+    return fetch_row(
+        connection,
+        """
+        SELECT bill_count, revenue, (SELECT COALESCE(MAX(bill_id), 0) FROM bills),
+            (SELECT COUNT(*) FROM bills WHERE bill_id > %s),
+            (SELECT COALESCE(SUM(price * quantity), 0) FROM bills WHERE bill_id > %s)
+        FROM bill_totals WHERE id = 1
+        """,
+        (since_bill_id, since_bill_id),
+    ) or (0, 0, 0, 0, 0)
+
+
+def find_customer(connection, phone):
+    """Return ``(customer_id, name)`` for ``phone``, or None if unknown."""
+    return fetch_row(connection, "SELECT customer_id, name FROM customers WHERE phone = %s", (phone,))
+
+
+def get_or_create_customer(connection, name, phone):
+    """Return the customer_id for ``phone``, inserting the customer if new.
+
+    Customers without a phone number cannot be matched and always get a new row.
+    """
+    if not phone:
+        cursor = execute_prepared(connection, "INSERT INTO customers (name, phone) VALUES (%s, NULL)", (name,))
+    else:
+        cursor = execute_prepared(
+            connection,
+            """
+            INSERT INTO customers (name, phone) VALUES (%s, %s)
+            ON DUPLICATE KEY UPDATE customer_id = LAST_INSERT_ID(customer_id), name = VALUES(name)
+            """,
+            (name, phone),
+        )
+    return cursor.lastrowid
+
+
+def write_invoice(connection, invoice):
+    """Write one invoice as ``write_invoices`` does and return its ``(invoice_id, customer_id)``."""
+    return write_invoices(connection, [invoice])[0]
+
+
+def write_invoices(connection, invoices):
+    """Write the customers, invoice headers, lines, catalog prices, rollups and totals without committing.
+
+    Rows that concurrent batches may share are locked in one global order,
+    so two writers cannot deadlock on them: customers by phone, then the
+    catalog and rollups aggregated over the whole batch in key order, and
+    the single totals row last. Headers and lines are new rows and lock
+    nothing another batch waits on. Returns one ``(invoice_id,
+    customer_id)`` per invoice.
+    """
+    names = {}
+    for invoice in invoices:
+        if invoice["customer_id"] is None and invoice["phone"]:
+            # The last name given for a phone number wins, as when saved one by one
+            names[invoice["phone"]] = invoice["name"]
+    customer_ids = {phone: get_or_create_customer(connection, names[phone], phone) for phone in sorted(names)}
+
+    saved, rows, lines = [], [], []
+    for invoice in invoices:
+        customer_id = invoice["customer_id"]
+        if customer_id is None and invoice["phone"]:
+            customer_id = customer_ids[invoice["phone"]]
+        elif customer_id is None:
+            customer_id = get_or_create_customer(connection, invoice["name"], None)
+        cursor = execute_prepared(
+            connection,
+            "INSERT INTO invoices (customer_id, payment_method, created_at, client_ref) VALUES (%s, %s, %s, %s)",
+            (customer_id, invoice["payment_method"], invoice["created_at"], invoice["client_ref"]),
+        )
+        saved.append((cursor.lastrowid, customer_id))
+        rows.extend(
+            (cursor.lastrowid, customer_id, item, quantity, price, invoice["payment_method"], invoice["created_at"])
+            for item, quantity, price in invoice["lines"]
+        )
+        lines.extend(invoice["lines"])
+
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            """
+            INSERT INTO bills (invoice_id, customer_id, item, quantity, price, payment_method, created_at)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+            """,
+            rows,
+        )
+        save_items(cursor, lines)
+        add_sales(cursor, rows)
+    execute_prepared(
+        connection,
+        "UPDATE bill_totals SET bill_count = bill_count + %s, revenue = revenue + %s WHERE id = 1",
+        (len(lines), sum(quantity * price for _item, quantity, price in lines)),
+    )
+    return saved
+
+
+def save_invoice(connection, invoice):
+    """Write one invoice in its own transaction and return ``(invoice_id, customer_id)``."""
+    try:
+        saved = write_invoice(connection, invoice)
+        connection.commit()
+    except mysql.connector.Error:
+        connection.rollback()
+        raise
+    return saved
+
+
+def save_invoices(connection, invoices):
+    """Write every invoice the server does not have yet in one shared transaction.
+
+    Invoices whose ``client_ref`` is already stored, because an earlier
+    attempt committed before its acknowledgement was lost, are skipped, so
+    a batch can safely be retried. Returns one ``(invoice_id, customer_id)``
+    per invoice, or None for each one that was skipped.
+    """
+    refs = [invoice["client_ref"] for invoice in invoices]
+    placeholders = ", ".join(["%s"] * len(refs))
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT client_ref FROM invoices WHERE client_ref IN ({placeholders})", refs)
+        stored = {ref for (ref,) in cursor.fetchall()}
+    pending = {}
+    for invoice in invoices:
+        if invoice["client_ref"] not in stored:
+            # A client_ref repeated within the batch is written once
+            pending.setdefault(invoice["client_ref"], invoice)
+    try:
+        written = dict(zip(pending, write_invoices(connection, list(pending.values())))) if pending else {}
+        connection.commit()
+    except mysql.connector.Error:
+        connection.rollback()
+        raise
+    return [written.pop(invoice["client_ref"], None) for invoice in invoices]
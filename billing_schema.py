@@ -0,0 +1,562 @@
+"""Versioned schema migrations for the billing database.
+
+Each migration is a ``(version, description, function)`` entry in
+``MIGRATIONS``. ``migrate`` applies the ones newer than the version recorded
+in the ``schema_version`` table, in order, and records each as it completes.
+When the schema is already current it costs a single SELECT and runs no DDL.
+Migration functions receive a cursor and must be safe to re-run against a
+database created before migrations existed.
+
+An SQLite database has no pre-migration history to upgrade, so a new one
+is created straight at ``SQLITE_SCHEMA_VERSION`` from ``SQLITE_SCHEMA``,
+the same tables and indexes in SQLite's DDL. Migrations after that version
+run on both backends and must check ``dialect`` where their DDL differs.
+"""
+
+import mysql.connector
+
+from billing_archive import (
+    STAGING_TABLE,
+    last_partitioned_month,
+    month_start,
+    partition_definitions,
+    partitioned_months,
+)
+from billing_connection import dialect
+from billing_reports import REBUILD_STATEMENTS
+
+# MySQL error raised when a table does not exist
+ER_NO_SUCH_TABLE = 1146
+
+# Advisory lock so several terminals starting at once migrate only once
+MIGRATION_LOCK = "billing_db_migrate"
+MIGRATION_LOCK_TIMEOUT = 60
+
+
+def _has_index(cursor, table, index_name):
+    """Return True if ``table`` already has an index called ``index_name``."""
+    cursor.execute(f"SHOW INDEX FROM {table} WHERE Key_name = %s", (index_name,))
+    return bool(cursor.fetchall())
+
+
+def _has_column(cursor, table, column):
+    """Return True if ``table`` already has a column called ``column``."""
+    cursor.execute(f"SHOW COLUMNS FROM {table} LIKE %s", (column,))
+    return bool(cursor.fetchall())
+
+
+def _has_foreign_key(cursor, table, constraint_name):
+    """Return True if ``table`` already has a foreign key called ``constraint_name``."""
+    cursor.execute(
+        """
+        SELECT 1 FROM information_schema.TABLE_CONSTRAINTS
+        WHERE CONSTRAINT_SCHEMA = DATABASE() AND TABLE_NAME = %s
+          AND CONSTRAINT_NAME = %s AND CONSTRAINT_TYPE = 'FOREIGN KEY'
+        """,
+        (table, constraint_name),
+    )
+    return bool(cursor.fetchall())
+
+
+def _foreign_keys(cursor, table):
+    """Return the names of the foreign keys on ``table``."""
+    cursor.execute(
+        """
+        SELECT CONSTRAINT_NAME FROM information_schema.TABLE_CONSTRAINTS
+        WHERE CONSTRAINT_SCHEMA = DATABASE() AND TABLE_NAME = %s AND CONSTRAINT_TYPE = 'FOREIGN KEY'
+        """,
+        (table,),
+    )
+    return [name for (name,) in cursor.fetchall()]
+
+
+def _create_base_tables(cursor):
+    """Create the customers and bills tables."""
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS customers (
+            customer_id INT AUTO_INCREMENT PRIMARY KEY,
+            name VARCHAR(100) NOT NULL,
+            phone VARCHAR(20) DEFAULT NULL
+        )
+        """
+    )
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS bills (
+            bill_id INT AUTO_INCREMENT PRIMARY KEY,
+            customer_id INT,
+            item VARCHAR(100) NOT NULL,
+            quantity INT NOT NULL,
+            price DECIMAL(10, 2) NOT NULL,
+            payment_method VARCHAR(50) DEFAULT 'Cash',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (customer_id) REFERENCES customers(customer_id)
+        )
+        """
+    )
+
+
+def _add_bill_totals(cursor):
+    """Create the running-totals row and seed it once from the existing history."""
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS bill_totals (
+            id TINYINT PRIMARY KEY,
+            bill_count BIGINT NOT NULL DEFAULT 0,
+            revenue DECIMAL(16, 2) NOT NULL DEFAULT 0
+        )
+        """
+    )
+    cursor.execute("SELECT 1 FROM bill_totals WHERE id = 1")
+    if cursor.fetchone() is None:
+        cursor.execute(
+            """
+            INSERT IGNORE INTO bill_totals (id, bill_count, revenue)
+            SELECT 1, COUNT(*), COALESCE(SUM(price * quantity), 0) FROM bills
+            """
+        )
+
+
+def _unique_customer_phone(cursor):
+    """Merge customers sharing a phone number and make phone unique."""
+    if _has_index(cursor, "customers", "uq_customers_phone"):
+        return
+    cursor.execute("UPDATE customers SET phone = NULL WHERE phone = ''")
+    cursor.execute(
+        """
+        UPDATE bills b
+        JOIN customers c ON c.customer_id = b.customer_id
+        JOIN (
+            SELECT phone, MIN(customer_id) AS keep_id
+            FROM customers
+            WHERE phone IS NOT NULL
+            GROUP BY phone
+        ) k ON k.phone = c.phone
+        SET b.customer_id = k.keep_id
+        WHERE b.customer_id <> k.keep_id
+        """
+    )
+    cursor.execute(
+        """
+        DELETE c FROM customers c
+        JOIN (
+            SELECT phone, MIN(customer_id) AS keep_id
+            FROM customers
+            WHERE phone IS NOT NULL
+            GROUP BY phone
+        ) k ON k.phone = c.phone
+        WHERE c.customer_id <> k.keep_id
+        """
+    )
+    cursor.execute("ALTER TABLE customers ADD UNIQUE INDEX uq_customers_phone (phone)")
+
+
+def _add_lookup_indexes(cursor):
+    """Index the date-range, payment-method and customer-name lookups."""
+    indexes = [
+        ("bills", "idx_bills_created_at", "created_at"),
+        ("bills", "idx_bills_payment_created", "payment_method, created_at"),
+        ("customers", "idx_customers_name", "name"),
+    ]
+    for table, index_name, columns in indexes:
+        if not _has_index(cursor, table, index_name):
+            cursor.execute(f"ALTER TABLE {table} ADD INDEX {index_name} ({columns})")
+
+
+def _add_invoices(cursor):
+    """Add invoice headers so one bill can carry several line items.
+
+    ``bills`` stays the line-item table; each existing bill becomes a
+    single-line invoice numbered after its own bill_id.
+    """
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS invoices (
+            invoice_id INT AUTO_INCREMENT PRIMARY KEY,
+            customer_id INT,
+            payment_method VARCHAR(50) DEFAULT 'Cash',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (customer_id) REFERENCES customers(customer_id)
+        )
+        """
+    )
+    if not _has_column(cursor, "bills", "invoice_id"):
+        cursor.execute(
+            "ALTER TABLE bills ADD COLUMN invoice_id INT NULL AFTER bill_id, ADD INDEX idx_bills_invoice (invoice_id)"
+        )
+    cursor.execute(
+        """
+        INSERT INTO invoices (invoice_id, customer_id, payment_method, created_at)
+        SELECT bill_id, customer_id, payment_method, created_at FROM bills WHERE invoice_id IS NULL
+        """
+    )
+    cursor.execute("UPDATE bills SET invoice_id = bill_id WHERE invoice_id IS NULL")
+    if not _has_foreign_key(cursor, "bills", "fk_bills_invoice"):
+        cursor.execute(
+            "ALTER TABLE bills ADD CONSTRAINT fk_bills_invoice FOREIGN KEY (invoice_id) REFERENCES invoices(invoice_id)"
+        )
+
+
+def _add_search_indexes(cursor):
+    """Index the item column for the bills search bar's prefix lookups."""
+    if not _has_index(cursor, "bills", "idx_bills_item"):
+        cursor.execute("ALTER TABLE bills ADD INDEX idx_bills_item (item)")
+
+
+def _add_item_catalog(cursor):
+    """Create the item catalog and seed it with the latest price of every item sold."""
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS items (
+            item_id INT AUTO_INCREMENT PRIMARY KEY,
+            name VARCHAR(100) NOT NULL,
+            price DECIMAL(10, 2) NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            UNIQUE INDEX uq_items_name (name),
+            INDEX idx_items_updated (updated_at)
+        )
+        """
+    )
+    cursor.execute(
+        """
+        INSERT IGNORE INTO items (name, price)
+        SELECT b.item, b.price
+        FROM bills b
+        JOIN (SELECT MAX(bill_id) AS bill_id FROM bills GROUP BY item) latest ON latest.bill_id = b.bill_id
+        """
+    )
+
+
+def _add_invoice_client_ref(cursor):
+    """Give invoices a client-generated reference so replayed saves are idempotent."""
+    if not _has_column(cursor, "invoices", "client_ref"):
+        cursor.execute(
+            "ALTER TABLE invoices ADD COLUMN client_ref CHAR(32) NULL, "
+            "ADD UNIQUE INDEX uq_invoices_client_ref (client_ref)"
+        )
+
+
+def _add_sales_rollups(cursor):
+    """Create the reporting rollups and fill them from the existing history."""
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS sales_daily (
+            day DATE NOT NULL,
+            payment_method VARCHAR(50) NOT NULL,
+            invoices INT NOT NULL DEFAULT 0,
+            quantity BIGINT NOT NULL DEFAULT 0,
+            revenue DECIMAL(16, 2) NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, payment_method)
+        )
+        """
+    )
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS sales_items_monthly (
+            month DATE NOT NULL,
+            item VARCHAR(100) NOT NULL,
+            quantity BIGINT NOT NULL DEFAULT 0,
+            revenue DECIMAL(16, 2) NOT NULL DEFAULT 0,
+            PRIMARY KEY (month, item)
+        )
+        """
+    )
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS sales_customers_monthly (
+            month DATE NOT NULL,
+            customer_id INT NOT NULL,
+            invoices INT NOT NULL DEFAULT 0,
+            revenue DECIMAL(16, 2) NOT NULL DEFAULT 0,
+            PRIMARY KEY (month, customer_id)
+        )
+        """
+    )
+    cursor.execute("SELECT 1 FROM sales_daily LIMIT 1")
+    if cursor.fetchone() is None:
+        for statement in REBUILD_STATEMENTS:
+            cursor.execute(statement.format(bills="bills"))
+
+
+def _partition_bills(cursor):
+    """Partition bills by month of created_at and add the tables closed months are archived to.
+
+    A partitioned InnoDB table cannot have foreign keys, and every unique
+    key must include the partitioning column, so bills loses its foreign
+    keys and its primary key becomes ``(bill_id, created_at)``; bill_id
+    stays unique as it is still assigned by AUTO_INCREMENT. The table is
+    rebuilt once, with a partition for every month from its oldest bill
+    to ``PARTITIONS_AHEAD`` months from now. SQLite has no partitioning,
+    so there only the archive tables are created.
+    """
+    if dialect(cursor) == "sqlite":
+        for statement in SQLITE_ARCHIVE_TABLES:
+            cursor.execute(statement)
+        return
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS bills_archive (
+            bill_id INT PRIMARY KEY,
+            invoice_id INT NULL,
+            customer_id INT,
+            item VARCHAR(100) NOT NULL,
+            quantity INT NOT NULL,
+            price DECIMAL(10, 2) NOT NULL,
+            payment_method VARCHAR(50) DEFAULT 'Cash',
+            created_at TIMESTAMP NOT NULL,
+            INDEX idx_bills_archive_created_at (created_at)
+        ) ROW_FORMAT=COMPRESSED
+        """
+    )
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS archived_months (
+            month DATE PRIMARY KEY,
+            bill_count INT NOT NULL,
+            revenue DECIMAL(16, 2) NOT NULL,
+            archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+    if partitioned_months(cursor):
+        return
+    for constraint_name in _foreign_keys(cursor, "bills"):
+        cursor.execute(f"ALTER TABLE bills DROP FOREIGN KEY {constraint_name}")
+    cursor.execute(
+        """
+        UPDATE bills b LEFT JOIN invoices i ON i.invoice_id = b.invoice_id
+        SET b.created_at = COALESCE(i.created_at, CURRENT_TIMESTAMP)
+        WHERE b.created_at IS NULL
+        """
+    )
+    cursor.execute(
+        "ALTER TABLE bills MODIFY created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP, "
+        "DROP PRIMARY KEY, ADD PRIMARY KEY (bill_id, created_at)"
+    )
+    cursor.execute("SELECT MIN(created_at) FROM bills")
+    oldest = cursor.fetchone()[0]
+    last = last_partitioned_month()
+    first = month_start(oldest.date()) if oldest else last
+    cursor.execute(
+        "ALTER TABLE bills PARTITION BY RANGE (UNIX_TIMESTAMP(created_at)) "
+        f"({partition_definitions(min(first, last), last)})"
+    )
+
+
+def _add_archive_staging(cursor):
+    """Add the empty table month partitions are exchanged with when they are archived.
+
+    ``EXCHANGE PARTITION`` needs a table with exactly the columns and
+    indexes of bills but no partitioning, so any later change to bills
+    must be made to this table too. SQLite archives without partitions.
+    """
+    if dialect(cursor) == "sqlite":
+        return
+    cursor.execute(f"DROP TABLE IF EXISTS {STAGING_TABLE}")
+    cursor.execute(f"CREATE TABLE {STAGING_TABLE} LIKE bills")
+    cursor.execute(f"ALTER TABLE {STAGING_TABLE} REMOVE PARTITIONING")
+
+
+MIGRATIONS = [
+    (1, "Create customers and bills tables", _create_base_tables),
+    (2, "Add running bill totals", _add_bill_totals),
+    (3, "Deduplicate customers and make phone unique", _unique_customer_phone),
+    (4, "Index date-range, payment-method and name lookups", _add_lookup_indexes),
+    (5, "Add invoice headers for multi-item bills", _add_invoices),
+    (6, "Index item prefix searches", _add_search_indexes),
+    (7, "Add the item catalog", _add_item_catalog),
+    (8, "Add client references to invoices", _add_invoice_client_ref),
+    (9, "Add sales reporting rollups", _add_sales_rollups),
+    (10, "Partition bills by month and add the archive", _partition_bills),
+    (11, "Add the staging table for archiving month partitions", _add_archive_staging),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+# Every table and index as of SQLITE_SCHEMA_VERSION, for new SQLite databases.
+# Amounts are REAL rather than DECIMAL: SQLite's NUMERIC affinity would store
+# 11.00 as the integer 11, and billing_sqlite returns REAL results as Decimal.
+SQLITE_SCHEMA_VERSION = 9
+SQLITE_SCHEMA = [
+    """
+    CREATE TABLE customers (
+        customer_id INTEGER PRIMARY KEY,
+        name VARCHAR(100) NOT NULL COLLATE NOCASE,
+        phone VARCHAR(20) DEFAULT NULL
+    )
+    """,
+    "CREATE UNIQUE INDEX uq_customers_phone ON customers (phone)",
+    "CREATE INDEX idx_customers_name ON customers (name)",
+    """
+    CREATE TABLE invoices (
+        invoice_id INTEGER PRIMARY KEY,
+        customer_id INT REFERENCES customers (customer_id),
+        payment_method VARCHAR(50) DEFAULT 'Cash',
+        created_at TIMESTAMP DEFAULT (DATETIME('now', 'localtime')),
+        client_ref CHAR(32) NULL
+    )
+    """,
+    "CREATE UNIQUE INDEX uq_invoices_client_ref ON invoices (client_ref)",
+    """
+    CREATE TABLE bills (
+        -- AUTOINCREMENT so ids of archived bills are never handed out again
+        bill_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        invoice_id INT REFERENCES invoices (invoice_id),
+        customer_id INT REFERENCES customers (customer_id),
+        item VARCHAR(100) NOT NULL COLLATE NOCASE,
+        quantity INT NOT NULL,
+        price REAL NOT NULL,
+        payment_method VARCHAR(50) DEFAULT 'Cash',
+        created_at TIMESTAMP DEFAULT (DATETIME('now', 'localtime'))
+    )
+    """,
+    "CREATE INDEX idx_bills_invoice ON bills (invoice_id)",
+    # MySQL indexes foreign keys implicitly; SQLite does not
+    "CREATE INDEX idx_bills_customer ON bills (customer_id)",
+    "CREATE INDEX idx_bills_created_at ON bills (created_at)",
+    "CREATE INDEX idx_bills_payment_created ON bills (payment_method, created_at)",
+    "CREATE INDEX idx_bills_item ON bills (item)",
+    """
+    CREATE TABLE bill_totals (
+        id TINYINT PRIMARY KEY,
+        bill_count BIGINT NOT NULL DEFAULT 0,
+        revenue REAL NOT NULL DEFAULT 0
+    )
+    """,
+    "INSERT INTO bill_totals (id, bill_count, revenue) VALUES (1, 0, 0)",
+    """
+    CREATE TABLE items (
+        item_id INTEGER PRIMARY KEY,
+        name VARCHAR(100) NOT NULL COLLATE NOCASE,
+        price REAL NOT NULL,
+        updated_at TIMESTAMP DEFAULT (DATETIME('now', 'localtime'))
+    )
+    """,
+    "CREATE UNIQUE INDEX uq_items_name ON items (name)",
+    "CREATE INDEX idx_items_updated ON items (updated_at)",
+    # Stands in for MySQL's ON UPDATE CURRENT_TIMESTAMP
+    """
+    CREATE TRIGGER items_touch AFTER UPDATE OF price ON items
+    WHEN NEW.price <> OLD.price
+    BEGIN
+        UPDATE items SET updated_at = DATETIME('now', 'localtime') WHERE item_id = NEW.item_id;
+    END
+    """,
+    """
+    CREATE TABLE sales_daily (
+        day DATE NOT NULL,
+        payment_method VARCHAR(50) NOT NULL,
+        invoices INT NOT NULL DEFAULT 0,
+        quantity BIGINT NOT NULL DEFAULT 0,
+        revenue REAL NOT NULL DEFAULT 0,
+        PRIMARY KEY (day, payment_method)
+    )
+    """,
+    """
+    CREATE TABLE sales_items_monthly (
+        month DATE NOT NULL,
+        item VARCHAR(100) NOT NULL COLLATE NOCASE,
+        quantity BIGINT NOT NULL DEFAULT 0,
+        revenue REAL NOT NULL DEFAULT 0,
+        PRIMARY KEY (month, item)
+    )
+    """,
+    """
+    CREATE TABLE sales_customers_monthly (
+        month DATE NOT NULL,
+        customer_id INT NOT NULL,
+        invoices INT NOT NULL DEFAULT 0,
+        revenue REAL NOT NULL DEFAULT 0,
+        PRIMARY KEY (month, customer_id)
+    )
+    """,
+]
+
+# The archive tables of migration 10, in SQLite's DDL
+SQLITE_ARCHIVE_TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS bills_archive (
+        bill_id INTEGER PRIMARY KEY,
+        invoice_id INT,
+        customer_id INT,
+        item VARCHAR(100) NOT NULL COLLATE NOCASE,
+        quantity INT NOT NULL,
+        price REAL NOT NULL,
+        payment_method VARCHAR(50) DEFAULT 'Cash',
+        created_at TIMESTAMP NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_bills_archive_created_at ON bills_archive (created_at)",
+    """
+    CREATE TABLE IF NOT EXISTS archived_months (
+        month DATE PRIMARY KEY,
+        bill_count INT NOT NULL,
+        revenue REAL NOT NULL,
+        archived_at TIMESTAMP DEFAULT (DATETIME('now', 'localtime'))
+    )
+    """,
+]
+
+
+def current_version(cursor):
+    """Return the applied schema version, or 0 for a database without migrations."""
+    try:
+        cursor.execute("SELECT MAX(version) FROM schema_version")
+    except mysql.connector.Error as e:
+        if e.errno != ER_NO_SUCH_TABLE:
+            raise
+        return 0
+    return cursor.fetchone()[0] or 0
+
+
+def migrate(connection):
+    """Bring the schema up to ``SCHEMA_VERSION`` and return the list of versions applied.
+
+    MySQL commits each migration as it completes, since its DDL cannot be
+    rolled back anyway. SQLite's DDL is transactional, so there the whole
+    run is one transaction that applies completely or not at all.
+    """
+    sqlite = dialect(connection) == "sqlite"
+    with connection.cursor() as cursor:
+        if current_version(cursor) >= SCHEMA_VERSION:
+            return []
+
+        cursor.execute("SELECT GET_LOCK(%s, %s)", (MIGRATION_LOCK, MIGRATION_LOCK_TIMEOUT))
+        if not cursor.fetchone()[0]:
+            raise RuntimeError("Timed out waiting for another terminal to finish migrating")
+        try:
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS schema_version (
+                    version INT PRIMARY KEY,
+                    description VARCHAR(200) NOT NULL,
+                    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+                """
+            )
+            # Re-read under the lock in case another terminal migrated meanwhile
+            version = current_version(cursor)
+            applied = []
+            baseline = 0
+            if sqlite and version == 0:
+                for statement in SQLITE_SCHEMA:
+                    cursor.execute(statement)
+                baseline = SQLITE_SCHEMA_VERSION
+            for step, description, apply in MIGRATIONS:
+                if step <= version:
+                    continue
+                # Steps the SQLite baseline already includes are only recorded
+                if step > baseline:
+                    apply(cursor)
+                cursor.execute(
+                    "INSERT INTO schema_version (version, description) VALUES (%s, %s)", (step, description)
+                )
+                if not sqlite:
+                    connection.commit()
+                applied.append(step)
+            connection.commit()
+            return applied
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK(%s)", (MIGRATION_LOCK,))
+            cursor.fetchall()
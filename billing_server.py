@@ -0,0 +1,349 @@
+"""HTTP ingest service that lets many billing terminals share one database.
+
+Terminals POST bills as JSON; concurrent requests are group-committed, so
+while one transaction is being written every bill that arrives meanwhile
+queues up and goes into the next shared transaction. Under load the server
+commits hundreds of bills per round trip instead of one.
+
+Endpoints:
+    POST /bills    {"name", "phone", "payment_method", "client_ref",
+                    "lines": [{"item", "quantity", "price"}, ...]}
+    GET  /summary  bill count and revenue
+    GET  /metrics  counters and latency histograms, Prometheus text format
+    GET  /health
+
+``client_ref`` is optional; a terminal that sends one may safely retry a
+request whose response it never received.
+
+Usage:
+    python billing_server.py --port 8080
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+
+import mysql.connector
+from mysql.connector import errorcode
+
+import billing_repository
+import billing_schema
+from billing_connection import DB_CONFIG, ConnectionManager, is_connection_lost
+from billing_metrics import METRICS
+from billing_validation import PAYMENT_METHODS, ValidationError, text_field, validate_customer, validate_line_item
+
+# Largest request body accepted, in bytes
+MAX_BODY = 1 << 20
+
+REASONS = {
+    200: "OK",
+    201: "Created",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+    503: "Service Unavailable",
+}
+
+
+class HTTPError(Exception):
+    """Raised by a handler to answer with an error status."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def parse_bill(payload):
+    """Return an invoice dict for a POSTed bill, raising ValidationError if it is invalid."""
+    if not isinstance(payload, dict):
+        raise ValidationError("Invalid Input", "Expected a JSON object")
+    name, phone = validate_customer(text_field(payload, "name"), text_field(payload, "phone"))
+    payment_method = text_field(payload, "payment_method") or "Cash"
+    if payment_method not in PAYMENT_METHODS:
+        raise ValidationError("Invalid Input", f"Unknown payment method: {payment_method!r}")
+    lines = payload.get("lines")
+    if not isinstance(lines, list) or not lines:
+        raise ValidationError("Input Required", "A bill needs at least one line item")
+    if not all(isinstance(line, dict) for line in lines):
+        raise ValidationError("Invalid Input", "Line items must be JSON objects")
+    lines = [validate_line_item(text_field(line, "item"), line.get("quantity"), line.get("price")) for line in lines]
+    client_ref = payload.get("client_ref")
+    if client_ref is not None and not (isinstance(client_ref, str) and 0 < len(client_ref) <= 32):
+        raise ValidationError("Invalid Input", "client_ref must be a string of at most 32 characters")
+    return billing_repository.new_invoice(name, phone, payment_method, lines, client_ref=client_ref)
+
+
+class GroupCommitter:
+    """Write concurrently submitted invoices in shared transactions.
+
+    Each writer takes every invoice queued while it was busy, up to
+    ``max_batch``, and saves them with one ``save_invoices`` call on a worker
+    thread. Batches are keyed by ``client_ref``, so a batch interrupted by a
+    lost connection can be retried without duplicating bills. Writers lock
+    shared rows in one order (see ``billing_repository.write_invoices``),
+    and a batch the server still picks as a deadlock victim is retried
+    whole. If the server rejects a batch, its invoices are retried one at a
+    time so a single bad bill only fails its own request.
+    """
+
+    # Attempts at a batch that keeps losing deadlocks, and the delay before the second one, in seconds
+    DEADLOCK_ATTEMPTS = 4
+    DEADLOCK_BACKOFF = 0.01
+
+    def __init__(self, manager, writers=2, max_batch=500):
+        """Initialize a committer writing through ``manager``'s pool."""
+        self.manager = manager
+        self.writers = writers
+        self.max_batch = max_batch
+        self.batches = 0
+        self.invoices = 0
+        self._queue = None
+        self._tasks = []
+
+    def start(self):
+        """Start the writer tasks on the running event loop."""
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._write_loop()) for _ in range(self.writers)]
+
+    async def stop(self):
+        """Cancel the writer tasks."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, invoice):
+        """Queue ``invoice`` and return its ``(invoice_id, customer_id)``, or None if already stored."""
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((invoice, future))
+        return await future
+
+    async def _write_loop(self):
+        """Commit queued invoices in batches until cancelled."""
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            await self._commit(batch)
+
+    async def _commit(self, batch):
+        """Save ``batch`` in one transaction and resolve each request's future."""
+        invoices = [invoice for invoice, _future in batch]
+        try:
+            saved = await self._save(invoices)
+        except mysql.connector.Error as e:
+            if len(batch) > 1 and not is_connection_lost(e):
+                for entry in batch:
+                    await self._commit([entry])
+                return
+            for _invoice, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        self.batches += 1
+        self.invoices += len(batch)
+        METRICS.increment("server.batches")
+        METRICS.increment("server.bills", len(batch))
+        for (_invoice, future), result in zip(batch, saved):
+            if not future.done():
+                future.set_result(result)
+
+
+    async def _save(self, invoices):
+        """Save ``invoices`` on a worker thread, retrying them with backoff while they lose deadlocks."""
+        for attempt in range(self.DEADLOCK_ATTEMPTS):
+            try:
+                return await asyncio.to_thread(
+                    self.manager.run,
+                    lambda connection: billing_repository.save_invoices(connection, invoices),
+                    retry=True,
+                )
+            except mysql.connector.Error as e:
+                if e.errno != errorcode.ER_LOCK_DEADLOCK or attempt == self.DEADLOCK_ATTEMPTS - 1:
+                    raise
+                METRICS.increment("server.deadlocks")
+                await asyncio.sleep(self.DEADLOCK_BACKOFF * 2**attempt)
+
+
+class BillingServer:
+    """Minimal HTTP/1.1 server with keep-alive over the billing repository."""
+
+    def __init__(self, manager, writers=2, max_batch=500):
+        """Initialize a server writing through ``manager``'s pool."""
+        self.manager = manager
+        self.committer = GroupCommitter(manager, writers=writers, max_batch=max_batch)
+        self._server = None
+
+    async def start(self, host="127.0.0.1", port=8080):
+        """Start listening and return the bound ``(host, port)``."""
+        self.committer.start()
+        self._server = await asyncio.start_server(self._handle_connection, host, port)
+        return self._server.sockets[0].getsockname()[:2]
+
+    async def serve_forever(self):
+        """Serve requests until cancelled."""
+        await self._server.serve_forever()
+
+    async def close(self):
+        """Stop accepting connections and stop the writers."""
+        self._server.close()
+        await self._server.wait_closed()
+        await self.committer.stop()
+
+    async def _handle_connection(self, reader, writer):
+        """Answer requests on one connection until the client closes it."""
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                method, path, headers, body = request
+                status, payload = await self._dispatch(method, path, body)
+                keep_alive = headers.get("connection", "").lower() != "close"
+                self._write_response(writer, status, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except HTTPError as e:
+            self._write_response(writer, e.status, {"error": str(e)}, False)
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _read_request(reader):
+        """Return ``(method, path, headers, body)``, or None at end of stream."""
+        request_line = await reader.readline()
+        if not request_line.strip():
+            return None
+        try:
+            method, path, _version = request_line.decode("latin-1").split()
+        except ValueError:
+            raise HTTPError(400, "Malformed request line") from None
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            key, _, value = line.decode("latin-1").partition(":")
+            headers[key.strip().lower()] = value.strip()
+        try:
+            length = int(headers.get("content-length") or 0)
+        except ValueError:
+            raise HTTPError(400, "Malformed Content-Length") from None
+        if length > MAX_BODY:
+            raise HTTPError(413, "Request body too large")
+        body = await reader.readexactly(length) if length else b""
+        return method, path.split("?", 1)[0], headers, body
+
+    async def _dispatch(self, method, path, body):
+        """Route one request and return ``(status, payload)``."""
+        routes = {
+            "/bills": ("POST", self._post_bill),
+            "/summary": ("GET", self._get_summary),
+            "/metrics": ("GET", self._get_metrics),
+            "/health": ("GET", self._get_health),
+        }
+        if path not in routes:
+            return 404, {"error": f"No such endpoint: {path}"}
+        allowed, handler = routes[path]
+        if method != allowed:
+            return 405, {"error": f"Use {allowed} for {path}"}
+        try:
+            with METRICS.timer(f"http.{method.lower()}_{path.strip('/')}"):
+                return await handler(body)
+        except ValidationError as e:
+            return 400, {"error": str(e)}
+        except mysql.connector.Error as e:
+            return (503 if is_connection_lost(e) else 500), {"error": str(e)}
+        except Exception as e:  # Never let one request take the connection down
+            return 500, {"error": f"{type(e).__name__}: {e}"}
+
+    async def _post_bill(self, body):
+        """Validate and group-commit one bill."""
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            raise ValidationError("Invalid Input", "Request body is not valid JSON") from None
+        invoice = parse_bill(payload)
+        saved = await self.committer.submit(invoice)
+        if saved is None:
+            return 200, {"client_ref": invoice["client_ref"], "duplicate": True}
+        invoice_id, customer_id = saved
+        return 201, {"client_ref": invoice["client_ref"], "invoice_id": invoice_id, "customer_id": customer_id}
+
+    async def _get_summary(self, _body):
+        """Return the running bill count and revenue."""
+        bill_count, revenue = await asyncio.to_thread(self.manager.run, billing_repository.fetch_summary, retry=True)
+        return 200, {"bill_count": bill_count, "revenue": str(revenue)}
+
+    async def _get_metrics(self, _body):
+        """Return every metric of this process as Prometheus text."""
+        return 200, METRICS.prometheus_text()
+
+    async def _get_health(self, _body):
+        """Report that the service is up."""
+        return 200, {"status": "ok"}
+
+    @staticmethod
+    def _write_response(writer, status, payload, keep_alive):
+        """Write a JSON response, or a plain text one if ``payload`` is a string."""
+        if isinstance(payload, str):
+            body, content_type = payload.encode(), "text/plain; version=0.0.4"
+        else:
+            body, content_type = json.dumps(payload).encode(), "application/json"
+        head = (
+            f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+            "\r\n"
+        )
+        writer.write(head.encode("latin-1") + body)
+
+
+async def serve(host, port, pool_size, writers, max_batch):
+    """Migrate the schema, then serve until cancelled."""
+    if DB_CONFIG.get("backend") == "sqlite":
+        # SQLite has a single writer; more writers would only queue on its lock
+        writers = 1
+    manager = ConnectionManager(DB_CONFIG, pool_size=pool_size)
+    try:
+        await asyncio.to_thread(manager.run, billing_schema.migrate)
+        server = BillingServer(manager, writers=writers, max_batch=max_batch)
+        host, port = await server.start(host, port)
+        print(f"Listening on http://{host}:{port}")
+        try:
+            await server.serve_forever()
+        finally:
+            await server.close()
+    finally:
+        manager.close()
+
+
+def main(argv=None):
+    """Run the ingest service from the command line."""
+    parser = argparse.ArgumentParser(description="Accept bills from many terminals over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8080, help="port to listen on (default: 8080)")
+    parser.add_argument("--writers", type=int, default=2, help="concurrent group-commit writers (default: 2)")
+    parser.add_argument("--max-batch", type=int, default=500, help="most bills per shared transaction (default: 500)")
+    args = parser.parse_args(argv)
+
+    try:
+        # One connection per writer plus headroom for summary reads
+        asyncio.run(serve(args.host, args.port, args.writers + 2, args.writers, args.max_batch))
+    except mysql.connector.Error as e:
+        print(f"Cannot start: {e}", file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,367 @@
+"""Embedded SQLite backend for single-counter installs.
+
+``connect`` returns a connection that behaves like a mysql.connector one
+as far as the rest of the code is concerned: cursors take ``%s``
+placeholders and work as context managers, results come back as tuples
+of ``int``, ``Decimal``, ``date`` and ``datetime``, and failures raise
+``mysql.connector`` errors with the matching MySQL error numbers, so the
+repository, reports, importer and exporter run unchanged on either
+backend.
+
+Statements are written once, in the MySQL dialect, and the few MySQL
+idioms the code relies on are rewritten on the way in (cached per
+statement text):
+
+* ``INSERT IGNORE`` becomes ``INSERT OR IGNORE``
+* ``ON DUPLICATE KEY UPDATE`` becomes ``ON CONFLICT DO UPDATE SET`` with
+  ``VALUES(col)`` read from ``excluded.col``; ``col = LAST_INSERT_ID(col)``
+  becomes ``RETURNING col`` and sets the cursor's ``lastrowid``
+* ``LOCK TABLES`` and ``GET_LOCK`` take SQLite's single write lock with
+  ``BEGIN IMMEDIATE``, which the next commit or rollback releases
+* ``DATE_FORMAT`` is provided as a SQL function
+
+Connections open the database in WAL mode, so readers never block the
+writer, with ``synchronous=NORMAL``: the WAL is only synced at
+checkpoints, so a power cut can lose the last few commits but never
+corrupts the file. SQLite allows one writer at a time, so throughput comes
+from batching many bills into each commit, as journal replay, the ingest
+service's group commit and the bulk importer already do.
+"""
+
+import itertools
+import os
+import re
+import sqlite3
+from datetime import date, datetime
+from decimal import Decimal
+from functools import lru_cache
+
+import mysql.connector
+
+DEFAULT_PATH = os.path.expanduser("~/.billing_db.sqlite3")
+
+PRAGMAS = [
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA foreign_keys = ON",
+    "PRAGMA cache_size = -65536",  # 64 MB
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA mmap_size = 268435456",  # 256 MB
+]
+
+# Seconds a writer waits for another connection's write lock before failing
+BUSY_TIMEOUT = 10
+
+# Compiled statements kept per connection; SQLite's equivalent of prepared cursors
+CACHED_STATEMENTS = 256
+
+CENT = Decimal("0.01")
+
+# MySQL error numbers reported for the matching SQLite failures
+ER_DUP_ENTRY = 1062
+ER_BAD_NULL_ERROR = 1048
+ER_NO_REFERENCED_ROW = 1452
+ER_NO_SUCH_TABLE = 1146
+ER_PARSE_ERROR = 1064
+ER_LOCK_WAIT_TIMEOUT = 1205
+
+# Oldest SQLite library with the RETURNING clause the upsert rewrite relies on
+MIN_SQLITE_VERSION = (3, 35)
+
+# MySQL DATE_FORMAT specifiers that differ from strftime's
+DATE_FORMAT_SPECIFIERS = {"%i": "%M", "%s": "%S"}
+
+_connection_ids = itertools.count(1)
+
+sqlite3.register_adapter(Decimal, str)
+sqlite3.register_adapter(date, date.isoformat)
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(" "))
+sqlite3.register_converter("DATE", lambda value: date.fromisoformat(value.decode()))
+sqlite3.register_converter("TIMESTAMP", lambda value: datetime.fromisoformat(value.decode()))
+
+
+class _Statement:
+    """A MySQL-dialect statement rewritten for SQLite."""
+
+    def __init__(self, sql, lock=False, returns_id=False, bind=True):
+        """Initialize a statement; ``sql`` is None when there is nothing to run.
+
+        ``bind`` is False when the rewrite dropped the placeholders, so the
+        caller's parameters are ignored.
+        """
+        self.sql = sql
+        self.lock = lock
+        self.returns_id = returns_id
+        self.bind = bind
+
+
+@lru_cache(maxsize=512)
+def translate(operation):
+    """Return the ``_Statement`` that runs the MySQL-dialect ``operation`` on SQLite."""
+    head = operation.lstrip()[:20].upper()
+    if head.startswith("LOCK TABLES"):
+        return _Statement(None, lock=True)
+    if head.startswith("UNLOCK TABLES"):
+        return _Statement(None)
+    if head.startswith("SELECT GET_LOCK("):
+        return _Statement("SELECT 1", lock=True, bind=False)
+    if head.startswith("SELECT RELEASE_LOCK("):
+        return _Statement("SELECT 1", bind=False)
+
+    # Rewrite only the SQL between string literals, then put the literals back
+    parts = re.split(r"('(?:[^']|'')*')", operation)
+    code = "\x00".join(parts[0::2]).replace("%s", "?")
+    code = re.sub(r"\bINSERT\s+IGNORE\b", "INSERT OR IGNORE", code, flags=re.I)
+    returns_id = False
+    duplicate = re.search(r"\bON\s+DUPLICATE\s+KEY\s+UPDATE\b", code, re.I)
+    if duplicate:
+        update = re.sub(r"\bVALUES\((\w+)\)", r"excluded.\1", code[duplicate.end():], flags=re.I)
+        last_id = re.search(r"(\w+)\s*=\s*LAST_INSERT_ID\(\1\)\s*,?", update, re.I)
+        if last_id:
+            update = f"{update[:last_id.start()]}{update[last_id.end():].rstrip()} RETURNING {last_id.group(1)}"
+            returns_id = True
+        code = f"{code[:duplicate.start()]}ON CONFLICT DO UPDATE SET{update}"
+    literals = parts[1::2] + [""]
+    sql = "".join(piece + literal for piece, literal in zip(code.split("\x00"), literals))
+    return _Statement(sql, returns_id=returns_id)
+
+
+def _date_format(value, fmt):
+    """MySQL's DATE_FORMAT for the ISO timestamps SQLite stores."""
+    if value is None:
+        return None
+    for specifier, replacement in DATE_FORMAT_SPECIFIERS.items():
+        fmt = fmt.replace(specifier, replacement)
+    return datetime.fromisoformat(value).strftime(fmt)
+
+
+def _database_error(error):
+    """Return the mysql.connector error matching SQLite ``error``."""
+    message = str(error)
+    if isinstance(error, sqlite3.IntegrityError):
+        if message.startswith("UNIQUE") or message.startswith("PRIMARY KEY"):
+            errno = ER_DUP_ENTRY
+        elif message.startswith("NOT NULL"):
+            errno = ER_BAD_NULL_ERROR
+        elif message.startswith("FOREIGN KEY"):
+            errno = ER_NO_REFERENCED_ROW
+        else:
+            errno = None
+        return mysql.connector.errors.IntegrityError(msg=message, errno=errno)
+    if message.startswith("no such table"):
+        return mysql.connector.errors.ProgrammingError(msg=message, errno=ER_NO_SUCH_TABLE)
+    if "syntax error" in message:
+        return mysql.connector.errors.ProgrammingError(msg=message, errno=ER_PARSE_ERROR)
+    if message.startswith("database is locked"):
+        return mysql.connector.errors.OperationalError(msg=message, errno=ER_LOCK_WAIT_TIMEOUT)
+    if isinstance(error, sqlite3.OperationalError):
+        return mysql.connector.errors.OperationalError(msg=message)
+    return mysql.connector.errors.DatabaseError(msg=message)
+
+
+def _convert(row):
+    """Return ``row`` with floats as two-place Decimals.
+
+    SQLite has no fixed-point type, so the SQLite schema stores amounts as
+    REAL and money expressions such as ``SUM(revenue)`` are computed in
+    floating point; every non-integer number in this schema is an amount in
+    rupees, so it is returned the way MySQL returns DECIMAL results.
+    """
+    if row is None or not any(type(value) is float for value in row):
+        return row
+    return tuple(Decimal(repr(value)).quantize(CENT) if type(value) is float else value for value in row)
+
+
+class SQLiteCursor:
+    """Cursor running MySQL-dialect statements on a ``SQLiteConnection``."""
+
+    dialect = "sqlite"
+
+    def __init__(self, connection):
+        """Initialize a cursor on ``connection``."""
+        self._connection = connection
+        self._cursor = connection._db.cursor()
+        self._lastrowid = None
+        self._has_rows = False
+
+    def __enter__(self):
+        """Return the cursor for use in a ``with`` block."""
+        return self
+
+    def __exit__(self, *exc_info):
+        """Close the cursor."""
+        self.close()
+
+    def __iter__(self):
+        """Iterate over the remaining rows."""
+        return iter(self.fetchone, None)
+
+    @property
+    def description(self):
+        """Column descriptions of the current result set, or None."""
+        return self._cursor.description if self._has_rows else None
+
+    @property
+    def rowcount(self):
+        """Rows changed by the last INSERT, UPDATE or DELETE."""
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        """Id of the row last inserted, or of the row an upsert matched."""
+        return self._lastrowid
+
+    def execute(self, operation, params=()):
+        """Execute one MySQL-dialect statement."""
+        statement = self._prepare(operation)
+        if statement.sql is None:
+            self._has_rows = False
+            return
+        try:
+            self._cursor.execute(statement.sql, params or () if statement.bind else ())
+        except sqlite3.Error as e:
+            raise _database_error(e) from e
+        self._finish(statement)
+
+    def executemany(self, operation, seq_params):
+        """Execute one MySQL-dialect statement for every parameter set."""
+        statement = self._prepare(operation)
+        try:
+            self._cursor.executemany(statement.sql, seq_params)
+        except sqlite3.Error as e:
+            raise _database_error(e) from e
+        self._finish(statement)
+
+    def _prepare(self, operation):
+        """Translate ``operation``, taking the write lock first if it asks for one."""
+        statement = translate(operation)
+        if statement.lock:
+            self._connection._lock()
+        return statement
+
+    def _finish(self, statement):
+        """Record what the statement just executed returned."""
+        if statement.returns_id:
+            self._lastrowid = self._cursor.fetchone()[0]
+            self._has_rows = False
+        else:
+            self._lastrowid = self._cursor.lastrowid
+            self._has_rows = self._cursor.description is not None
+
+    def fetchone(self):
+        """Return the next row, or None."""
+        try:
+            return _convert(self._cursor.fetchone())
+        except sqlite3.Error as e:
+            raise _database_error(e) from e
+
+    def fetchmany(self, size=1):
+        """Return up to ``size`` more rows."""
+        try:
+            return [_convert(row) for row in self._cursor.fetchmany(size)]
+        except sqlite3.Error as e:
+            raise _database_error(e) from e
+
+    def fetchall(self):
+        """Return every remaining row."""
+        try:
+            return [_convert(row) for row in self._cursor.fetchall()]
+        except sqlite3.Error as e:
+            raise _database_error(e) from e
+
+    def close(self):
+        """Close the cursor."""
+        self._cursor.close()
+
+
+class SQLiteConnection:
+    """Connection to a SQLite database with the parts of mysql.connector's API the billing code uses."""
+
+    dialect = "sqlite"
+
+    def __init__(self, path):
+        """Open the database at ``path``, creating it if needed."""
+        try:
+            self._db = sqlite3.connect(
+                path,
+                timeout=BUSY_TIMEOUT,
+                detect_types=sqlite3.PARSE_DECLTYPES,
+                check_same_thread=False,  # The pool hands connections between worker threads
+                cached_statements=CACHED_STATEMENTS,
+            )
+            for pragma in PRAGMAS:
+                self._db.execute(pragma)
+        except sqlite3.Error as e:
+            raise _database_error(e) from e
+        self._db.create_function("DATE_FORMAT", 2, _date_format, deterministic=True)
+        self.connection_id = next(_connection_ids)
+        self.path = path
+
+    @property
+    def in_transaction(self):
+        """True while a transaction is open."""
+        return self._db.in_transaction
+
+    def cursor(self, *args, **kwargs):
+        """Return a new cursor; mysql.connector options such as ``prepared`` are accepted and ignored."""
+        return SQLiteCursor(self)
+
+    def commit(self):
+        """Commit the current transaction."""
+        try:
+            self._db.commit()
+        except sqlite3.Error as e:
+            raise _database_error(e) from e
+
+    def rollback(self):
+        """Roll back the current transaction."""
+        try:
+            self._db.rollback()
+        except sqlite3.Error as e:
+            raise _database_error(e) from e
+
+    def ping(self, reconnect=False, attempts=1, delay=0):
+        """Check the database is still open; there is no server to reconnect to."""
+        try:
+            self._db.execute("SELECT 1")
+        except sqlite3.Error as e:
+            raise mysql.connector.errors.InterfaceError(msg=str(e)) from e
+
+    def is_connected(self):
+        """Return True while the database is open."""
+        try:
+            self._db.execute("SELECT 1")
+        except sqlite3.Error:
+            return False
+        return True
+
+    def get_server_info(self):
+        """Describe the engine, like a MySQL server version string."""
+        return f"SQLite {sqlite3.sqlite_version}"
+
+    def close(self):
+        """Close the database."""
+        self._db.close()
+
+    def _lock(self):
+        """Take the write lock, committing any open transaction first as LOCK TABLES does."""
+        try:
+            if self._db.in_transaction:
+                self._db.commit()
+            self._db.execute("BEGIN IMMEDIATE")
+        except sqlite3.Error as e:
+            raise _database_error(e) from e
+
+
+def connect(path=DEFAULT_PATH):
+    """Open the SQLite database at ``path`` with the tuned pragmas.
+
+    Fails with ``NotSupportedError`` when Python is linked against a
+    SQLite library older than ``MIN_SQLITE_VERSION``.
+    """
+    if sqlite3.sqlite_version_info < MIN_SQLITE_VERSION:
+        required = ".".join(map(str, MIN_SQLITE_VERSION))
+        raise mysql.connector.errors.NotSupportedError(
+            msg=f"The SQLite backend needs SQLite {required} or newer, but Python uses {sqlite3.sqlite_version}"
+        )
+    return SQLiteConnection(path)
@@ -0,0 +1,14 @@
+"""Colour palette shared by the billing window and the printed invoices."""
+
+COLORS = {
+    "primary": "#3498db",  # Blue
+    "secondary": "#2ecc71",  # Green
+    "accent": "#9b59b6",  # Purple
+    "danger": "#e74c3c",  # Red
+    "warning": "#f39c12",  # Orange
+    "background": "#f9f9f9",  # Light Gray
+    "card": "#ffffff",  # White
+    "text": "#2c3e50",  # Dark Blue Gray
+    "text_light": "#7f8c8d",  # Gray
+    "border": "#ecf0f1",  # Very Light Gray
+}
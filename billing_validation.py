@@ -0,0 +1,60 @@
+"""Validation rules shared by the billing form and the headless tools."""
+
+import math
+
+PAYMENT_METHODS = ["Cash", "Credit Card", "Debit Card", "Scanner", "UPI"]
+
+
+class ValidationError(ValueError):
+    """Raised when a bill field is missing or invalid.
+
+    ``title`` is a short heading suitable for a dialog box.
+    """
+
+    def __init__(self, title, message):
+        super().__init__(message)
+        self.title = title
+
+
+def text_field(record, field):
+    """Return ``record[field]``, which must be a string or missing.
+
+    Raises ValidationError naming the field when a decoded JSON value has
+    another type, such as a number or a list.
+    """
+    value = record.get(field)
+    if value is not None and not isinstance(value, str):
+        raise ValidationError("Invalid Input", f"{field} must be text, not {type(value).__name__}")
+    return value
+
+
+def validate_customer(name, phone):
+    """Return the stripped ``(name, phone)`` of a bill's customer."""
+    name = (name or "").strip()
+    phone = (phone or "").strip()
+    if not name:
+        raise ValidationError("Input Required", "Please fill all required fields before saving!")
+    return name, phone
+
+
+def validate_line_item(item, quantity, price):
+    """Return ``(item, quantity, price)`` parsed from raw field values.
+
+    Quantity must be a positive integer and price a positive number.
+    """
+    item = (item or "").strip()
+    quantity = str(quantity if quantity is not None else "").strip()
+    price = str(price if price is not None else "").strip()
+    if not all([item, quantity, price]):
+        raise ValidationError("Input Required", "Please fill all required fields before saving!")
+
+    try:
+        quantity_val = int(quantity)
+        price_val = float(price)
+        if not math.isfinite(price_val):
+            raise ValueError(price)
+    except ValueError:
+        raise ValidationError("Invalid Input", "Please enter valid numbers for quantity and price!") from None
+    if quantity_val <= 0 or price_val <= 0:
+        raise ValidationError("Invalid Input", "Quantity and Price must be positive values!")
+    return item, quantity_val, price_val
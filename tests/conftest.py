@@ -0,0 +1,30 @@
+"""Shared fixtures for the billing tests."""
+
+import os
+import sys
+
+import pytest
+
+# The billing modules live flat in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import billing_schema  # noqa: E402
+from billing_connection import connect  # noqa: E402
+
+
+@pytest.fixture
+def db_config(tmp_path):
+    """Return the configuration of a new SQLite billing database at the current schema version."""
+    config = {"backend": "sqlite", "path": str(tmp_path / "billing.sqlite3")}
+    connection = connect(config)
+    billing_schema.migrate(connection)
+    connection.close()
+    return config
+
+
+@pytest.fixture
+def connection(db_config):
+    """Return an open connection to the test database."""
+    connection = connect(db_config)
+    yield connection
+    connection.close()
@@ -0,0 +1,115 @@
+"""Tests for month partition helpers and archiving closed months."""
+
+from datetime import date, datetime
+from decimal import Decimal
+
+import billing_archive
+import billing_repository
+from billing_archive import (
+    ALL_BILLS,
+    archive,
+    last_partitioned_month,
+    next_month,
+    partition_definitions,
+    partition_name,
+    partitioned_months,
+    previous_month,
+    status,
+)
+
+TODAY = date(2026, 10, 17)
+
+
+def _save(connection, created_at, lines=(("Tea", 2, 5.25),)):
+    """Save a one-customer invoice stamped ``created_at``."""
+    invoice = billing_repository.new_invoice("Asha", "98765", "Cash", lines)
+    invoice["created_at"] = created_at
+    billing_repository.save_invoice(connection, invoice)
+
+
+def _count(connection, table):
+    """Return the number of rows in ``table``."""
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT COUNT(*) FROM {table}")
+        return cursor.fetchone()[0]
+
+
+def test_month_arithmetic():
+    assert next_month(date(2025, 12, 1)) == date(2026, 1, 1)
+    assert next_month(date(2024, 1, 1)) == date(2024, 2, 1)
+    assert previous_month(date(2026, 1, 1)) == date(2025, 12, 1)
+    assert previous_month(date(2024, 3, 1)) == date(2024, 2, 1)
+    assert partition_name(date(2026, 2, 1)) == "p202602"
+    assert last_partitioned_month(3, TODAY) == date(2027, 1, 1)
+    assert last_partitioned_month(0, TODAY) == date(2026, 10, 1)
+
+
+def test_partition_definitions_cover_each_month_then_the_future():
+    clauses = partition_definitions(date(2025, 11, 1), date(2026, 1, 1))
+    assert clauses == (
+        "PARTITION p202511 VALUES LESS THAN (UNIX_TIMESTAMP('2025-12-01')), "
+        "PARTITION p202512 VALUES LESS THAN (UNIX_TIMESTAMP('2026-01-01')), "
+        "PARTITION p202601 VALUES LESS THAN (UNIX_TIMESTAMP('2026-02-01')), "
+        "PARTITION p_future VALUES LESS THAN MAXVALUE"
+    )
+
+
+def test_sqlite_has_no_partitions(connection):
+    with connection.cursor() as cursor:
+        assert partitioned_months(cursor) == []
+
+
+def test_archive_moves_only_months_with_bills(connection):
+    for created_at in [
+        datetime(2019, 3, 5, 10),
+        datetime(2019, 3, 31, 23, 59),
+        datetime(2022, 7, 1, 9),
+        datetime(2026, 8, 1, 0, 0),
+        datetime(2026, 10, 1, 8),
+    ]:
+        _save(connection, created_at)
+
+    archived = archive(connection, keep_months=3, today=TODAY)
+
+    assert archived == [
+        (date(2019, 3, 1), 2, Decimal("21.00")),
+        (date(2022, 7, 1), 1, Decimal("10.50")),
+    ]
+    hot, months = status(connection)
+    assert hot == [(date(2026, 8, 1), 1, Decimal("10.50")), (date(2026, 10, 1), 1, Decimal("10.50"))]
+    assert months == archived
+    assert billing_repository.fetch_summary(connection) == (2, Decimal("21.00"))
+    assert _count(connection, "bills_archive") == 3
+    assert _count(connection, f"{ALL_BILLS} all_bills") == 5
+
+
+def test_archive_twice_is_a_no_op(connection):
+    _save(connection, datetime(2025, 1, 10, 12))
+    _save(connection, datetime(2026, 10, 2, 12))
+    assert len(archive(connection, keep_months=1, today=TODAY)) == 1
+    assert archive(connection, keep_months=1, today=TODAY) == []
+    assert status(connection)[1] == [(date(2025, 1, 1), 1, Decimal("10.50"))]
+    assert billing_repository.fetch_summary(connection) == (1, Decimal("10.50"))
+
+
+def test_archive_keeps_the_hot_window(connection):
+    # Twelve months counting this one reach back to November of last year
+    _save(connection, datetime(2025, 10, 31, 23, 59))
+    _save(connection, datetime(2025, 11, 1, 0, 0))
+    archived = archive(connection, keep_months=billing_archive.HOT_MONTHS, today=TODAY)
+    assert archived == [(date(2025, 10, 1), 1, Decimal("10.50"))]
+    assert status(connection)[0] == [(date(2025, 11, 1), 1, Decimal("10.50"))]
+
+
+def test_rows_from_several_months_are_recorded_under_their_own(connection):
+    # As when a partition swap also brings out late bills, or older ones the oldest partition holds
+    _save(connection, datetime(2025, 12, 31, 23, 59))
+    _save(connection, datetime(2026, 1, 15, 12), [("Tea", 1, 4.0)])
+    _save(connection, datetime(2026, 1, 20, 12))
+    with connection.cursor() as cursor:
+        archived = billing_archive._archive_rows(cursor, "bills")
+    connection.commit()
+
+    assert archived == [(date(2025, 12, 1), 1, Decimal("10.50")), (date(2026, 1, 1), 2, Decimal("14.50"))]
+    assert status(connection)[1] == archived
+    assert billing_repository.fetch_summary(connection) == (0, Decimal("0.00"))
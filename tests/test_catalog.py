@@ -0,0 +1,84 @@
+"""Tests for the item catalog's prefix index."""
+
+from datetime import datetime
+from decimal import Decimal
+
+from billing_catalog import ItemCatalog, fetch_items, save_items
+
+
+def _catalog(*names):
+    """Return a loaded catalog holding ``names`` at a price of 1."""
+    catalog = ItemCatalog()
+    catalog.apply((name, Decimal("1"), None) for name in names)
+    return catalog
+
+
+def test_complete_is_case_insensitive_and_sorted():
+    catalog = _catalog("Tea", "toast", "Tandoori Roti", "Coffee", "TEA CAKE")
+    assert catalog.complete("t") == ["Tandoori Roti", "Tea", "TEA CAKE", "toast"]
+    assert catalog.complete("TEA") == ["Tea", "TEA CAKE"]
+    assert catalog.complete("tea ") == ["TEA CAKE"]
+
+
+def test_complete_without_matches_or_past_the_end():
+    catalog = _catalog("Bun", "Coffee")
+    assert catalog.complete("x") == []
+    assert catalog.complete("zzz") == []
+    assert ItemCatalog().complete("a") == []
+
+
+def test_complete_stops_at_the_limit():
+    catalog = _catalog(*(f"Item {number:03}" for number in range(100)))
+    assert catalog.complete("item", limit=3) == ["Item 000", "Item 001", "Item 002"]
+    assert len(catalog.complete("")) == 20
+
+
+def test_update_changes_the_price_without_duplicating_the_name():
+    catalog = _catalog("Tea")
+    catalog.update("TEA", Decimal("15.00"))
+    catalog.update("Samosa", Decimal("12.50"))
+    assert len(catalog) == 2
+    assert catalog.complete("t") == ["TEA"]
+    assert catalog.price(" tea ") == Decimal("15.00")
+    assert catalog.price("Samosa") == Decimal("12.50")
+    assert catalog.price("Chai") is None
+
+
+def test_apply_tracks_the_newest_change():
+    catalog = ItemCatalog()
+    assert not catalog.loaded
+    catalog.apply(
+        [
+            ("Tea", Decimal("10"), datetime(2026, 1, 2)),
+            ("Bun", Decimal("5"), datetime(2026, 3, 4)),
+            ("Cake", Decimal("40"), None),
+        ]
+    )
+    assert catalog.loaded
+    assert catalog.watermark == datetime(2026, 3, 4)
+
+
+def test_catalog_loads_from_the_database(connection):
+    with connection.cursor() as cursor:
+        save_items(cursor, [("Tea", 2, Decimal("10.00")), ("Bun", 1, Decimal("5.00")), ("Tea", 1, Decimal("12.00"))])
+    connection.commit()
+    catalog = ItemCatalog()
+    catalog.apply(fetch_items(connection))
+    assert catalog.complete("") == ["Bun", "Tea"]
+    assert catalog.price("tea") == Decimal("12.00")
+
+
+class _RecordingCursor:
+    """Cursor stand-in that records the parameters of ``executemany``."""
+
+    def __init__(self):
+        self.params = None
+
+    def executemany(self, operation, params):
+        self.params = params
+
+
+def test_items_are_written_once_each_in_case_folded_order():
+    cursor = _RecordingCursor()
+    save_items(cursor, [("tea", 1, Decimal("10.00")), ("Bun", 1, Decimal("5.00")), ("Tea", 1, Decimal("12.00"))])
+    assert cursor.params == [("Bun", Decimal("5.00")), ("Tea", Decimal("12.00"))]
@@ -0,0 +1,90 @@
+"""Tests for the columnar bill store behind the bills table."""
+
+from decimal import Decimal
+
+import pytest
+
+import billing_columns
+from billing_columns import BILL_ID, CUSTOMER, PRICE, QUANTITY, TOTAL, BillColumns, to_paise, to_rupees
+
+
+def _row(bill_id, customer, quantity, price, phone=None, item="Tea", method="Cash"):
+    """Return a row shaped like a BILLS_QUERY result."""
+    price = Decimal(price)
+    return (bill_id, customer, phone, item, quantity, price, method, price * quantity)
+
+
+@pytest.fixture
+def bills():
+    """Return a store holding four bills, newest first."""
+    bills = BillColumns()
+    bills.extend(
+        [
+            _row(4, "ravi", 1, "10.00"),
+            _row(3, None, 2, "0.05"),
+            _row(2, "Asha", 3, "10.00", phone="98765"),
+            _row(1, "asha", 1, "99999999.99"),
+        ]
+    )
+    return bills
+
+
+@pytest.mark.parametrize("amount", ["0.00", "0.01", "0.10", "12.34", "-5.25", "99999999.99"])
+def test_paise_round_trip(amount):
+    amount = Decimal(amount)
+    assert to_rupees(to_paise(amount)) == amount
+    assert str(to_rupees(to_paise(amount))) == str(amount)
+
+
+@pytest.mark.parametrize("amount, paise", [(0.29, 29), (1.1, 110), (19.99, 1999), (Decimal("0.005"), 1), (7, 700)])
+def test_paise_from_floats_and_half_paise(amount, paise):
+    assert to_paise(amount) == paise
+
+
+@pytest.fixture(params=["numpy", "sorted"])
+def sorting(request, monkeypatch):
+    """Sort with numpy's argsort, and again with the sorted() fallback."""
+    if request.param == "numpy":
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(billing_columns, "numpy", None)
+
+
+def test_values_come_back_as_stored(bills):
+    assert len(bills) == 4
+    assert bills.value(0, BILL_ID) == 4
+    assert bills.value(1, CUSTOMER) is None
+    assert bills.value(2, QUANTITY) == 3
+    assert bills.value(1, PRICE) == Decimal("0.05")
+    assert bills.value(3, TOTAL) == Decimal("99999999.99")
+    assert bills.value(2, 2) == "98765"
+
+
+@pytest.mark.usefixtures("sorting")
+def test_sort_by_number_is_a_stable_permutation(bills):
+    assert list(bills.sort_order(PRICE)) == [1, 0, 2, 3]
+    assert list(bills.sort_order(PRICE, descending=True)) == [3, 0, 2, 1]
+    assert list(bills.sort_order(TOTAL)) == [1, 0, 2, 3]
+    # Sorting only computes an order; the stored rows stay where they were
+    assert list(bills.bill_ids) == [4, 3, 2, 1]
+
+
+@pytest.mark.usefixtures("sorting")
+def test_sort_by_text_puts_none_first_and_compares_values(bills):
+    assert list(bills.sort_order(CUSTOMER)) == [1, 2, 3, 0]
+    assert list(bills.sort_order(CUSTOMER, descending=True)) == [0, 3, 2, 1]
+
+
+@pytest.mark.usefixtures("sorting")
+def test_prepend_keeps_newest_first_and_shares_text_codes(bills):
+    bills.prepend([_row(6, "Asha", 1, "1.50"), _row(5, "new", 2, "2.25")])
+    assert list(bills.bill_ids) == [6, 5, 4, 3, 2, 1]
+    assert bills.value(0, CUSTOMER) == "Asha"
+    assert bills.value(1, CUSTOMER) == "new"
+    assert list(bills.sort_order(CUSTOMER)) == [3, 0, 4, 5, 1, 2]
+
+
+def test_totals(bills):
+    assert bills.total() == Decimal("100000040.09")
+    assert bills.total([0, 1]) == Decimal("10.10")
+    assert bills.total(range(0)) == Decimal("0.00")
@@ -0,0 +1,43 @@
+"""Tests for the connection pool and its error classification."""
+
+import mysql.connector
+import pytest
+from mysql.connector import errors
+
+from billing_connection import ConnectionManager, is_connection_lost, is_rejected
+
+
+@pytest.mark.parametrize(
+    "error, lost, rejected",
+    [
+        (errors.IntegrityError(msg="Duplicate entry", errno=1062), False, True),
+        (errors.DataError(msg="Data too long for column", errno=1406), False, True),
+        (errors.DatabaseError(msg="Lock wait timeout exceeded", errno=1205), False, False),
+        (errors.InternalError(msg="Deadlock found when trying to get lock", errno=1213), False, False),
+        (errors.PoolError("Timed out waiting for a database connection"), False, False),
+        (errors.OperationalError(msg="MySQL server has gone away", errno=2006), True, False),
+        (errors.InterfaceError("Connection not available"), True, False),
+    ],
+)
+def test_errors_are_classified(error, lost, rejected):
+    assert is_connection_lost(error) == lost
+    assert is_rejected(error) == rejected
+
+
+def test_refused_data_is_a_rejection(connection):
+    with connection.cursor() as cursor:
+        with pytest.raises(mysql.connector.Error) as raised:
+            cursor.execute("INSERT INTO bills (invoice_id, item, quantity, price) VALUES (%s, NULL, 1, 1)", (1,))
+    assert is_rejected(raised.value)
+
+
+def test_checkout_times_out_when_the_pool_is_exhausted(db_config, monkeypatch):
+    monkeypatch.setattr(ConnectionManager, "CHECKOUT_TIMEOUT", 0.05)
+    manager = ConnectionManager(db_config, pool_size=1)
+    with manager.connection():
+        with pytest.raises(errors.PoolError) as raised:
+            with manager.connection():
+                pass
+    assert not is_rejected(raised.value)
+    assert manager.run(lambda connection: 42) == 42
+    manager.close()
@@ -0,0 +1,71 @@
+"""Tests for streaming the transaction history out to files."""
+
+import csv
+import json
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+from billing_export import COLUMNS, export_bills, format_for_path
+from billing_import import BulkImporter
+
+
+def _invoice(name, phone, created_at, lines, payment_method="Cash"):
+    """Return an invoice shaped like the importer's input."""
+    return {"name": name, "phone": phone, "payment_method": payment_method, "created_at": created_at, "lines": lines}
+
+
+@pytest.fixture
+def history(connection):
+    """Return ``connection`` with three bills across two months."""
+    BulkImporter(connection).run(
+        [
+            _invoice("Asha", "98765", datetime(2024, 1, 31, 23, 59), [("Tea", 2, Decimal("10.50"))]),
+            _invoice(
+                "Ravi", "", datetime(2024, 2, 1), [("Bun", 1, Decimal("5.00")), ("Chai, hot", 3, Decimal("1.25"))]
+            ),
+        ]
+    )
+    return connection
+
+
+@pytest.mark.parametrize(
+    "path, fmt", [("out.csv", "csv"), ("OUT.JSONL", "jsonl"), ("out.ndjson", "jsonl"), ("a.b.parquet", "parquet")]
+)
+def test_format_comes_from_the_extension(path, fmt):
+    assert format_for_path(path) == fmt
+
+
+def test_unknown_extension_is_refused():
+    with pytest.raises(ValueError):
+        format_for_path("bills.xlsx")
+
+
+def test_csv_export_streams_every_bill_in_id_order(history, tmp_path):
+    path = str(tmp_path / "bills.csv")
+    assert export_bills(history, path, batch_size=2) == 3
+    with open(path, newline="", encoding="utf-8") as exported:
+        rows = list(csv.reader(exported))
+    assert rows[0] == COLUMNS
+    assert [row[5] for row in rows[1:]] == ["Tea", "Bun", "Chai, hot"]
+    assert rows[1][9] == "21.00"
+    assert rows[2][4] == ""
+
+
+def test_jsonl_export_honours_the_date_range(history, tmp_path):
+    path = str(tmp_path / "bills.jsonl")
+    assert export_bills(history, path, date_from=datetime(2024, 2, 1), date_to=datetime(2024, 3, 1)) == 2
+    with open(path, encoding="utf-8") as exported:
+        records = [json.loads(line) for line in exported]
+    assert [record["item"] for record in records] == ["Bun", "Chai, hot"]
+    assert records[1]["total"] == "3.75"
+    assert records[0]["created_at"] == "2024-02-01T00:00:00"
+    assert records[0]["customer"] == "Ravi"
+
+
+def test_empty_range_writes_only_the_header(history, tmp_path):
+    path = str(tmp_path / "bills.csv")
+    assert export_bills(history, path, date_to=datetime(2024, 1, 1)) == 0
+    with open(path, encoding="utf-8") as exported:
+        assert exported.read().strip() == ",".join(COLUMNS)
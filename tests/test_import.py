@@ -0,0 +1,172 @@
+"""Tests for the shared validation rules and the bulk importer."""
+
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+from billing_import import BulkImporter, parse_record, read_invoices, read_records, validate_file
+from billing_validation import ValidationError, validate_customer, validate_line_item
+
+NOW = datetime(2026, 10, 17, 9, 30)
+
+
+def _write(tmp_path, name, text):
+    """Write ``text`` to ``name`` under ``tmp_path`` and return its path."""
+    path = tmp_path / name
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+def test_customer_is_stripped_and_needs_a_name():
+    assert validate_customer("  Asha ", " 98765 ") == ("Asha", "98765")
+    assert validate_customer("Ravi", None) == ("Ravi", "")
+    with pytest.raises(ValidationError) as raised:
+        validate_customer("   ", "98765")
+    assert raised.value.title == "Input Required"
+
+
+def test_line_item_is_parsed():
+    assert validate_line_item(" Tea ", " 2 ", "12.5") == ("Tea", 2, 12.5)
+    assert validate_line_item("Bun", 3, 7) == ("Bun", 3, 7.0)
+
+
+@pytest.mark.parametrize(
+    "quantity, price",
+    [("", "1"), ("1", None), ("two", "1"), ("1.5", "1"), ("1", "abc"), ("1", "nan"), ("1", "inf"), ("0", "1"),
+     ("1", "-2")],
+)
+def test_invalid_line_items_are_rejected(quantity, price):
+    with pytest.raises(ValidationError):
+        validate_line_item("Tea", quantity, price)
+
+
+def test_parse_record_fills_defaults():
+    row = parse_record({"name": "Asha", "phone": "", "item": "Tea", "quantity": "2", "price": "10.10"}, NOW)
+    assert row == {
+        "name": "Asha",
+        "phone": "",
+        "item": "Tea",
+        "quantity": 2,
+        "price": Decimal("10.1"),
+        "payment_method": "Cash",
+        "created_at": NOW,
+        "invoice": "",
+    }
+
+
+def test_parse_record_reads_timestamps_and_invoice_keys():
+    record = {
+        "name": "Asha",
+        "item": "Tea",
+        "quantity": 1,
+        "price": 5,
+        "payment_method": " UPI ",
+        "created_at": "2024-02-29T18:05:00",
+        "invoice": 17,
+    }
+    row = parse_record(record, NOW)
+    assert row["payment_method"] == "UPI"
+    assert row["created_at"] == datetime(2024, 2, 29, 18, 5)
+    assert row["invoice"] == "17"
+    with pytest.raises(ValidationError, match="created_at"):
+        parse_record(dict(record, created_at="yesterday"), NOW)
+
+
+def test_records_carry_their_line_numbers(tmp_path):
+    jsonl = _write(tmp_path, "bills.jsonl", '{"name": "Asha"}\n\n{"name": "Ravi"}\n')
+    assert list(read_records(jsonl)) == [(1, '{"name": "Asha"}\n'), (3, '{"name": "Ravi"}\n')]
+    csv = _write(tmp_path, "bills.csv", "name,item\nAsha,Tea\nRavi,Bun\n")
+    assert [line_number for line_number, _record in read_records(csv)] == [2, 3]
+
+
+def test_validate_file_reports_invalid_rows(tmp_path):
+    path = _write(
+        tmp_path,
+        "bills.csv",
+        "name,phone,item,quantity,price\nAsha,98765,Tea,2,10\n,98765,Tea,1,10\nRavi,,Bun,0,5\n",
+    )
+    invalid, errors = validate_file(path)
+    assert invalid == 2
+    assert [line_number for line_number, _message in errors] == [3, 4]
+
+
+def test_parse_record_decodes_jsonl_lines():
+    row = parse_record('{"name": "Asha", "item": "Tea", "quantity": 2, "price": 10.1}\n', NOW)
+    assert (row["name"], row["item"], row["quantity"], row["price"]) == ("Asha", "Tea", 2, Decimal("10.1"))
+
+
+@pytest.mark.parametrize(
+    "line, message",
+    [
+        ('{"name": "Asha", "item": "Tea"', "Invalid JSON"),
+        ('["Asha", "Tea", 1, 10]', "Expected a JSON object"),
+        ('{"name": 42, "item": "Tea", "quantity": 1, "price": 10}', "name must be text"),
+        ('{"name": "Asha", "phone": 98765, "item": "Tea", "quantity": 1, "price": 10}', "phone must be text"),
+        ('{"name": "Asha", "item": ["Tea"], "quantity": 1, "price": 10}', "item must be text"),
+        ('{"name": "Asha", "item": "Tea", "quantity": 1, "price": 10, "payment_method": 1}', "payment_method"),
+        ('{"name": "Asha", "item": "Tea", "quantity": 1, "price": 10, "created_at": 1700000000}', "created_at"),
+    ],
+)
+def test_malformed_jsonl_lines_are_invalid_rows(line, message):
+    with pytest.raises(ValidationError, match=message):
+        parse_record(line, NOW)
+
+
+def test_validate_file_reports_malformed_jsonl_lines(tmp_path):
+    path = _write(
+        tmp_path,
+        "bills.jsonl",
+        '{"name": "Asha", "item": "Tea", "quantity": 1, "price": 10}\n'
+        "not json\n"
+        "\n"
+        '{"name": {"first": "Ravi"}, "item": "Tea", "quantity": 1, "price": 10}\n'
+        "null\n"
+        '{"name": "Ravi", "item": "Bun", "quantity": 1, "price": 5}\n',
+    )
+    invalid, errors = validate_file(path)
+    assert invalid == 3
+    assert [line_number for line_number, _message in errors] == [2, 4, 5]
+    assert [invoice["name"] for invoice in read_invoices(path)] == ["Asha", "Ravi"]
+
+
+def test_rows_sharing_an_invoice_are_grouped(tmp_path):
+    path = _write(
+        tmp_path,
+        "bills.csv",
+        "name,phone,item,quantity,price,invoice\n"
+        "Asha,98765,Tea,2,10.50,A\n"
+        "Asha,98765,Bun,1,5,A\n"
+        "Bad,,Tea,0,1,A\n"
+        "Ravi,,Tea,1,10.50,\n"
+        "Ravi,,Cake,1,40,\n",
+    )
+    invoices = list(read_invoices(path))
+    assert [invoice["lines"] for invoice in invoices] == [
+        [("Tea", 2, Decimal("10.5")), ("Bun", 1, Decimal("5.0"))],
+        [("Tea", 1, Decimal("10.5"))],
+        [("Cake", 1, Decimal("40.0"))],
+    ]
+
+
+def test_bulk_import_reuses_customers_across_batches(connection, tmp_path):
+    path = _write(
+        tmp_path,
+        "bills.csv",
+        "name,phone,item,quantity,price,invoice\n"
+        "Asha,98765,Tea,2,10.50,A\n"
+        "Asha,98765,Bun,1,5,A\n"
+        "Ravi,,Tea,1,10.50,\n"
+        "Asha R,98765,Cake,1,40,\n",
+    )
+    importer = BulkImporter(connection, batch_size=2)
+    importer.run(read_invoices(path))
+
+    assert (importer.invoices, importer.rows) == (3, 4)
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT COUNT(*) FROM customers")
+        assert cursor.fetchone()[0] == 2
+        cursor.execute("SELECT COUNT(DISTINCT customer_id) FROM bills WHERE item IN ('Bun', 'Cake')")
+        assert cursor.fetchone()[0] == 1
+        cursor.execute("SELECT bill_count, revenue FROM bill_totals WHERE id = 1")
+        assert cursor.fetchone() == (4, Decimal("76.50"))
@@ -0,0 +1,46 @@
+"""Tests for laying out invoices and reading them back from the bills."""
+
+from datetime import datetime
+from decimal import Decimal
+
+from billing_invoice import InvoiceRenderer, invoice_filename, read_invoices, render_batch
+from billing_repository import new_invoice, save_invoices
+
+
+def _invoice(name, phone, created_at, lines, payment_method="Cash"):
+    """Return an invoice stamped ``created_at``."""
+    invoice = new_invoice(name, phone, payment_method, lines)
+    invoice["created_at"] = created_at
+    return invoice
+
+
+def test_html_escapes_fields_and_totals_the_lines():
+    invoice = _invoice("Asha & Co", None, datetime(2024, 6, 1, 9, 30), [("<Tea>", 2, Decimal("1250.50"))])
+    page = InvoiceRenderer().html(42, invoice)
+    assert "Asha &amp; Co" in page and "&lt;Tea&gt;" in page
+    assert "2,501.00" in page
+    assert "01 Jun 2024, 09:30" in page
+    assert "<style>" in page
+    assert "<style>" not in InvoiceRenderer().html(42, invoice, standalone=False)
+    assert invoice_filename(42) == "invoice-42.pdf"
+
+
+def test_invoices_are_read_back_grouped_in_the_range(connection):
+    save_invoices(
+        connection,
+        [
+            _invoice("Asha", "98765", datetime(2024, 6, 1, 10), [("Tea", 2, 10.0), ("Bun", 1, 5.0)], "UPI"),
+            _invoice("Ravi", None, datetime(2024, 6, 2, 10), [("Cake", 1, 40.0)]),
+        ],
+    )
+    invoices = list(read_invoices(connection, datetime(2024, 6, 1), datetime(2024, 6, 2), batch_size=1))
+    assert len(invoices) == 1
+    invoice_id, invoice = invoices[0]
+    assert invoice["name"] == "Asha" and invoice["payment_method"] == "UPI"
+    assert invoice["lines"] == [("Tea", 2, Decimal("10.00")), ("Bun", 1, Decimal("5.00"))]
+
+
+def test_render_batch_writes_one_file_per_invoice(tmp_path):
+    invoices = [(number, _invoice("Asha", None, datetime(2024, 6, 1), [("Tea", 1, 10.0)])) for number in range(1, 4)]
+    assert render_batch(invoices, str(tmp_path), fmt="html", workers=1, chunk_size=2) == 3
+    assert sorted(entry.name for entry in tmp_path.iterdir()) == [invoice_filename(n, "html") for n in range(1, 4)]
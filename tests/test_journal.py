@@ -0,0 +1,75 @@
+"""Tests for the offline journal of bills waiting to reach the server."""
+
+import sqlite3
+from datetime import datetime
+
+import pytest
+
+from billing_journal import Journal
+from billing_repository import new_client_ref
+
+
+def _invoice(name="Asha", phone="98765", lines=(("Tea", 2, 12.5),)):
+    """Return a new invoice with its own client reference, priced as the billing form parses it."""
+    return {
+        "name": name,
+        "phone": phone,
+        "payment_method": "Cash",
+        "lines": list(lines),
+        "created_at": datetime(2026, 10, 17, 9, 30),
+        "client_ref": new_client_ref(),
+    }
+
+
+@pytest.fixture
+def journal(tmp_path):
+    """Return an empty journal in a temporary file."""
+    journal = Journal(str(tmp_path / "journal.sqlite3"))
+    yield journal
+    journal.close()
+
+
+def test_peek_returns_invoices_oldest_first_unchanged(journal):
+    first, second = _invoice(), _invoice("Ravi", None, [("Bun", 1, 7.25)])
+    journal.append(first)
+    journal.append(second)
+    assert len(journal) == 2
+    assert journal.peek(10) == [first, second]
+    assert journal.peek(1) == [first]
+    assert len(journal) == 2
+
+
+def test_appending_the_same_client_ref_twice_queues_it_once(journal):
+    invoice = _invoice()
+    journal.append(invoice)
+    journal.append(dict(invoice))
+    assert len(journal) == 1
+    assert journal.peek(10) == [invoice]
+
+
+def test_queue_survives_reopening(tmp_path):
+    path = str(tmp_path / "journal.sqlite3")
+    invoice = _invoice()
+    journal = Journal(path)
+    journal.append(invoice)
+    journal.close()
+
+    reopened = Journal(path)
+    try:
+        assert len(reopened) == 1
+        assert reopened.peek(10) == [invoice]
+    finally:
+        reopened.close()
+
+
+def test_remove_and_reject_take_invoices_off_the_queue(journal):
+    kept, sent, refused = _invoice(), _invoice(), _invoice()
+    for invoice in (kept, sent, refused):
+        journal.append(invoice)
+    journal.remove([sent["client_ref"], "unknown"])
+    journal.reject(refused["client_ref"], "Data too long for column 'item'")
+    assert len(journal) == 1
+    assert journal.peek(10) == [kept]
+    with sqlite3.connect(journal.path) as kept_aside:
+        rejected = kept_aside.execute("SELECT client_ref, error FROM rejected").fetchall()
+    assert rejected == [(refused["client_ref"], "Data too long for column 'item'")]
@@ -0,0 +1,111 @@
+"""Tests for the metrics registry and statement instrumentation."""
+
+import json
+import logging
+import sqlite3
+
+import pytest
+
+import billing_metrics
+from billing_metrics import BUCKETS_MS, METRICS, Histogram, Metrics, instrument
+
+
+def test_histogram_quantiles_use_bucket_bounds():
+    histogram = Histogram()
+    for ms in [0.5, 3, 3, 4, 40, 40, 40, 40, 40, 700]:
+        histogram.observe(ms)
+    assert histogram.quantile(0.1) == 1
+    assert histogram.quantile(0.5) == 50
+    assert histogram.quantile(0.95) == 700
+    snapshot = histogram.snapshot()
+    assert snapshot["count"] == 10
+    assert snapshot["mean_ms"] == 91.05
+    assert snapshot["max_ms"] == 700
+    assert snapshot["buckets"] == {"1": 1, "5": 3, "50": 5, "1000": 1}
+
+
+def test_empty_histogram():
+    assert Histogram().snapshot() == {"count": 0, "mean_ms": 0, "p50_ms": 0, "p95_ms": 0, "max_ms": 0, "buckets": {}}
+
+
+def test_counters_and_timers():
+    metrics = Metrics()
+    metrics.increment("bills.saved")
+    metrics.increment("bills.saved", 2)
+    with metrics.timer("ui.save"):
+        pass
+    with pytest.raises(KeyError):
+        with metrics.timer("ui.save"):
+            raise KeyError("timed even when the block fails")
+    snapshot = metrics.snapshot()
+    assert snapshot["counters"] == {"bills.saved": 3}
+    assert snapshot["histograms"]["ui.save"]["count"] == 2
+
+
+def test_prometheus_text():
+    metrics = Metrics()
+    metrics.increment("db.queries", 4)
+    metrics.observe("db.select", 3)
+    metrics.observe("db.select", 30000)
+    lines = metrics.prometheus_text().splitlines()
+    assert "# TYPE billing_db_queries_total counter" in lines
+    assert "billing_db_queries_total 4" in lines
+    assert "# TYPE billing_db_select_ms histogram" in lines
+    assert 'billing_db_select_ms_bucket{le="2"} 0' in lines
+    assert 'billing_db_select_ms_bucket{le="5"} 1' in lines
+    assert 'billing_db_select_ms_bucket{le="+Inf"} 2' in lines
+    assert "billing_db_select_ms_sum 30003.000" in lines
+    assert "billing_db_select_ms_count 2" in lines
+    assert sum(line.startswith("billing_db_select_ms_bucket") for line in lines) == len(BUCKETS_MS)
+
+
+def test_write_snapshot(tmp_path):
+    metrics = Metrics()
+    metrics.increment("bills.saved")
+    path = tmp_path / "metrics.json"
+    metrics.write_snapshot(str(path))
+    snapshot = json.loads(path.read_text(encoding="utf-8"))
+    assert snapshot["counters"] == {"bills.saved": 1}
+    assert "written_at" in snapshot
+    assert [entry.name for entry in tmp_path.iterdir()] == ["metrics.json"]
+
+
+def _counter(name):
+    """Return the current value of a process-wide counter."""
+    return METRICS.snapshot()["counters"].get(name, 0)
+
+
+def test_instrumented_statements_are_counted_with_their_rows():
+    connection = instrument(sqlite3.connect(":memory:"))
+    queries, rows = _counter("db.queries"), _counter("db.rows")
+    with connection.cursor() as cursor:
+        cursor.execute("CREATE TABLE items (name TEXT)")
+        cursor.executemany("INSERT INTO items VALUES (?)", [("Tea",), ("Bun",), ("Cake",)])
+        cursor.execute("SELECT name FROM items ORDER BY name")
+        assert cursor.fetchmany(2) == [("Bun",), ("Cake",)]
+        assert cursor.fetchmany(2) == [("Tea",)]
+    connection.commit()
+    assert _counter("db.queries") - queries == 3
+    assert _counter("db.rows") - rows == 6
+    histograms = METRICS.snapshot()["histograms"]
+    assert {"db.create", "db.insert", "db.select", "db.commit"} <= set(histograms)
+
+
+def test_failed_statements_are_counted():
+    connection = instrument(sqlite3.connect(":memory:"))
+    errors = _counter("db.errors")
+    with connection.cursor() as cursor:
+        with pytest.raises(sqlite3.OperationalError):
+            cursor.execute("SELECT * FROM missing")
+    assert _counter("db.errors") - errors == 1
+
+
+def test_slow_statements_are_logged(monkeypatch, caplog):
+    monkeypatch.setattr(billing_metrics, "SLOW_QUERY_MS", 0)
+    connection = instrument(sqlite3.connect(":memory:"))
+    with caplog.at_level(logging.WARNING, logger="billing.slow_queries"):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1\n  UNION ALL SELECT 2")
+            cursor.fetchall()
+    assert len(caplog.records) == 1
+    assert caplog.records[0].getMessage().endswith("ms, 2 rows: SELECT 1 UNION ALL SELECT 2")
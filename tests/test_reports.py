@@ -0,0 +1,107 @@
+"""Tests for the sales rollups and the reports read from them."""
+
+from datetime import date, datetime
+from decimal import Decimal
+
+import pytest
+
+import billing_reports
+from billing_reports import bucket_start, payment_split, rebuild, top_customers, top_items, window_start
+from billing_repository import new_invoice, save_invoice, save_invoices
+
+ROLLUP_QUERIES = {
+    "sales_daily": "SELECT day, payment_method, invoices, quantity, revenue FROM sales_daily ORDER BY 1, 2",
+    "sales_items_monthly": "SELECT month, item, quantity, revenue FROM sales_items_monthly ORDER BY 1, 2",
+    "sales_customers_monthly": (
+        "SELECT month, customer_id, invoices, revenue FROM sales_customers_monthly ORDER BY 1, 2"
+    ),
+}
+
+
+def _invoice(name, phone, created_at, lines, payment_method="Cash"):
+    """Return an invoice stamped ``created_at``."""
+    invoice = new_invoice(name, phone, payment_method, lines)
+    invoice["created_at"] = created_at
+    return invoice
+
+
+def _rollups(connection):
+    """Return every rollup table's rows."""
+    rollups = {}
+    with connection.cursor() as cursor:
+        for table, query in ROLLUP_QUERIES.items():
+            cursor.execute(query)
+            rollups[table] = cursor.fetchall()
+    return rollups
+
+
+@pytest.fixture
+def sales(connection):
+    """Return ``connection`` with bills across two months, two payment methods and three customers."""
+    save_invoice(connection, _invoice("Asha", "98765", datetime(2024, 1, 5, 10), [("Tea", 2, 10.0), ("Bun", 1, 5.0)]))
+    save_invoices(
+        connection,
+        [
+            _invoice("Asha", "98765", datetime(2024, 1, 5, 18), [("Tea", 1, 10.0)], "UPI"),
+            _invoice("Ravi", "12345", datetime(2024, 1, 31, 23, 59), [("Cake", 1, 40.0)], "UPI"),
+            _invoice("Walk-in", None, datetime(2024, 2, 1), [("Tea", 3, 10.0)]),
+        ],
+    )
+    return connection
+
+
+@pytest.mark.parametrize(
+    "day, period, start",
+    [
+        (date(2026, 10, 17), "day", date(2026, 10, 17)),
+        (date(2026, 10, 17), "week", date(2026, 10, 12)),
+        (date(2026, 10, 12), "week", date(2026, 10, 12)),
+        (date(2026, 10, 17), "month", date(2026, 10, 1)),
+    ],
+)
+def test_bucket_start(day, period, start):
+    assert bucket_start(day, period) == start
+
+
+def test_window_covers_the_configured_number_of_buckets():
+    today = date(2026, 10, 17)
+    assert window_start("day", today) == date(2026, 9, 18)
+    assert window_start("week", today) == date(2026, 7, 27)
+    assert window_start("month", today) == date(2025, 11, 1)
+    assert billing_reports.PERIODS == {"day": 30, "week": 12, "month": 12}
+
+
+def test_incremental_rollups_match_a_rebuild(sales):
+    incremental = _rollups(sales)
+    assert len(incremental["sales_daily"]) == 4
+    rebuild(sales)
+    assert _rollups(sales) == incremental
+
+
+def test_rebuild_repairs_drifted_rollups(sales):
+    expected = _rollups(sales)
+    with sales.cursor() as cursor:
+        cursor.execute("DELETE FROM sales_items_monthly")
+        cursor.execute("UPDATE sales_daily SET revenue = 0")
+    sales.commit()
+    rebuild(sales)
+    assert _rollups(sales) == expected
+
+
+def test_reports_read_the_rollups(sales):
+    assert payment_split(sales, date(2024, 1, 1)) == [
+        ("Cash", 2, Decimal("55.00")),
+        ("UPI", 2, Decimal("50.00")),
+    ]
+    assert payment_split(sales, date(2024, 2, 1)) == [("Cash", 1, Decimal("30.00"))]
+    assert top_items(sales, date(2024, 1, 1)) == [
+        ("Tea", 6, Decimal("60.00")),
+        ("Cake", 1, Decimal("40.00")),
+        ("Bun", 1, Decimal("5.00")),
+    ]
+    assert top_items(sales, date(2024, 1, 1), limit=1) == [("Tea", 6, Decimal("60.00"))]
+    assert top_customers(sales, date(2024, 1, 1)) == [
+        ("Ravi", "12345", 1, Decimal("40.00")),
+        ("Asha", "98765", 2, Decimal("35.00")),
+        ("Walk-in", None, 1, Decimal("30.00")),
+    ]
@@ -0,0 +1,182 @@
+"""Tests for reading and writing bills through billing_repository."""
+
+from datetime import datetime
+from decimal import Decimal
+
+from billing_repository import (
+    bill_filter,
+    fetch_bills,
+    fetch_changes,
+    fetch_first_page,
+    fetch_summary,
+    find_customer,
+    get_or_create_customer,
+    like_prefix,
+    new_invoice,
+    save_invoice,
+    save_invoices,
+)
+
+
+def _invoice(name="Asha", phone="98765", lines=(("Tea", 2, 12.5),), payment_method="Cash"):
+    """Return a new invoice with its own client reference, priced as the billing form parses it."""
+    return new_invoice(name, phone, payment_method, lines)
+
+
+def _where(conditions):
+    """Return the WHERE clause joining ``conditions``."""
+    return "WHERE " + " AND ".join(conditions) if conditions else ""
+
+
+def test_new_invoices_get_distinct_client_refs():
+    first, second = _invoice(), _invoice()
+    assert first["client_ref"] != second["client_ref"]
+    assert len(first["client_ref"]) == 32
+    assert first["customer_id"] is None
+    assert new_invoice("Asha", "", "UPI", [], client_ref="till-1-0001")["client_ref"] == "till-1-0001"
+
+
+def test_like_prefix_escapes_wildcards():
+    assert like_prefix("Tea") == "Tea%"
+    assert like_prefix("50%_off!") == "50!%!_off!!%"
+
+
+def test_bill_filter_builds_conditions_in_order():
+    assert bill_filter() == ([], [])
+    conditions, params = bill_filter("Asha", "Te", "UPI", datetime(2024, 1, 1), datetime(2024, 2, 1))
+    assert len(conditions) == 5
+    assert "name LIKE %s" in conditions[0]
+    assert params == ["Asha%", "Te%", "UPI", datetime(2024, 1, 1), datetime(2024, 2, 1)]
+    assert "phone LIKE %s" in bill_filter("98")[0][0]
+    assert "phone LIKE %s" in bill_filter("+91")[0][0]
+
+
+def test_bill_filter_matches_wildcards_literally(connection):
+    for name in ["A_b", "Axb", "Sale 50%", "Sale 500"]:
+        save_invoice(connection, _invoice(name, None))
+    for search, expected in [
+        ("A_", ["A_b"]),
+        ("A", ["Axb", "A_b"]),
+        ("Sale 50%", ["Sale 50%"]),
+        ("Sale 50", ["Sale 500", "Sale 50%"]),
+    ]:
+        conditions, params = bill_filter(search=search)
+        assert [row[1] for row in fetch_bills(connection, _where(conditions), params, 10)] == expected
+
+
+def test_bill_filter_by_item_payment_and_dates(connection):
+    old = _invoice(lines=[("Tea", 1, 10.0), ("Toast", 1, 20.0)])
+    old["created_at"] = datetime(2024, 1, 31, 23, 59)
+    new = _invoice("Ravi", "12345", [("Tea", 3, 10.0)], payment_method="UPI")
+    new["created_at"] = datetime(2024, 2, 1)
+    save_invoices(connection, [old, new])
+
+    conditions, params = bill_filter(item="tea", date_to=datetime(2024, 2, 1))
+    assert [row[3] for row in fetch_bills(connection, _where(conditions), params, 10)] == ["Tea"]
+    conditions, params = bill_filter(payment_method="UPI", date_from=datetime(2024, 2, 1))
+    assert fetch_summary(connection, _where(conditions), params) == (1, Decimal("30.00"))
+
+
+def test_customers_are_reused_by_phone(connection):
+    first = get_or_create_customer(connection, "Asha", "98765")
+    second = get_or_create_customer(connection, "Asha R", "98765")
+    walk_in = get_or_create_customer(connection, "Asha", "")
+    connection.commit()
+    assert first == second != walk_in
+    assert find_customer(connection, "98765") == (first, "Asha R")
+    assert find_customer(connection, "00000") is None
+
+
+def test_a_batch_resolves_each_phone_number_once(connection):
+    saved = save_invoices(connection, [_invoice("Asha", "98765"), _invoice("Ravi", None), _invoice("Asha R", "98765")])
+    assert saved[0][1] == saved[2][1] != saved[1][1]
+    # The last name given for the number wins, as when the invoices are saved one by one
+    assert find_customer(connection, "98765") == (saved[0][1], "Asha R")
+    assert fetch_summary(connection) == (3, Decimal("75.00"))
+
+
+def test_saved_invoice_updates_bills_and_totals(connection):
+    invoice_id, customer_id = save_invoice(connection, _invoice(lines=[("Tea", 2, 12.5), ("Bun", 1, 7.25)]))
+    rows = fetch_bills(connection, "", [], 10)
+    assert [(row[1], row[3], row[7]) for row in rows] == [
+        ("Asha", "Bun", Decimal("7.25")),
+        ("Asha", "Tea", Decimal("25.00")),
+    ]
+    assert fetch_summary(connection) == (2, Decimal("32.25"))
+    assert find_customer(connection, "98765") == (customer_id, "Asha")
+    assert invoice_id > 0
+
+
+def test_replaying_a_batch_twice_saves_each_invoice_once(connection):
+    batch = [_invoice(), _invoice("Ravi", None, [("Bun", 1, 7.25), ("Tea", 1, 12.5)])]
+    first = save_invoices(connection, batch)
+    # The acknowledgement was lost, so the same batch is replayed
+    second = save_invoices(connection, batch)
+    assert all(saved is not None for saved in first)
+    assert second == [None, None]
+    assert fetch_summary(connection) == (3, Decimal("44.75"))
+
+
+def test_replay_skips_only_the_invoices_already_stored(connection):
+    stored, new = _invoice(), _invoice("Ravi", None)
+    save_invoice(connection, stored)
+    saved = save_invoices(connection, [stored, new, dict(new)])
+    assert saved[0] is None and saved[1] is not None and saved[2] is None
+    assert fetch_summary(connection) == (2, Decimal("50.00"))
+
+
+def test_keyset_pages_cover_every_bill_once(connection):
+    save_invoices(connection, [_invoice(lines=[(f"Item {number}", 1, 1.0)]) for number in range(7)])
+    seen, where, params = [], "", []
+    while True:
+        page = fetch_bills(connection, where, params, 3)
+        seen.extend(row[0] for row in page)
+        if len(page) < 3:
+            break
+        where, params = "WHERE b.bill_id < %s", [page[-1][0]]
+    assert len(seen) == len(set(seen)) == 7
+    assert seen == sorted(seen, reverse=True)
+
+
+def test_first_page_totals_and_watermark_agree(connection):
+    save_invoices(connection, [_invoice(lines=[(f"Item {number}", 1, 2.5)]) for number in range(5)])
+    bill_count, revenue, last_bill_id, rows = fetch_first_page(connection, "", [], 3)
+    assert (bill_count, revenue) == (5, Decimal("12.50"))
+    assert [row[0] for row in rows] == [last_bill_id, last_bill_id - 1, last_bill_id - 2]
+
+    # A bill saved after the snapshot is only picked up by a delta above the watermark
+    save_invoice(connection, _invoice("Ravi", None, [("Cake", 1, 40.0)]))
+    delta = fetch_bills(connection, "WHERE b.bill_id > %s", [last_bill_id], 100)
+    assert [row[3] for row in delta] == ["Cake"]
+    assert fetch_summary(connection) == (bill_count + len(delta), revenue + delta[0][7])
+
+
+def test_filtered_first_page_leaves_the_filter_totals_to_fetch_summary(connection):
+    save_invoices(connection, [_invoice(), _invoice("Ravi", "12345"), _invoice("Ravina", None, [("Bun", 4, 5.0)])])
+    conditions, params = bill_filter(search="Ravi")
+    where = _where(conditions)
+    bill_count, revenue, last_bill_id, rows = fetch_first_page(connection, where, params, 10)
+    # The page comes with the running totals of all bills, not an aggregate over the filter
+    assert (bill_count, revenue) == fetch_summary(connection) == (3, Decimal("70.00"))
+    assert last_bill_id == rows[0][0]
+    assert {row[1] for row in rows} == {"Ravi", "Ravina"}
+
+    # A bill saved after the page is left to the delta refresh, not counted in the filter's totals
+    save_invoice(connection, _invoice("Ravi", "12345", [("Cake", 1, 40.0)]))
+    assert fetch_summary(connection, where, params, last_bill_id) == (2, Decimal("45.00"))
+    assert fetch_summary(connection, where, params) == (3, Decimal("85.00"))
+    conditions, params = bill_filter(search="Nobody")
+    assert fetch_first_page(connection, _where(conditions), params, 10) == (4, Decimal("110.00"), last_bill_id + 1, [])
+
+
+def test_changes_split_the_totals_at_the_checkpoint(connection):
+    assert fetch_changes(connection, 0) == (0, 0, 0, 0, 0)
+    save_invoices(connection, [_invoice(), _invoice("Ravi", None, [("Bun", 1, 7.25)])])
+    bill_count, revenue, last_bill_id, _rows = fetch_first_page(connection, "", [], 10)
+    assert fetch_changes(connection, last_bill_id) == (bill_count, revenue, last_bill_id, 0, 0)
+
+    save_invoice(connection, _invoice("Ravina", None, [("Cake", 1, 40.0), ("Tea", 1, 12.5)]))
+    bill_count, revenue, newest, newer_count, newer_revenue = fetch_changes(connection, last_bill_id)
+    assert (newest, newer_count, newer_revenue) == (last_bill_id + 2, 2, Decimal("52.50"))
+    # Everything at or below the checkpoint still adds up to the totals read with it
+    assert (bill_count - newer_count, revenue - newer_revenue) == (2, Decimal("32.25"))
@@ -0,0 +1,160 @@
+"""Tests for the HTTP ingest service's request parsing and group commit."""
+
+import asyncio
+from decimal import Decimal
+
+import mysql.connector
+import pytest
+
+import billing_repository
+from billing_connection import ConnectionManager
+from billing_server import GroupCommitter, parse_bill
+from billing_validation import ValidationError
+
+
+def _payload(**fields):
+    """Return a valid POST /bills body with ``fields`` overridden."""
+    payload = {
+        "name": "Asha",
+        "phone": "98765",
+        "payment_method": "UPI",
+        "lines": [{"item": "Tea", "quantity": 2, "price": "12.50"}, {"item": "Bun", "quantity": "1", "price": 7}],
+    }
+    payload.update(fields)
+    return payload
+
+
+def test_parse_bill_returns_an_invoice():
+    invoice = parse_bill(_payload(name=" Asha ", client_ref="till-1-0001"))
+    assert invoice["name"] == "Asha"
+    assert invoice["phone"] == "98765"
+    assert invoice["payment_method"] == "UPI"
+    assert invoice["lines"] == [("Tea", 2, 12.5), ("Bun", 1, 7.0)]
+    assert invoice["client_ref"] == "till-1-0001"
+    assert invoice["customer_id"] is None
+
+
+def test_parse_bill_defaults_to_cash_and_a_fresh_client_ref():
+    payload = _payload()
+    del payload["payment_method"]
+    first, second = parse_bill(payload), parse_bill(payload)
+    assert first["payment_method"] == "Cash"
+    assert first["client_ref"] != second["client_ref"]
+
+
+@pytest.mark.parametrize(
+    "payload",
+    [
+        [],
+        "bill",
+        _payload(name=""),
+        _payload(payment_method="Cheque"),
+        _payload(lines=[]),
+        _payload(lines={"item": "Tea"}),
+        _payload(lines=["Tea"]),
+        _payload(lines=[{"item": "Tea", "quantity": 0, "price": 1}]),
+        _payload(lines=[{"item": "Tea", "quantity": 1, "price": "free"}]),
+        _payload(client_ref=""),
+        _payload(client_ref=42),
+        _payload(client_ref="x" * 33),
+    ],
+)
+def test_parse_bill_rejects_invalid_bills(payload):
+    with pytest.raises(ValidationError):
+        parse_bill(payload)
+
+
+@pytest.mark.parametrize(
+    "payload, field",
+    [
+        (_payload(name=42), "name"),
+        (_payload(phone=98765), "phone"),
+        (_payload(payment_method=["UPI"]), "payment_method"),
+        (_payload(lines=[{"item": {"name": "Tea"}, "quantity": 1, "price": 1}]), "item"),
+    ],
+)
+def test_parse_bill_names_a_field_that_is_not_text(payload, field):
+    with pytest.raises(ValidationError, match=f"^{field} must be text"):
+        parse_bill(payload)
+
+
+def _commit_all(manager, invoices, writers=1):
+    """Submit ``invoices`` concurrently and return each one's result or exception, and the committer."""
+
+    async def run():
+        committer = GroupCommitter(manager, writers=writers)
+        committer.start()
+        try:
+            results = await asyncio.gather(*(committer.submit(invoice) for invoice in invoices), return_exceptions=True)
+        finally:
+            await committer.stop()
+        return results, committer
+
+    return asyncio.run(run())
+
+
+@pytest.fixture
+def manager(db_config):
+    """Return a connection pool on the test database."""
+    manager = ConnectionManager(db_config, pool_size=2)
+    yield manager
+    manager.close()
+
+
+def test_concurrent_bills_share_a_transaction(manager):
+    invoices = [parse_bill(_payload(name=f"Customer {number}", phone=str(number))) for number in range(5)]
+    results, committer = _commit_all(manager, invoices + [dict(invoices[0])])
+
+    assert all(isinstance(result, tuple) for result in results[:5])
+    # The repeated client_ref is recognised as already stored, not saved twice
+    assert results[5] is None
+    assert committer.invoices == 6
+    assert committer.batches < 6
+    assert manager.run(billing_repository.fetch_summary) == (10, Decimal("160.00"))
+
+
+def test_a_rejected_bill_fails_alone(manager):
+    good = [parse_bill(_payload()), parse_bill(_payload(name="Ravi", phone=None))]
+    # No such customer, so the invoice breaks the foreign key
+    bad = dict(parse_bill(_payload()), customer_id=999999)
+    results, committer = _commit_all(manager, [good[0], bad, good[1]])
+
+    assert isinstance(results[0], tuple) and isinstance(results[2], tuple)
+    assert isinstance(results[1], mysql.connector.IntegrityError)
+    assert committer.invoices == 2
+    assert manager.run(billing_repository.fetch_summary) == (4, Decimal("64.00"))
+
+
+def _deadlock():
+    """Return the error MySQL raises for a transaction it rolled back to break a deadlock."""
+    return mysql.connector.errors.InternalError(msg="Deadlock found when trying to get lock", errno=1213)
+
+
+def test_a_deadlocked_batch_is_retried_whole(manager, monkeypatch):
+    save_invoices, attempts = billing_repository.save_invoices, []
+
+    def deadlock_once(connection, invoices):
+        attempts.append([invoice["client_ref"] for invoice in invoices])
+        if len(attempts) == 1:
+            raise _deadlock()
+        return save_invoices(connection, invoices)
+
+    monkeypatch.setattr(billing_repository, "save_invoices", deadlock_once)
+    results, committer = _commit_all(manager, [parse_bill(_payload()) for _ in range(3)])
+
+    assert all(isinstance(result, tuple) for result in results)
+    assert attempts[0] == attempts[1]
+    assert committer.invoices == 3
+    assert manager.run(billing_repository.fetch_summary) == (6, Decimal("96.00"))
+
+
+def test_a_batch_that_keeps_deadlocking_fails(manager, monkeypatch):
+    def always_deadlock(connection, invoices):
+        raise _deadlock()
+
+    monkeypatch.setattr(billing_repository, "save_invoices", always_deadlock)
+    monkeypatch.setattr(GroupCommitter, "DEADLOCK_BACKOFF", 0)
+    results, committer = _commit_all(manager, [parse_bill(_payload())])
+
+    assert isinstance(results[0], mysql.connector.errors.InternalError)
+    assert committer.invoices == 0
@@ -0,0 +1,92 @@
+"""Tests for the MySQL-to-SQLite statement rewriting in billing_sqlite."""
+
+from decimal import Decimal
+
+import mysql.connector
+import pytest
+
+import billing_repository
+import billing_sqlite
+from billing_sqlite import ER_DUP_ENTRY, translate
+
+
+def test_placeholders_become_question_marks():
+    statement = translate("SELECT name FROM customers WHERE phone = %s AND customer_id > %s")
+    assert statement.sql == "SELECT name FROM customers WHERE phone = ? AND customer_id > ?"
+    assert statement.bind and not statement.lock and not statement.returns_id
+
+
+def test_string_literals_are_left_alone():
+    statement = translate("SELECT DATE_FORMAT(created_at, '%Y-%m-%s'), 'INSERT IGNORE' FROM bills WHERE bill_id = %s")
+    assert statement.sql == "SELECT DATE_FORMAT(created_at, '%Y-%m-%s'), 'INSERT IGNORE' FROM bills WHERE bill_id = ?"
+
+
+def test_insert_ignore():
+    statement = translate("INSERT IGNORE INTO items (name, price) VALUES (%s, %s)")
+    assert statement.sql == "INSERT OR IGNORE INTO items (name, price) VALUES (?, ?)"
+
+
+def test_on_duplicate_key_update_reads_excluded_values():
+    statement = translate(
+        "INSERT INTO items (name, price) VALUES (%s, %s) ON DUPLICATE KEY UPDATE price = VALUES(price)"
+    )
+    assert statement.sql == (
+        "INSERT INTO items (name, price) VALUES (?, ?) ON CONFLICT DO UPDATE SET price = excluded.price"
+    )
+    assert not statement.returns_id
+
+
+def test_last_insert_id_becomes_returning():
+    statement = translate(
+        """
+        INSERT INTO customers (name, phone) VALUES (%s, %s)
+        ON DUPLICATE KEY UPDATE customer_id = LAST_INSERT_ID(customer_id), name = VALUES(name)
+        """
+    )
+    assert " ".join(statement.sql.split()).endswith(
+        "ON CONFLICT DO UPDATE SET name = excluded.name RETURNING customer_id"
+    )
+    assert "LAST_INSERT_ID" not in statement.sql
+    assert statement.returns_id
+
+
+def test_locks():
+    assert translate("LOCK TABLES bills WRITE, bill_totals WRITE").sql is None
+    assert translate("LOCK TABLES bills WRITE").lock
+    unlock = translate("UNLOCK TABLES")
+    assert unlock.sql is None and not unlock.lock
+    get_lock = translate("SELECT GET_LOCK(%s, %s)")
+    assert get_lock.sql == "SELECT 1" and get_lock.lock and not get_lock.bind
+    release = translate("SELECT RELEASE_LOCK(%s)")
+    assert release.sql == "SELECT 1" and not release.lock and not release.bind
+
+
+def test_upsert_returns_the_existing_id(connection):
+    first = billing_repository.get_or_create_customer(connection, "Asha", "98765")
+    second = billing_repository.get_or_create_customer(connection, "Asha R", "98765")
+    connection.commit()
+    assert first == second
+    assert billing_repository.find_customer(connection, "98765") == (first, "Asha R")
+
+
+def test_values_round_trip_as_mysql_types(connection):
+    with connection.cursor() as cursor:
+        cursor.execute("INSERT INTO items (name, price) VALUES (%s, %s)", ("Tea", Decimal("12.50")))
+        cursor.execute("SELECT price FROM items WHERE name = %s", ("Tea",))
+        assert cursor.fetchall() == [(Decimal("12.50"),)]
+
+
+def test_duplicate_key_raises_mysql_integrity_error(connection):
+    with connection.cursor() as cursor:
+        cursor.execute("INSERT INTO items (name, price) VALUES (%s, %s)", ("Tea", Decimal("1")))
+        with pytest.raises(mysql.connector.IntegrityError) as raised:
+            cursor.execute("INSERT INTO items (name, price) VALUES (%s, %s)", ("Tea", Decimal("2")))
+    assert raised.value.errno == ER_DUP_ENTRY
+
+
+def test_an_old_sqlite_library_is_refused(monkeypatch, tmp_path):
+    monkeypatch.setattr(billing_sqlite.sqlite3, "sqlite_version_info", (3, 34, 1))
+    monkeypatch.setattr(billing_sqlite.sqlite3, "sqlite_version", "3.34.1")
+    with pytest.raises(mysql.connector.NotSupportedError, match=r"SQLite 3\.35 or newer, but Python uses 3\.34\.1"):
+        billing_sqlite.connect(str(tmp_path / "billing.sqlite3"))
+    assert not (tmp_path / "billing.sqlite3").exists()